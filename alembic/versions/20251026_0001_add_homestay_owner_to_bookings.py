@@ -0,0 +1,49 @@
+"""denormalize homestay_id and owner_id onto bookings
+
+Revision ID: 20251026_0001
+Revises: 20251025_0001
+Create Date: 2025-10-26 00:01:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20251026_0001'
+down_revision: Union[str, None] = '20251025_0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # batch mode so SQLite can add the foreign keys (plain ALTER on Postgres)
+    with op.batch_alter_table('bookings') as batch_op:
+        batch_op.add_column(sa.Column('homestay_id', sa.Integer(), sa.ForeignKey('homestays.id', name='fk_bookings_homestay_id'), nullable=True))
+        batch_op.add_column(sa.Column('owner_id', sa.Integer(), sa.ForeignKey('users.id', name='fk_bookings_owner_id'), nullable=True))
+    # Backfill from the room -> homestay chain (portable correlated subqueries)
+    op.execute("""
+        UPDATE bookings SET
+            homestay_id = (SELECT rooms.homestay_id FROM rooms WHERE rooms.id = bookings.room_id),
+            owner_id = (
+                SELECT homestays.owner_id FROM rooms
+                JOIN homestays ON homestays.id = rooms.homestay_id
+                WHERE rooms.id = bookings.room_id
+            )
+    """)
+    op.create_index('ix_bookings_homestay_start', 'bookings', ['homestay_id', 'start_date'], unique=False)
+    op.create_index('ix_bookings_homestay_status_end', 'bookings', ['homestay_id', 'status', 'end_date'], unique=False)
+    op.create_index('ix_bookings_owner_start', 'bookings', ['owner_id', 'start_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_bookings_owner_start', table_name='bookings')
+    op.drop_index('ix_bookings_homestay_status_end', table_name='bookings')
+    op.drop_index('ix_bookings_homestay_start', table_name='bookings')
+    with op.batch_alter_table('bookings') as batch_op:
+        batch_op.drop_constraint('fk_bookings_owner_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_bookings_homestay_id', type_='foreignkey')
+        batch_op.drop_column('owner_id')
+        batch_op.drop_column('homestay_id')
@@ -0,0 +1,60 @@
+"""fold the old startup schema adjustments into a migration
+
+Databases created before Alembic was introduced relied on ensure_mvp_schema() running
+best-effort DDL on every app start. This applies the same adjustments once, so startup
+only has to compare the stamped revision with the head.
+
+Revision ID: 20251028_0001
+Revises: 20251027_0001
+Create Date: 2025-10-28 00:01:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20251028_0001'
+down_revision: Union[str, None] = '20251027_0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (table, column) pairs that older, pre-Alembic databases may be missing
+_LEGACY_COLUMNS = [
+    ('bookings', sa.Column('comment', sa.Text(), nullable=True)),
+    ('bookings', sa.Column('image_url', sa.String(length=500), nullable=True)),
+    ('homestays', sa.Column('image_url', sa.String(length=500), nullable=True)),
+    ('rooms', sa.Column('image_url', sa.String(length=500), nullable=True)),
+    ('rooms', sa.Column('ota_ical_url', sa.String(length=500), nullable=True)),
+    ('users', sa.Column('homestay_id', sa.Integer(), nullable=True)),
+    ('users', sa.Column('currency', sa.String(length=8), server_default='USD', nullable=False)),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    for table, column in _LEGACY_COLUMNS:
+        existing = {c['name'] for c in inspector.get_columns(table)}
+        if column.name not in existing:
+            op.add_column(table, column)
+
+    booking_indexes = {ix['name'] for ix in inspector.get_indexes('bookings')}
+    if 'ix_bookings_room_start_end' not in booking_indexes:
+        op.create_index('ix_bookings_room_start_end', 'bookings', ['room_id', 'start_date', 'end_date'], unique=False)
+
+    # One subscription per owner; skip if a unique constraint/index already covers owner_id
+    unique_cols = [uc['column_names'] for uc in inspector.get_unique_constraints('subscriptions')]
+    unique_cols += [ix['column_names'] for ix in inspector.get_indexes('subscriptions') if ix.get('unique')]
+    if ['owner_id'] not in unique_cols:
+        op.create_index('uq_subscription_owner', 'subscriptions', ['owner_id'], unique=True)
+
+
+def downgrade() -> None:
+    # Nothing to undo. The columns and ix_bookings_room_start_end are part of the models, and
+    # before this revision the app created them on every start, so they existed at 20251027
+    # too; the upgrade only filled them in where they were missing and can't tell afterwards.
+    pass
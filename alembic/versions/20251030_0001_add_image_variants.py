@@ -0,0 +1,30 @@
+"""add image_variants to rooms, homestays and bookings
+
+Revision ID: 20251030_0001
+Revises: 20251029_0001
+Create Date: 2025-10-30 00:01:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20251030_0001'
+down_revision: Union[str, None] = '20251029_0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_TABLES = ('rooms', 'homestays', 'bookings', 'bookings_archive')
+
+
+def upgrade() -> None:
+    for table in _TABLES:
+        op.add_column(table, sa.Column('image_variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    for table in reversed(_TABLES):
+        op.drop_column(table, 'image_variants')
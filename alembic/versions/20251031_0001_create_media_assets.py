@@ -0,0 +1,41 @@
+"""create media_assets table
+
+Revision ID: 20251031_0001
+Revises: 20251030_0001
+Create Date: 2025-10-31 00:01:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20251031_0001'
+down_revision: Union[str, None] = '20251030_0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('media_assets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('public_id', sa.String(length=255), nullable=True),
+        sa.Column('variants', sa.JSON(), nullable=True),
+        sa.Column('size_bytes', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sha256'),
+        sa.UniqueConstraint('url')
+    )
+    op.create_index('ix_media_assets_ref_count_updated', 'media_assets', ['ref_count', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_media_assets_ref_count_updated', table_name='media_assets')
+    op.drop_table('media_assets')
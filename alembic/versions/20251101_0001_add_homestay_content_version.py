@@ -0,0 +1,28 @@
+"""add content_version to homestays
+
+Revision ID: 20251101_0001
+Revises: 20251031_0001
+Create Date: 2025-11-01 00:01:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20251101_0001'
+down_revision: Union[str, None] = '20251031_0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('homestays', sa.Column('content_version', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('homestays', sa.Column('content_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('homestays', 'content_updated_at')
+    op.drop_column('homestays', 'content_version')
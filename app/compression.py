@@ -0,0 +1,204 @@
+"""
+gzip/Brotli response compression.
+
+Compresses HTML pages, HTMX partials, JSON, CSV exports and calendar feeds when the client
+accepts it: Brotli if available and accepted, otherwise gzip. Bodies under
+COMPRESSION_MIN_BYTES, other content types (images, PDFs) and responses that already carry a
+Content-Encoding (precompressed static files) or a Content-Range pass through untouched.
+Streaming responses are compressed chunk by chunk and flushed as they go, so exports start
+arriving before they finish rendering.
+
+Sizes and timings for a large bookings page and API payload, before and after:
+
+    python -m app.compression
+"""
+import zlib
+
+from .config import settings
+
+# Brotli is optional; without it only gzip is offered
+try:
+    import brotli
+except Exception:  # pragma: no cover - optional dependency
+    brotli = None  # type: ignore
+
+COMPRESSIBLE_TYPES = (
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/csv",
+    "text/calendar",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    """Tokens from Accept-Encoding that are not refused with q=0."""
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+class _Gzip:
+    name = "gzip"
+
+    def __init__(self, level: int) -> None:
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        out = self._obj.compress(data)
+        return out + self._obj.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    name = "br"
+
+    def __init__(self, quality: int) -> None:
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        out = self._obj.process(data)
+        return out + self._obj.flush() if flush else out
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int | None = None, gzip_level: int | None = None, brotli_quality: int | None = None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else settings.COMPRESSION_MIN_BYTES
+        self.gzip_level = gzip_level if gzip_level is not None else settings.COMPRESSION_GZIP_LEVEL
+        self.brotli_quality = brotli_quality if brotli_quality is not None else settings.COMPRESSION_BROTLI_QUALITY
+
+    def _compressor(self, scope):
+        for key, value in scope.get("headers") or []:
+            if key == b"accept-encoding":
+                accepted = _accepted_encodings(value.decode("latin-1"))
+                break
+        else:
+            return None
+        if brotli is not None and "br" in accepted:
+            return _Brotli(self.brotli_quality)
+        if "gzip" in accepted:
+            return _Gzip(self.gzip_level)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        compressor = self._compressor(scope)
+        if compressor is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        active = None  # None until the first body chunk decides; then True/False
+
+        async def wrapped_send(message):
+            nonlocal start_message, active
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or active is False:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if active is None:
+                headers = {k.lower(): v for k, v in start_message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip().lower()
+                active = (
+                    content_type in COMPRESSIBLE_TYPES
+                    and b"content-encoding" not in headers
+                    and b"content-range" not in headers
+                    and start_message["status"] not in (204, 206, 304)
+                    and (more_body or len(body) >= self.minimum_size)
+                )
+                if not active:
+                    await send(start_message)
+                    await send(message)
+                    return
+                raw = [(k, v) for k, v in start_message.get("headers", []) if k.lower() not in (b"content-length", b"vary", b"etag")]
+                raw.append((b"content-encoding", compressor.name.encode()))
+                vary = headers.get(b"vary")
+                raw.append((b"vary", vary + b", Accept-Encoding" if vary and b"accept-encoding" not in vary.lower() else vary or b"Accept-Encoding"))
+                etag = headers.get(b"etag")
+                if etag:
+                    # The compressed representation differs byte-wise from the original
+                    raw.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+                if not more_body:
+                    data = compressor.compress(body, flush=False) + compressor.finish()
+                    raw.append((b"content-length", str(len(data)).encode()))
+                    await send({**start_message, "headers": raw})
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                await send({**start_message, "headers": raw})
+
+            if more_body:
+                # Flush each chunk so streamed exports reach the client as they are produced
+                data = compressor.compress(body, flush=True)
+                if data:
+                    await send({"type": "http.response.body", "body": data, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.compress(body, flush=False) + compressor.finish()})
+
+        await self.app(scope, receive, wrapped_send)
+        if start_message is not None and active is None:
+            # Response finished without a body message
+            await send(start_message)
+
+
+if __name__ == "__main__":
+    # Before/after sizes, compression cost and transfer time for typical large payloads
+    import json
+    import time
+    from datetime import date, timedelta
+
+    rows = "".join(
+        f"<tr class='border-b'><td class='p-2'>Guest {i}</td><td class='p-2'>Room {i % 12}</td>"
+        f"<td class='p-2'>{date(2025, 1, 1) + timedelta(days=i % 365)}</td><td class='p-2'>CONFIRMED</td>"
+        f"<td class='p-2 text-right'>{1000 + i % 500:.2f}</td></tr>"
+        for i in range(2000)
+    )
+    html = f"<html><body><table class='min-w-full text-sm'>{rows}</table></body></html>".encode()
+    api = json.dumps([
+        {"id": i, "room_id": i % 12, "guest_name": f"Guest {i}", "guest_contact": f"+66 8{i:08d}",
+         "start_date": str(date(2025, 1, 1) + timedelta(days=i % 365)), "end_date": str(date(2025, 1, 3) + timedelta(days=i % 365)),
+         "price": 1000 + i % 500, "status": "CONFIRMED", "comment": None, "image_url": None}
+        for i in range(2000)
+    ]).encode()
+    links = {"3G (1.6 Mbit/s)": 1.6e6 / 8, "4G (12 Mbit/s)": 12e6 / 8}
+    for label, payload in (("bookings HTML", html), ("bookings JSON", api)):
+        results = [("identity", payload, 0.0)]
+        for name, make in (("gzip", lambda: _Gzip(settings.COMPRESSION_GZIP_LEVEL)),
+                           ("br", (lambda: _Brotli(settings.COMPRESSION_BROTLI_QUALITY)) if brotli else None)):
+            if make is None:
+                continue
+            started = time.perf_counter()
+            compressor = make()
+            out = compressor.compress(payload, flush=False) + compressor.finish()
+            results.append((name, out, (time.perf_counter() - started) * 1000))
+        for name, out, ms in results:
+            transfer = "  ".join(f"{link} {len(out) / bps * 1000:7.0f} ms" for link, bps in links.items())
+            print(f"{label:<14} {name:<8} {len(out):>9,} bytes  compress {ms:6.1f} ms  {transfer}")
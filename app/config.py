@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,9 +15,20 @@ class Settings:
     # Auth & Session
     SESSION_COOKIE_NAME: str = os.getenv("SESSION_COOKIE_NAME", "staycal_session")
     SESSION_MAX_AGE_DAYS: int = int(os.getenv("SESSION_MAX_AGE_DAYS", "30"))
+    # How long a signed-in user's id/role/homestay scope is cached per process (0 disables)
+    PRINCIPAL_CACHE_SECONDS: int = int(os.getenv("PRINCIPAL_CACHE_SECONDS", "30"))
+    # bcrypt cost; existing hashes with another cost are upgraded on the next login
+    PASSWORD_HASH_ROUNDS: int = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+    # Dedicated threads for bcrypt and how many calls may queue before logins get a 503
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./staycal.db")
+    # Optional read replica for read-only pages (analytics, reports, public pages, admin dashboard)
+    DATABASE_REPLICA_URL: str = os.getenv("DATABASE_REPLICA_URL", "")
+    # After a write, the same client reads from the primary for this many seconds
+    READ_YOUR_WRITES_SECONDS: int = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
     
     # Cloudinary
     CLOUDINARY_URL: str = os.getenv("CLOUDINARY_URL", "")
@@ -31,6 +43,14 @@ class Settings:
     MAIL_FROM: str = os.getenv("MAIL_FROM", "noreply@gostay.pro")
     MAILGUN_API_KEY: str = os.getenv("MAILGUN_API_KEY", "")
     MAILGUN_DOMAIN: str = os.getenv("MAILGUN_DOMAIN", "")
+    # "mailgun", or "console" to log messages instead of sending them
+    MAIL_BACKEND: str = os.getenv("MAIL_BACKEND", "mailgun").lower()
+    # Outbox delivery: run the worker inside the web process, or separately via `python -m app.services.mail_worker`
+    MAIL_WORKER_IN_PROCESS: bool = os.getenv("MAIL_WORKER_IN_PROCESS", "true").lower() == "true"
+    MAIL_OUTBOX_BATCH_SIZE: int = int(os.getenv("MAIL_OUTBOX_BATCH_SIZE", "50"))
+    MAIL_OUTBOX_POLL_SECONDS: float = float(os.getenv("MAIL_OUTBOX_POLL_SECONDS", "5"))
+    MAIL_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("MAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+    MAIL_SEND_RATE_PER_SECOND: float = float(os.getenv("MAIL_SEND_RATE_PER_SECOND", "10"))
 
     # Firebase (for client-side analytics)
     FIREBASE_API_KEY: str = os.getenv("FIREBASE_API_KEY", "")
@@ -41,9 +61,56 @@ class Settings:
     FIREBASE_APP_ID: str = os.getenv("FIREBASE_APP_ID", "")
     FIREBASE_MEASUREMENT_ID: str = os.getenv("FIREBASE_MEASUREMENT_ID", "")
 
+    # Per-request SQL accounting (Server-Timing header + warnings for heavy or N+1 routes)
+    QUERY_STATS_ENABLED: bool = os.getenv("QUERY_STATS_ENABLED", "true").lower() == "true"
+    QUERY_BUDGET_PER_REQUEST: int = int(os.getenv("QUERY_BUDGET_PER_REQUEST", "30"))
+    QUERY_REPEAT_THRESHOLD: int = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+
+    # Slow-query log (viewable under /admin/slow-queries); SLOW_QUERY_MS=0 disables it
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "200"))
+    SLOW_QUERY_BUFFER_SIZE: int = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+    SLOW_QUERY_EXPLAIN: bool = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+
+    # Booking archive: finished bookings older than this many calendar years move to bookings_archive
+    BOOKING_ARCHIVE_KEEP_YEARS: int = int(os.getenv("BOOKING_ARCHIVE_KEEP_YEARS", "1"))
+    BOOKING_ARCHIVE_CHUNK_SIZE: int = int(os.getenv("BOOKING_ARCHIVE_CHUNK_SIZE", "500"))
+
+    # Templates: re-check files on every render only in development; compiled bytecode cache ("" disables)
+    TEMPLATE_AUTO_RELOAD: bool = os.getenv("TEMPLATE_AUTO_RELOAD", "true" if ENVIRONMENT != "production" else "false").lower() == "true"
+    TEMPLATE_CACHE_DIR: str = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "staycal-jinja"))
+
+    # gzip/Brotli response compression: bodies below COMPRESSION_MIN_BYTES are sent as-is
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+    # Public property pages: browser/CDN freshness, per-worker version and rendered-page caches (0 disables)
+    PUBLIC_CACHE_MAX_AGE: int = int(os.getenv("PUBLIC_CACHE_MAX_AGE", "60"))
+    PUBLIC_CACHE_STALE_SECONDS: int = int(os.getenv("PUBLIC_CACHE_STALE_SECONDS", "600"))
+    PUBLIC_CACHE_VERSION_SECONDS: int = int(os.getenv("PUBLIC_CACHE_VERSION_SECONDS", "5"))
+    PUBLIC_PAGE_CACHE_SECONDS: int = int(os.getenv("PUBLIC_PAGE_CACHE_SECONDS", "300"))
+    PUBLIC_PAGE_CACHE_ENTRIES: int = int(os.getenv("PUBLIC_PAGE_CACHE_ENTRIES", "1000"))
+    # Active plans (landing page, /api/v1/plans) are cached per process; admin edits apply locally at once
+    PLAN_CACHE_SECONDS: int = int(os.getenv("PLAN_CACHE_SECONDS", "300"))
+    # Property timeline: days rendered per horizontal chunk, and threads warming OTA feeds it reads from cache
+    TIMELINE_CHUNK_DAYS: int = int(os.getenv("TIMELINE_CHUNK_DAYS", "28"))
+    OTA_REFRESH_WORKERS: int = int(os.getenv("OTA_REFRESH_WORKERS", "4"))
+
     # Upload constraints
     UPLOAD_IMAGE_MAX_MB: int = int(os.getenv("UPLOAD_IMAGE_MAX_MB", "5"))
     UPLOAD_IMAGE_MAX_BYTES: int = UPLOAD_IMAGE_MAX_MB * 1024 * 1024
+    # Whole multipart request cap (image plus form fields); larger bodies get 413 while streaming in
+    UPLOAD_REQUEST_MAX_BYTES: int = int(os.getenv("UPLOAD_REQUEST_MAX_BYTES", str(UPLOAD_IMAGE_MAX_BYTES + 1024 * 1024)))
+    # Processes resizing local uploads into thumbnail/medium/WebP variants (0 disables); per-image timeout
+    IMAGE_VARIANT_WORKERS: int = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+    IMAGE_VARIANT_TIMEOUT_SECONDS: float = float(os.getenv("IMAGE_VARIANT_TIMEOUT_SECONDS", "30"))
+    # Cloudinary uploads run in the background behind a local placeholder; pool size and queue cap
+    MEDIA_UPLOAD_ASYNC: bool = os.getenv("MEDIA_UPLOAD_ASYNC", "true").lower() == "true"
+    MEDIA_UPLOAD_WORKERS: int = int(os.getenv("MEDIA_UPLOAD_WORKERS", "4"))
+    MEDIA_UPLOAD_MAX_PENDING: int = int(os.getenv("MEDIA_UPLOAD_MAX_PENDING", "32"))
+    # Unreferenced media assets older than this are deleted by `python -m app.services.media gc`
+    MEDIA_GC_GRACE_HOURS: int = int(os.getenv("MEDIA_GC_GRACE_HOURS", "24"))
+    MEDIA_GC_BATCH_SIZE: int = int(os.getenv("MEDIA_GC_BATCH_SIZE", "200"))
     
     # reCAPTCHA (optional)
     RECAPTCHA_SITE_KEY: str = os.getenv("RECAPTCHA_SITE_KEY", "")
@@ -51,11 +118,18 @@ class Settings:
     RECAPTCHA_VERSION: str = os.getenv("RECAPTCHA_VERSION", "v3").lower()
     RECAPTCHA_MIN_SCORE: float = float(os.getenv("RECAPTCHA_MIN_SCORE", "0.5"))
     RECAPTCHA_EXPECTED_ACTION: str = os.getenv("RECAPTCHA_EXPECTED_ACTION", "login")
+    RECAPTCHA_VERIFY_URL: str = os.getenv("RECAPTCHA_VERIFY_URL", "https://www.google.com/recaptcha/api/siteverify")
+    # Time budget for the siteverify call, and whether to let logins through when it fails
+    RECAPTCHA_TIMEOUT_SECONDS: float = float(os.getenv("RECAPTCHA_TIMEOUT_SECONDS", "2.0"))
+    RECAPTCHA_FAIL_OPEN: bool = os.getenv("RECAPTCHA_FAIL_OPEN", "false").lower() == "true"
     
     # Rate Limiting
     RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
     RATE_LIMIT_DEFAULT: str = os.getenv("RATE_LIMIT_DEFAULT", "100/minute")
     RATE_LIMIT_AUTH: str = os.getenv("RATE_LIMIT_AUTH", "5/minute")
     RATE_LIMIT_AUTH_API: str = os.getenv("RATE_LIMIT_AUTH_API", "10/minute")
+    # Shared counter store: memory:// (per process), redis://host:6379/0, or sqlite:////path/ratelimit.db
+    RATE_LIMIT_STORAGE_URI: str = os.getenv("RATE_LIMIT_STORAGE_URI", "memory://")
+    RATE_LIMIT_STRATEGY: str = os.getenv("RATE_LIMIT_STRATEGY", "moving-window")
 
 settings = Settings()
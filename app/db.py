@@ -1,114 +1,112 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import time
+
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 from .config import settings
+from .slow_queries import slow_query_log
 
 class Base(DeclarativeBase):
     pass
 
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if url.startswith("sqlite") else {}
+
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {},
+    connect_args=_connect_args(settings.DATABASE_URL),
 )
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
-def get_db():
+# Optional read replica. When DATABASE_REPLICA_URL is unset every read goes to the primary.
+replica_engine = (
+    create_engine(
+        settings.DATABASE_REPLICA_URL,
+        connect_args=_connect_args(settings.DATABASE_REPLICA_URL),
+        pool_pre_ping=True,
+    )
+    if settings.DATABASE_REPLICA_URL
+    else None
+)
+ReadSessionLocal = sessionmaker(bind=replica_engine, autoflush=False, autocommit=False) if replica_engine is not None else None
+
+if settings.SLOW_QUERY_MS > 0:
+    for _engine in (engine, replica_engine):
+        if _engine is not None:
+            slow_query_log.attach(_engine)
+
+# Cookie that pins a browser to the primary for a short window after it wrote something,
+# so a redirect-after-POST never renders stale replica data.
+READ_YOUR_WRITES_COOKIE = f"{settings.SESSION_COOKIE_NAME}_rw"
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _note_pending_write(session, flush_context):
+    session.info["pending_write"] = True
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_pending_write(session):
+    session.info.pop("pending_write", None)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _record_committed_write(session):
+    # Only ORM flushes count as user writes; bulk maintenance updates such as the
+    # auto-checkout sweep do not need to pin the caller to the primary.
+    if session.info.pop("pending_write", False):
+        state = session.info.get("request_state")
+        if state is not None:
+            state.primary_write_at = time.time()
+
+
+def get_db(request: Request):
     db = SessionLocal()
+    db.info["request_state"] = request.state
     try:
         yield db
     finally:
         db.close()
 
 
+def _wrote_recently(request: Request) -> bool:
+    if getattr(request.state, "primary_write_at", None):
+        return True
+    raw = request.cookies.get(READ_YOUR_WRITES_COOKIE)
+    if not raw:
+        return False
+    try:
+        return time.time() - float(raw) < settings.READ_YOUR_WRITES_SECONDS
+    except ValueError:
+        return False
+
 
-def ensure_mvp_schema():
+def get_read_db(request: Request, db: Session = Depends(get_db)):
     """
-    Lightweight, best-effort schema adjustments for MVP environments without Alembic.
-    - Ensure new columns exist (added over time)
-    - Ensure helpful indexes exist for common queries
-    - Ensure unique owner per subscription is enforced (via unique index if needed)
-    Never fails app startup; best-effort only.
+    Session for read-only pages. Uses the replica when one is configured, falling back
+    to the primary session for clients that committed a write within READ_YOUR_WRITES_SECONDS.
     """
-    url = settings.DATABASE_URL
+    if ReadSessionLocal is None or _wrote_recently(request):
+        yield db
+        return
+    read_db = ReadSessionLocal()
     try:
-        with engine.connect() as conn:
-            if url.startswith("sqlite"):
-                # bookings table - add missing columns
-                res = conn.exec_driver_sql("PRAGMA table_info(bookings);")
-                col_names = [row[1] for row in res]
-                if "comment" not in col_names:
-                    conn.exec_driver_sql("ALTER TABLE bookings ADD COLUMN comment TEXT;")
-                if "image_url" not in col_names:
-                    conn.exec_driver_sql("ALTER TABLE bookings ADD COLUMN image_url VARCHAR(500);")
-                # homestays table - add missing columns
-                res = conn.exec_driver_sql("PRAGMA table_info(homestays);")
-                col_names = [row[1] for row in res]
-                if "image_url" not in col_names:
-                    conn.exec_driver_sql("ALTER TABLE homestays ADD COLUMN image_url VARCHAR(500);")
-                # rooms table - add missing columns
-                res = conn.exec_driver_sql("PRAGMA table_info(rooms);")
-                col_names = [row[1] for row in res]
-                if "image_url" not in col_names:
-                    conn.exec_driver_sql("ALTER TABLE rooms ADD COLUMN image_url VARCHAR(500);")
-                if "ota_ical_url" not in col_names:
-                    conn.exec_driver_sql("ALTER TABLE rooms ADD COLUMN ota_ical_url VARCHAR(500);")
-                # users table - add missing columns if needed (older DBs)
-                res = conn.exec_driver_sql("PRAGMA table_info(users);")
-                col_names = [row[1] for row in res]
-                if "homestay_id" not in col_names:
-                    conn.exec_driver_sql("ALTER TABLE users ADD COLUMN homestay_id INTEGER;")
-                if "currency" not in col_names:
-                    conn.exec_driver_sql("ALTER TABLE users ADD COLUMN currency VARCHAR(8) DEFAULT 'USD' NOT NULL;")
-                # indexes for faster lookups (IF NOT EXISTS is supported by SQLite)
-                conn.exec_driver_sql(
-                    "CREATE INDEX IF NOT EXISTS ix_bookings_room_id ON bookings(room_id);"
-                )
-                conn.exec_driver_sql(
-                    "CREATE INDEX IF NOT EXISTS ix_bookings_start_date ON bookings(start_date);"
-                )
-                conn.exec_driver_sql(
-                    "CREATE INDEX IF NOT EXISTS ix_bookings_end_date ON bookings(end_date);"
-                )
-                # composite index helps overlap searches
-                conn.exec_driver_sql(
-                    "CREATE INDEX IF NOT EXISTS ix_bookings_room_start_end ON bookings(room_id, start_date, end_date);"
-                )
-                # unique owner per subscription (SQLite: unique index works like constraint)
-                conn.exec_driver_sql(
-                    "CREATE UNIQUE INDEX IF NOT EXISTS uq_subscription_owner ON subscriptions(owner_id);"
-                )
-            else:
-                # Postgres-compatible add-if-missing
-                for ddl in [
-                    "ALTER TABLE bookings ADD COLUMN IF NOT EXISTS comment TEXT;",
-                    "ALTER TABLE bookings ADD COLUMN IF NOT EXISTS image_url VARCHAR(500);",
-                    "ALTER TABLE homestays ADD COLUMN IF NOT EXISTS image_url VARCHAR(500);",
-                    "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS image_url VARCHAR(500);",
-                    "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS ota_ical_url VARCHAR(500);",
-                    "ALTER TABLE users ADD COLUMN IF NOT EXISTS homestay_id INTEGER;",
-                    "ALTER TABLE users ADD COLUMN IF NOT EXISTS currency VARCHAR(8) DEFAULT 'USD' NOT NULL;",
-                    "ALTER TABLE users ALTER COLUMN currency SET DEFAULT 'USD';",
-                ]:
-                    try:
-                        conn.exec_driver_sql(ddl)
-                    except Exception:
-                        pass
-                # indexes (IF NOT EXISTS is supported in PG 9.5+)
-                for idx in [
-                    "CREATE INDEX IF NOT EXISTS ix_bookings_room_id ON bookings(room_id);",
-                    "CREATE INDEX IF NOT EXISTS ix_bookings_start_date ON bookings(start_date);",
-                    "CREATE INDEX IF NOT EXISTS ix_bookings_end_date ON bookings(end_date);",
-                    "CREATE INDEX IF NOT EXISTS ix_bookings_room_start_end ON bookings(room_id, start_date, end_date);",
-                ]:
-                    try:
-                        conn.exec_driver_sql(idx)
-                    except Exception:
-                        pass
-                # ensure unique one subscription per owner (if schema was created without constraint)
-                try:
-                    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS uq_subscription_owner ON subscriptions(owner_id);")
-                except Exception:
-                    pass
-    except Exception:
-        # Never fail app startup due to best-effort migration
-        pass
+        yield read_db
+    finally:
+        read_db.close()
+
+
+def remember_primary_write(request: Request, response) -> None:
+    """Set the read-your-writes cookie if this request committed to the primary."""
+    wrote_at = getattr(request.state, "primary_write_at", None)
+    if not wrote_at:
+        return
+    response.set_cookie(
+        key=READ_YOUR_WRITES_COOKIE,
+        value=str(int(wrote_at)),
+        max_age=settings.READ_YOUR_WRITES_SECONDS,
+        httponly=True,
+        samesite="lax",
+        path="/",
+    )
@@ -0,0 +1,176 @@
+"""
+Password hashing.
+
+bcrypt is deliberately slow (tens to hundreds of ms per call), so async handlers must not run
+it on the event loop. `hash_password_async` / `verify_password_async` hand the work to a small
+dedicated thread pool (bcrypt releases the GIL) with a bounded backlog: when more than
+PASSWORD_HASH_MAX_PENDING calls are queued, new ones fail fast with PasswordHasherBusy instead
+of piling up behind each other.
+
+The bcrypt cost is PASSWORD_HASH_ROUNDS. Hashes made with a different cost are transparently
+re-hashed on the next successful login (see `verify_password_async`).
+
+Measure event-loop latency during concurrent logins, inline vs. offloaded:
+
+    python -m app.hashing --logins 20
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_rounds = settings.PASSWORD_HASH_ROUNDS
+# min == max == default so passlib flags hashes of any other cost as needing an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=_rounds,
+    bcrypt__min_rounds=_rounds,
+    bcrypt__max_rounds=_rounds,
+)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password, hashed)
+
+
+def verify_and_update(password: str, hashed: str) -> tuple[bool, Optional[str]]:
+    """(valid, new_hash) — new_hash is set when the stored hash uses an outdated cost."""
+    return pwd_context.verify_and_update(password, hashed)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing backlog is full; callers should answer 503."""
+
+
+class PasswordHasher:
+    """Bounded thread pool for bcrypt work, with queueing metrics."""
+
+    def __init__(self, workers: int, max_pending: int, slow_wait_ms: float = 250.0) -> None:
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.slow_wait_ms = slow_wait_ms
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwhash")
+        return self._executor
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.pending += 1
+        queued_at = time.perf_counter()
+
+        def timed():
+            waited_ms = (time.perf_counter() - queued_at) * 1000
+            with self._lock:
+                self.total_wait_ms += waited_ms
+                self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+            if waited_ms > self.slow_wait_ms:
+                logger.warning("Password hashing waited %.0f ms in queue (%d pending)", waited_ms, self.pending)
+            return fn(*args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), timed)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait_ms / self.completed, 2) if self.completed else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 2),
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run(hash_password, password)
+
+
+async def verify_password_async(password: str, hashed: str) -> tuple[bool, Optional[str]]:
+    """Verify off the event loop; returns (valid, new_hash) like verify_and_update."""
+    return await password_hasher.run(verify_and_update, password, hashed)
+
+
+async def _benchmark(logins: int) -> None:
+    hashed = hash_password("benchmark-password")
+
+    async def probe(stop: asyncio.Event, lags: list[float]) -> None:
+        # A 5 ms sleep should wake after ~5 ms; anything more is time the loop was blocked
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append((time.perf_counter() - start) * 1000 - 5)
+
+    async def scenario(label: str, login) -> None:
+        stop, lags = asyncio.Event(), []
+        probe_task = asyncio.create_task(probe(stop, lags))
+        await asyncio.sleep(0.02)
+        started = time.perf_counter()
+        await asyncio.gather(*[login() for _ in range(logins)])
+        elapsed = (time.perf_counter() - started) * 1000
+        stop.set()
+        await probe_task
+        lags.sort()
+        p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+        print(f"{label:<10} {logins} logins in {elapsed:7.0f} ms | loop lag max {max(lags or [0]):6.1f} ms, p99 {p99:6.1f} ms")
+
+    async def inline():
+        verify_password("benchmark-password", hashed)
+
+    async def offloaded():
+        await verify_password_async("benchmark-password", hashed)
+
+    print(f"bcrypt rounds={_rounds}, workers={password_hasher.workers}")
+    await scenario("inline", inline)
+    await scenario("executor", offloaded)
+    print(password_hasher.stats())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Event-loop latency during concurrent bcrypt logins")
+    parser.add_argument("--logins", type=int, default=20)
+    asyncio.run(_benchmark(parser.parse_args().logins))
@@ -1,9 +1,168 @@
+"""
+Rate limiting (slowapi).
+
+Limits are kept in the store named by RATE_LIMIT_STORAGE_URI so every worker process and
+replica shares the same counters:
+
+- `redis://host:6379/0` (or any Redis-protocol server) for multi-host deployments,
+- `sqlite:////var/lib/staycal/ratelimit.db` for several workers on one host without Redis,
+- `memory://` (per process) for development.
+
+Limits use a sliding (moving) window by default. Signed-in callers are keyed by user id, so
+users behind one NAT don't share a budget; everyone else is keyed by client address. Static
+files and /healthz are exempt. If a remote store is unreachable the limiter falls back to
+in-memory counters until it comes back.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from fastapi import Request
+from limits.storage import MovingWindowSupport, Storage
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+
 from .config import settings
+from .security import get_current_user_id
+
+
+class SQLiteStorage(Storage, MovingWindowSupport):
+    """
+    limits storage backed by a local SQLite file, shared by all processes on the host.
+    Writes run in `BEGIN IMMEDIATE` transactions so check-and-acquire is atomic across workers.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+    _PRUNE_EVERY = 1000
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options) -> None:
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        # Same convention as SQLAlchemy: sqlite:///relative.db, sqlite:////absolute/path.db
+        self.path = uri[len("sqlite:///"):]
+        self.timeout = float(options.get("timeout", 5.0))
+        self._local = threading.local()
+        self._ops = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rate_counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS rate_events (key TEXT NOT NULL, at REAL NOT NULL, expires_at REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS ix_rate_events_key_at ON rate_events (key, at);
+            CREATE INDEX IF NOT EXISTS ix_rate_events_expires ON rate_events (expires_at);
+            """
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit mode; transactions are opened explicitly where atomicity matters
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _maybe_prune(self, conn: sqlite3.Connection, now: float) -> None:
+        self._ops += 1
+        if self._ops % self._PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM rate_events WHERE expires_at < ?", (now,))
+            conn.execute("DELETE FROM rate_counters WHERE expires_at < ?", (now,))
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM rate_counters WHERE key = ? AND expires_at <= ?", (key, now))
+            conn.execute(
+                "INSERT INTO rate_counters (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                (key, amount, now + expiry),
+            )
+            value = conn.execute("SELECT value FROM rate_counters WHERE key = ?", (key,)).fetchone()[0]
+            self._maybe_prune(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def get(self, key: str) -> int:
+        row = self._conn().execute("SELECT value FROM rate_counters WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._conn().execute("SELECT expires_at FROM rate_counters WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM rate_counters").rowcount
+        removed += conn.execute("DELETE FROM rate_events").rowcount
+        return removed
+
+    def clear(self, key: str) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM rate_counters WHERE key = ?", (key,))
+        conn.execute("DELETE FROM rate_events WHERE key = ?", (key,))
+
+    def acquire_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM rate_events WHERE key = ? AND at <= ?", (key, now - expiry))
+            count = conn.execute("SELECT COUNT(*) FROM rate_events WHERE key = ?", (key,)).fetchone()[0]
+            acquired = count + amount <= limit
+            if acquired:
+                conn.executemany("INSERT INTO rate_events (key, at, expires_at) VALUES (?, ?, ?)", [(key, now, now + expiry)] * amount)
+            self._maybe_prune(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def get_moving_window(self, key: str, limit: int, expiry: int) -> tuple[float, int]:
+        now = time.time()
+        oldest, count = self._conn().execute(
+            "SELECT MIN(at), COUNT(*) FROM rate_events WHERE key = ? AND at > ?", (key, now - expiry)
+        ).fetchone()
+        return (oldest if oldest is not None else now), count
+
+
+def rate_limit_key(request: Request) -> str:
+    """Per-user key for signed-in callers, client address otherwise."""
+    user_id = get_current_user_id(request)
+    if user_id:
+        return f"user:{user_id}"
+    return get_remote_address(request)
+
 
 limiter = Limiter(
-    key_func=get_remote_address,
+    key_func=rate_limit_key,
     default_limits=[settings.RATE_LIMIT_DEFAULT],
     enabled=settings.RATE_LIMIT_ENABLED,
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    strategy=settings.RATE_LIMIT_STRATEGY,
+    # Keep limiting (per process) if the shared store goes away
+    in_memory_fallback_enabled=not settings.RATE_LIMIT_STORAGE_URI.startswith("memory://"),
+    key_prefix="staycal",
 )
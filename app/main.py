@@ -2,20 +2,31 @@ import logging
 
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
-from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
+from slowapi.middleware import SlowAPIASGIMiddleware
 
 from .config import settings
-from .db import SessionLocal
+from .db import SessionLocal, engine, remember_primary_write
 from .limiter import limiter
+from .query_stats import QueryStatsMiddleware
+from .slow_queries import slow_query_log
+from .upload_limit import UploadSizeLimitMiddleware
+from .compression import CompressionMiddleware
+from .static_files import static_files
+from .schema import schema_is_current
 from .models import User
 from .routers import auth_views, app_views, calendar_htmx_views, admin_views, public_views
 from .routers import rooms_views, bookings_views, homestays_views
 from .routers import settings_views, ui_components
 from .security import hash_password
-from .templating import templates
+from .hashing import password_hasher
+from .services.recaptcha import close_client as close_recaptcha_client
+from .services.mail_worker import start_background_worker as start_mail_worker, stop_background_worker as stop_mail_worker
+from .services.media import configure_cloudinary, shutdown_upload_executor, shutdown_variant_pool as shutdown_image_variant_pool
+from .services.ical import shutdown_ota_refresh
+from .templating import templates, precompile_templates
 
 # --- Logging configuration ---
 _level = logging.DEBUG if getattr(settings, "DEBUG", False) else logging.INFO
@@ -48,8 +59,8 @@ app = FastAPI(
     ],
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Mount static files (fingerprinted, long-lived caching, precompressed variants)
+app.mount("/static", static_files, name="static")
 
 # Add session middleware
 app.add_middleware(
@@ -58,6 +69,21 @@ app.add_middleware(
     max_age=settings.SESSION_MAX_AGE_DAYS * 24 * 60 * 60 # days in seconds
 )
 
+# Reject oversized multipart uploads while they stream in
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# Count queries per request (Server-Timing header, budget / N+1 warnings)
+if settings.QUERY_STATS_ENABLED:
+    app.add_middleware(QueryStatsMiddleware)
+
+# Pin clients to the primary briefly after they write (only needed with a read replica)
+if settings.DATABASE_REPLICA_URL:
+    @app.middleware("http")
+    async def read_your_writes(request, call_next):
+        response = await call_next(request)
+        remember_primary_write(request, response)
+        return response
+
 @app.on_event("startup")
 def startup_event():
     """Runs startup tasks, like ensuring a default admin exists."""
@@ -81,12 +107,37 @@ def startup_event():
         finally:
             db.close()
 
+    # Read-only revision check; migrations are applied by entrypoint.sh / `alembic upgrade head`
+    if not schema_is_current(engine):
+        logger.warning("Database schema is behind the Alembic head; run `alembic upgrade head`.")
+
     _ensure_default_admin()
+    logger.info("Compiled %d templates.", precompile_templates())
+    if configure_cloudinary():
+        logger.info("Cloudinary image storage enabled.")
+    if settings.MAIL_WORKER_IN_PROCESS:
+        start_mail_worker()
     logger.info("Startup tasks complete.")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    password_hasher.shutdown()
+    await close_recaptcha_client()
+    stop_mail_worker()
+    shutdown_upload_executor()
+    shutdown_image_variant_pool()
+    shutdown_ota_refresh()
+    slow_query_log.shutdown()
+
+
 # Add the limiter to the app state
 app.state.limiter = limiter
+# Apply RATE_LIMIT_DEFAULT to every route without its own limit (mounted static files are skipped)
+app.add_middleware(SlowAPIASGIMiddleware)
+# Outermost: gzip/Brotli for HTML, JSON, CSV and iCal responses (streamed exports included)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
 # Add the exception handler for rate limit exceeded errors
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -108,7 +159,7 @@ app.include_router(api_mobile.router)
 @app.get("/healthz")
 @limiter.exempt
 def healthz():
-    return {"status": "ok"}
+    return {"status": "ok", "password_hasher": password_hasher.stats()}
 
 
 # Convenience: Mobile API Swagger shortcut
@@ -2,5 +2,9 @@ from .user import User, UserRole
 from .homestay import Homestay
 from .room import Room
 from .booking import Booking, BookingStatus
+from .booking_archive import ArchivedBooking
 from .subscription import Subscription, SubscriptionStatus
 from .plan import Plan
+from .email_outbox import OutboundEmail, OutboxStatus
+from .media_asset import MediaAsset
+from .change_tracking import bump_content_version, on_homestay_change
@@ -2,8 +2,8 @@ from __future__ import annotations
 from datetime import date, datetime
 from typing import TYPE_CHECKING, Optional
 from enum import Enum as PyEnum
-from sqlalchemy import Integer, String, ForeignKey, Date, Numeric, Text, Enum, DateTime
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import Integer, String, ForeignKey, Date, Numeric, Text, Enum, DateTime, Index, JSON, event, select
+from sqlalchemy.orm import Mapped, mapped_column, relationship, attributes
 from ..db import Base
 
 if TYPE_CHECKING:
@@ -18,9 +18,20 @@ class BookingStatus(str, PyEnum):
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Availability checks scan a room's stays by date (created by migration 20251028_0001)
+        Index("ix_bookings_room_start_end", "room_id", "start_date", "end_date"),
+        # Tenant-scoped dashboards, lists and exports scan by property or owner instead of room_id IN (...)
+        Index("ix_bookings_homestay_start", "homestay_id", "start_date"),
+        Index("ix_bookings_homestay_status_end", "homestay_id", "status", "end_date"),
+        Index("ix_bookings_owner_start", "owner_id", "start_date"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     room_id: Mapped[int] = mapped_column(ForeignKey("rooms.id"), index=True)
+    # Denormalized from the room (kept in sync by _sync_tenant_columns below)
+    homestay_id: Mapped[int | None] = mapped_column(ForeignKey("homestays.id"), nullable=True)
+    owner_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)
     guest_name: Mapped[str] = mapped_column(String(200), nullable=False)
     guest_contact: Mapped[str | None] = mapped_column(String(200))
     start_date: Mapped[date] = mapped_column(Date, nullable=False, index=True)
@@ -28,8 +39,28 @@ class Booking(Base):
     price: Mapped[float | None] = mapped_column(Numeric(10, 2))
     status: Mapped[BookingStatus] = mapped_column(Enum(BookingStatus), default=BookingStatus.TENTATIVE, nullable=False)
     comment: Mapped[str | None] = mapped_column(Text)
-    image_url: Mapped[str | None] = mapped_column(String(500))
+    image_url: Mapped[str | None] = mapped_column(String(500), active_history=True)
+    image_variants: Mapped[dict | None] = mapped_column(JSON)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # On Postgres the table also has a generated `stay daterange` column with a GiST
+    # exclusion constraint (see migration 20251025_0001). It is not mapped so SQLite keeps working.
 
     # Relationships
     room: Mapped[Room] = relationship(back_populates="bookings")
+
+
+@event.listens_for(Booking, "before_insert")
+@event.listens_for(Booking, "before_update")
+def _sync_tenant_columns(mapper, connection, target: Booking) -> None:
+    """Copy homestay_id/owner_id from the booking's room on insert and whenever it moves rooms."""
+    if target.homestay_id is not None and not attributes.get_history(target, "room_id").has_changes():
+        return
+    from .room import Room
+    from .homestay import Homestay
+    row = connection.execute(
+        select(Room.homestay_id, Homestay.owner_id)
+        .join(Homestay, Homestay.id == Room.homestay_id)
+        .where(Room.id == target.room_id)
+    ).first()
+    if row is not None:
+        target.homestay_id, target.owner_id = row
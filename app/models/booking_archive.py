@@ -0,0 +1,34 @@
+from datetime import date, datetime
+from sqlalchemy import Integer, String, Date, Numeric, Text, Enum, DateTime, Index, JSON
+from sqlalchemy.orm import Mapped, mapped_column
+from ..db import Base
+from .booking import BookingStatus
+
+class ArchivedBooking(Base):
+    """
+    Finished bookings (checked out or cancelled) moved out of the hot `bookings` table.
+    Mirrors Booking's columns so reports can treat both alike. No foreign keys:
+    archived history must not block deleting a room or property.
+    """
+    __tablename__ = "bookings_archive"
+    __table_args__ = (
+        Index("ix_bookings_archive_owner_start", "owner_id", "start_date"),
+        Index("ix_bookings_archive_homestay_start", "homestay_id", "start_date"),
+        Index("ix_bookings_archive_end_date", "end_date"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    room_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    homestay_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    owner_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    guest_name: Mapped[str] = mapped_column(String(200), nullable=False)
+    guest_contact: Mapped[str | None] = mapped_column(String(200))
+    start_date: Mapped[date] = mapped_column(Date, nullable=False)
+    end_date: Mapped[date] = mapped_column(Date, nullable=False)
+    price: Mapped[float | None] = mapped_column(Numeric(10, 2))
+    status: Mapped[BookingStatus] = mapped_column(Enum(BookingStatus), nullable=False)
+    comment: Mapped[str | None] = mapped_column(Text)
+    image_url: Mapped[str | None] = mapped_column(String(500))
+    image_variants: Mapped[dict | None] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
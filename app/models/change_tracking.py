@@ -0,0 +1,95 @@
+"""
+Per-homestay change version.
+
+Any insert, update or delete of a homestay, one of its rooms or one of its bookings bumps
+homestays.content_version (once per flush) and stamps content_updated_at. Public pages use
+the version to validate caches (see app.public_cache). Listeners registered with
+`on_homestay_change` are told which homestays changed once the transaction commits.
+
+Bulk `Query.update`/Core statements fire no mapper events; code issuing them calls
+`bump_content_version` with the affected homestay ids.
+"""
+from datetime import datetime
+from typing import Callable, Iterable
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session, attributes, object_session
+
+from ..db import SessionLocal
+from .homestay import Homestay
+from .room import Room
+from .booking import Booking
+
+_listeners: list[Callable[[set[int]], None]] = []
+
+
+def on_homestay_change(callback: Callable[[set[int]], None]) -> None:
+    _listeners.append(callback)
+
+
+def _bump_statement(homestay_ids: set):
+    table = Homestay.__table__
+    return (
+        update(table)
+        .where(table.c.id.in_(homestay_ids))
+        .values(content_version=table.c.content_version + 1, content_updated_at=datetime.utcnow())
+    )
+
+
+def _bump(connection, target, homestay_ids: Iterable) -> None:
+    session = object_session(target)
+    bumped = session.info.setdefault("homestays_bumped", set()) if session is not None else set()
+    for homestay_id in homestay_ids:
+        if homestay_id is None or homestay_id in bumped:
+            continue
+        bumped.add(homestay_id)
+        if session is not None:
+            session.info.setdefault("homestay_changes", set()).add(homestay_id)
+        connection.execute(_bump_statement({homestay_id}))
+
+
+def bump_content_version(db: Session, homestay_ids: Iterable) -> None:
+    """Bump the version of homestays changed by a bulk statement in db's transaction; listeners hear on commit."""
+    ids = {homestay_id for homestay_id in homestay_ids if homestay_id is not None}
+    if not ids:
+        return
+    db.execute(_bump_statement(ids))
+    db.info.setdefault("homestay_changes", set()).update(ids)
+
+
+def _owning_homestays(target) -> set:
+    if isinstance(target, Homestay):
+        return {target.id}
+    history = attributes.get_history(target, "homestay_id")
+    return {target.homestay_id, *history.deleted}
+
+
+@event.listens_for(Homestay, "after_update")
+@event.listens_for(Homestay, "after_delete")
+@event.listens_for(Room, "after_insert")
+@event.listens_for(Room, "after_update")
+@event.listens_for(Room, "after_delete")
+@event.listens_for(Booking, "after_insert")
+@event.listens_for(Booking, "after_update")
+@event.listens_for(Booking, "after_delete")
+def _homestay_content_changed(mapper, connection, target) -> None:
+    _bump(connection, target, _owning_homestays(target))
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _reset_bumped(session, flush_context):
+    session.info.pop("homestays_bumped", None)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _notify_committed(session):
+    changed = session.info.pop("homestay_changes", None)
+    if changed:
+        for callback in _listeners:
+            callback(changed)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("homestay_changes", None)
+    session.info.pop("homestays_bumped", None)
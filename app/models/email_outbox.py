@@ -0,0 +1,38 @@
+from datetime import datetime
+from sqlalchemy import Integer, String, Text, DateTime, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from ..db import Base
+
+
+class OutboxStatus:
+    PENDING = "pending"
+    SENDING = "sending"  # claimed by a worker; reclaimable once next_attempt_at (the lease) passes
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class OutboundEmail(Base):
+    """
+    Transactional email outbox. Rows are written in the same transaction as the change that
+    triggers them and delivered by the mail worker (app.services.mail_worker), so a rolled-back
+    sign-up never sends mail and a provider outage only delays it.
+    """
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    to_address: Mapped[str] = mapped_column(String(255), nullable=False)
+    from_name: Mapped[str] = mapped_column(String(100), nullable=False, default="GoStayPro")
+    subject: Mapped[str] = mapped_column(String(255), nullable=False)
+    html: Mapped[str] = mapped_column(Text, nullable=False)
+    # Optional idempotency key; a second message with the same key is not queued
+    dedupe_key: Mapped[str | None] = mapped_column(String(255), unique=True)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default=OutboxStatus.PENDING)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Integer, String, ForeignKey, DateTime
+from sqlalchemy import Integer, String, ForeignKey, DateTime, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from ..db import Base
 
@@ -10,8 +10,14 @@ class Homestay(Base):
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     name: Mapped[str] = mapped_column(String(200), nullable=False)
     address: Mapped[str] = mapped_column(String(300), nullable=True)
-    image_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    # active_history: the old URL is needed to release its media_assets reference
+    image_url: Mapped[str | None] = mapped_column(String(500), nullable=True, active_history=True)
+    # Resized/WebP derivatives of image_url, see services.media.VARIANT_WIDTHS
+    image_variants: Mapped[dict | None] = mapped_column(JSON, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Bumped whenever the property, its rooms or its bookings change (models.change_tracking)
+    content_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    content_updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     # Owner of the homestay via homestays.owner_id -> users.id
     owner: Mapped["User"] = relationship(back_populates="homestays_owned", foreign_keys=[owner_id])
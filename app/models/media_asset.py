@@ -0,0 +1,68 @@
+from datetime import datetime
+from sqlalchemy import Integer, String, DateTime, Index, JSON, event, update
+from sqlalchemy.orm import Mapped, mapped_column, attributes
+from ..db import Base
+from .homestay import Homestay
+from .room import Room
+from .booking import Booking
+
+
+class MediaAsset(Base):
+    """
+    One stored image, keyed by the SHA-256 of its bytes, so re-uploading the same photo reuses
+    it instead of storing another copy. `ref_count` counts homestays, rooms and bookings whose
+    image_url points at it (kept up to date by the mapper events below); assets left at zero
+    are removed by app.services.media.collect_orphans.
+    """
+    __tablename__ = "media_assets"
+    __table_args__ = (
+        Index("ix_media_assets_ref_count_updated", "ref_count", "updated_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    url: Mapped[str] = mapped_column(String(500), nullable=False, unique=True)
+    # Cloudinary asset id; NULL for files under app/static/uploads
+    public_id: Mapped[str | None] = mapped_column(String(255))
+    variants: Mapped[dict | None] = mapped_column(JSON)
+    size_bytes: Mapped[int] = mapped_column(Integer, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+def _adjust_refs(connection, url: str | None, delta: int) -> None:
+    if not url or not delta:
+        return
+    connection.execute(
+        update(MediaAsset.__table__)
+        .where(MediaAsset.__table__.c.url == url)
+        .values(ref_count=MediaAsset.__table__.c.ref_count + delta, updated_at=datetime.utcnow())
+    )
+
+
+@event.listens_for(Homestay, "after_insert")
+@event.listens_for(Room, "after_insert")
+@event.listens_for(Booking, "after_insert")
+def _ref_on_insert(mapper, connection, target) -> None:
+    _adjust_refs(connection, target.image_url, 1)
+
+
+@event.listens_for(Homestay, "after_update")
+@event.listens_for(Room, "after_update")
+@event.listens_for(Booking, "after_update")
+def _ref_on_update(mapper, connection, target) -> None:
+    history = attributes.get_history(target, "image_url")
+    if not history.has_changes():
+        return
+    for url in history.deleted:
+        _adjust_refs(connection, url, -1)
+    for url in history.added:
+        _adjust_refs(connection, url, 1)
+
+
+@event.listens_for(Homestay, "before_delete")
+@event.listens_for(Room, "before_delete")
+@event.listens_for(Booking, "before_delete")
+def _ref_on_delete(mapper, connection, target) -> None:
+    _adjust_refs(connection, target.image_url, -1)
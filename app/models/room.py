@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, ForeignKey, Numeric
+from sqlalchemy import Integer, String, ForeignKey, Numeric, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from ..db import Base
 
@@ -10,7 +10,10 @@ class Room(Base):
     name: Mapped[str] = mapped_column(String(200), nullable=False)
     capacity: Mapped[int] = mapped_column(Integer, nullable=False, default=2)
     default_rate: Mapped[float] = mapped_column(Numeric(10,2), nullable=True)
-    image_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    # active_history: the old URL is needed to release its media_assets reference
+    image_url: Mapped[str | None] = mapped_column(String(500), nullable=True, active_history=True)
+    # Resized/WebP derivatives of image_url, see services.media.VARIANT_WIDTHS
+    image_variants: Mapped[dict | None] = mapped_column(JSON, nullable=True)
     ota_ical_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
 
     homestay: Mapped["Homestay"] = relationship(back_populates="rooms")
@@ -0,0 +1,124 @@
+"""
+Short-lived cache of the authenticated principal.
+
+Most requests only need to know who the caller is, their role and which homestays they can
+act on. Instead of loading the full User row on every request, a small immutable `Principal`
+is cached per user id (decoded from the signed session cookie) for PRINCIPAL_CACHE_SECONDS.
+
+Entries are dropped whenever a flush touches the user or a homestay they own, and again
+after that transaction commits, so role changes, homestay switches and deletions take
+effect on the next request in this process. Other worker processes converge within the TTL;
+admin routes re-check the role against the database so privileges are revoked at once.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .db import SessionLocal
+from .models import User, Homestay, UserRole
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    role: str
+    homestay_id: Optional[int]
+    owned_homestay_ids: frozenset[int]
+    currency: str = "USD"  # display currency, used by page templates
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == UserRole.ADMIN
+
+    def can_access_homestay(self, homestay_id: Optional[int]) -> bool:
+        return homestay_id is not None and (homestay_id == self.homestay_id or homestay_id in self.owned_homestay_ids)
+
+
+class PrincipalCache:
+    """Thread-safe TTL map of user id -> Principal."""
+
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._entries: dict[int, tuple[float, Principal]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at < time.monotonic():
+            self.invalidate(user_id)
+            return None
+        return principal
+
+    def set(self, principal: Principal) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl_seconds, principal)
+
+    def invalidate(self, *user_ids: Optional[int]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SECONDS)
+
+
+def load_principal(db: Session, user_id: int) -> Optional[Principal]:
+    """Build a Principal with a single query (user row outer-joined to the homestays they own)."""
+    rows = (
+        db.query(User.id, User.role, User.homestay_id, Homestay.id, User.currency)
+        .outerjoin(Homestay, Homestay.owner_id == User.id)
+        .filter(User.id == user_id)
+        .all()
+    )
+    if not rows:
+        return None
+    uid, role, homestay_id, _, currency = rows[0]
+    owned = frozenset(row[3] for row in rows if row[3] is not None)
+    return Principal(id=uid, role=str(role.value if isinstance(role, UserRole) else role), homestay_id=homestay_id, owned_homestay_ids=owned, currency=currency)
+
+
+def _affected_user_ids(session: Session) -> set[int]:
+    ids: set[int] = set()
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            ids.add(obj.id)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Homestay):
+            history = inspect(obj).attrs.owner_id.history
+            ids.update(owner_id for owner_id in [obj.owner_id, *history.deleted] if owner_id is not None)
+    return ids
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _invalidate_on_flush(session, flush_context):
+    ids = _affected_user_ids(session)
+    if ids:
+        principal_cache.invalidate(*ids)
+        session.info.setdefault("principal_changes", set()).update(ids)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_on_commit(session):
+    # A concurrent request may have re-cached the pre-commit row between flush and commit
+    ids = session.info.pop("principal_changes", None)
+    if ids:
+        principal_cache.invalidate(*ids)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("principal_changes", None)
@@ -0,0 +1,177 @@
+"""
+HTTP and in-process caching for the public property pages.
+
+/public/{homestay_id} and /public/calendar/events are keyed on the property's
+`content_version`, which any change to the homestay, its rooms or its bookings bumps (see
+models.change_tracking). Each worker keeps:
+
+* the current version per homestay (and the homestay of each room) for
+  PUBLIC_CACHE_VERSION_SECONDS, dropped as soon as a local transaction changing it commits;
+* up to PUBLIC_PAGE_CACHE_ENTRIES rendered bodies keyed by (page, parameters, version), each
+  kept for PUBLIC_PAGE_CACHE_SECONDS, which also bounds how stale merged OTA events can be.
+
+A repeat view therefore costs one lookup and no queries, and responses carry an ETag,
+Last-Modified and `Cache-Control: public, max-age=..., stale-while-revalidate=...`, so
+browsers and CDNs revalidate with a 304 instead of downloading the page again.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Hashable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import Homestay, Room, on_homestay_change
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    body: bytes
+    media_type: str
+    etag: str
+    last_modified: Optional[datetime]
+
+
+class ResponseCache:
+    """Thread-safe LRU of rendered response bodies with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[float, CachedBody]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, body: bytes, media_type: str, last_modified: Optional[datetime] = None) -> CachedBody:
+        cached = CachedBody(body, media_type, f'W/"{hashlib.sha1(body).hexdigest()[:20]}"', last_modified)
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return cached
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, cached)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cached
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class VersionCache:
+    """Thread-safe TTL map of homestay id -> (content_version, content_updated_at), plus room id -> homestay id."""
+
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._versions: dict[int, tuple[float, int, Optional[datetime]]] = {}
+        self._rooms: dict[int, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def homestay(self, db: Session, homestay_id: int) -> Optional[tuple[int, Optional[datetime]]]:
+        """(version, updated_at) of a homestay, or None if it does not exist."""
+        entry = self._versions.get(homestay_id)
+        if entry is not None and entry[0] >= time.monotonic():
+            return entry[1], entry[2]
+        row = db.query(Homestay.content_version, Homestay.content_updated_at, Homestay.created_at).filter(Homestay.id == homestay_id).first()
+        if row is None:
+            return None
+        version, updated_at = row[0] or 0, row[1] or row[2]
+        if self.ttl_seconds > 0:
+            with self._lock:
+                self._versions[homestay_id] = (time.monotonic() + self.ttl_seconds, version, updated_at)
+        return version, updated_at
+
+    def room(self, db: Session, room_id: int) -> Optional[tuple[int, int, Optional[datetime]]]:
+        """(homestay_id, version, updated_at) for a room's property, or None if the room does not exist."""
+        entry = self._rooms.get(room_id)
+        if entry is not None and entry[0] >= time.monotonic():
+            homestay_id = entry[1]
+        else:
+            row = db.query(Room.homestay_id).filter(Room.id == room_id).first()
+            if row is None:
+                return None
+            homestay_id = row[0]
+            if self.ttl_seconds > 0:
+                with self._lock:
+                    self._rooms[room_id] = (time.monotonic() + self.ttl_seconds, homestay_id)
+        version = self.homestay(db, homestay_id)
+        if version is None:
+            return None
+        return homestay_id, version[0], version[1]
+
+    def invalidate(self, homestay_ids: set[int]) -> None:
+        with self._lock:
+            for homestay_id in homestay_ids:
+                self._versions.pop(homestay_id, None)
+            for room_id in [r for r, (_, h) in self._rooms.items() if h in homestay_ids]:
+                del self._rooms[room_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+            self._rooms.clear()
+
+
+versions = VersionCache(settings.PUBLIC_CACHE_VERSION_SECONDS)
+pages = ResponseCache(settings.PUBLIC_PAGE_CACHE_ENTRIES, settings.PUBLIC_PAGE_CACHE_SECONDS)
+on_homestay_change(versions.invalidate)
+
+PUBLIC_CACHE_CONTROL = f"public, max-age={settings.PUBLIC_CACHE_MAX_AGE}, stale-while-revalidate={settings.PUBLIC_CACHE_STALE_SECONDS}"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison: the compression middleware may have added or kept a W/ prefix
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+
+def _not_modified(request: Request, cached: CachedBody) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, cached.etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and cached.last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return cached.last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def cached_response(request: Request, cached: CachedBody, cache_control: str = PUBLIC_CACHE_CONTROL) -> Response:
+    """The cached body, or a bodiless 304 when the client's validators still match."""
+    headers = {"ETag": cached.etag, "Cache-Control": cache_control}
+    if cached.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(cached.last_modified, usegmt=True)
+    if _not_modified(request, cached):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type=cached.media_type, headers=headers)
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC timestamps from the database as aware datetimes."""
+    if value is None:
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
@@ -0,0 +1,172 @@
+"""
+Per-request SQL accounting.
+
+Engine-level hooks count every statement and its duration (other modules such as
+slow_queries subscribe with `add_statement_observer` instead of timing statements again);
+QueryStatsMiddleware scopes the numbers to one request, exposes them as a `Server-Timing` header and logs a warning when a
+route goes over its query budget or repeats the same statement shape (the usual N+1 sign).
+
+In tests, wrap a client call with `assert_max_queries(n)` to pin a route's query budget:
+
+    with assert_max_queries(8):
+        client.get("/app")
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))+\s*\)")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+|:\w+|\b\d+\b|'[^']*'")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Normalise SQL so statements differing only in parameters/IN-list length compare equal."""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _IN_LIST.sub("(?)", shape)
+    return _PLACEHOLDER.sub("?", shape)
+
+
+class QueryStats:
+    """Query count, total DB time and statement-shape histogram for one unit of work."""
+
+    def __init__(self, scope: Optional[dict] = None) -> None:
+        self.scope = scope
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def route_label(self) -> str:
+        """Label such as 'GET /app/rooms/{room_id}' for the request these stats belong to."""
+        if self.scope is None:
+            return "-"
+        route = self.scope.get("route")
+        return f"{self.scope.get('method', '')} {getattr(route, 'path', None) or self.scope.get('path', '')}"
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_ms:.2f};desc="{self.count} queries"'
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+# Collectors that see every statement regardless of context (used by assert_max_queries,
+# since a TestClient request runs on another thread than the test body).
+_global_collectors: list[QueryStats] = []
+# Called as observer(conn, statement, parameters, executemany, elapsed_ms) after every statement
+_observers: list[Callable] = []
+
+
+def add_statement_observer(observer: Callable) -> None:
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+    for collector in _global_collectors:
+        collector.record(statement, elapsed_ms)
+    for observer in _observers:
+        observer(conn, statement, parameters, executemany, elapsed_ms)
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_timer(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time so it does not
+    # linger on the pooled connection and get paired with a later statement
+    conn = exception_context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def current_stats() -> Optional[QueryStats]:
+    """Stats for the request being handled, if any."""
+    return _current.get()
+
+
+def current_route() -> str:
+    """Route label of the request being handled, or "-" outside a request."""
+    stats = _current.get()
+    return stats.route_label() if stats is not None else "-"
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware that scopes QueryStats to a request and reports on it."""
+
+    def __init__(self, app, budget: Optional[int] = None, repeat_threshold: Optional[int] = None):
+        self.app = app
+        self.budget = budget if budget is not None else settings.QUERY_BUDGET_PER_REQUEST
+        self.repeat_threshold = repeat_threshold if repeat_threshold is not None else settings.QUERY_REPEAT_THRESHOLD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope)
+        token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._report(scope, stats)
+
+    def _report(self, scope, stats: QueryStats) -> None:
+        label = stats.route_label()
+        if self.budget and stats.count > self.budget:
+            logger.warning("%s issued %d queries (budget %d, %.1f ms)", label, stats.count, self.budget, stats.total_ms)
+        if self.repeat_threshold:
+            for shape, n in stats.repeated(self.repeat_threshold):
+                logger.warning("%s repeated a statement %d times (possible N+1): %s", label, n, shape[:300])
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Fail with the offending statement shapes if the block runs more than `limit` queries."""
+    stats = QueryStats()
+    _global_collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        _global_collectors.remove(stats)
+    if stats.count > limit:
+        detail = "\n".join(f"  {n}x {shape}" for shape, n in stats.shapes.most_common())
+        raise AssertionError(f"Expected at most {limit} queries, got {stats.count}:\n{detail}")
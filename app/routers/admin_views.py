@@ -4,26 +4,38 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
 from datetime import datetime, date, timedelta
 import os
-from ..db import get_db
-from ..models import User, Homestay, Subscription, SubscriptionStatus, Room, Booking, BookingStatus, UserRole, Plan
-from ..security import get_current_user_id, hash_password, verify_password
+from ..db import get_db, get_read_db
+from ..models import User, Homestay, Subscription, SubscriptionStatus, Room, Booking, BookingStatus, UserRole, Plan, ArchivedBooking
+from ..principal import Principal, principal_cache
+from ..security import get_principal, hash_password, verify_password
 from ..config import settings
-from ..services.media import _ensure_cloudinary_configured
 from ..templating import templates
 from ..services.currency import CURRENCY_SYMBOLS
+from ..slow_queries import slow_query_log
+from ..hashing import verify_password_async, PasswordHasherBusy
+from ..services.recaptcha import verify_recaptcha
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-# Dependency to protect admin routes
-def require_admin(request: Request, db: Session = Depends(get_db)) -> User:
-    uid = get_current_user_id(request)
-    if not uid:
+# Dependency to protect admin routes. The role is re-read from the database on every call:
+# cached principals are only invalidated in the worker that changed them, and a demoted or
+# deleted admin must lose access everywhere at once. Handlers that change the admin's own
+# row load it with _admin_row.
+def require_admin(request: Request, db: Session = Depends(get_db)) -> Principal:
+    principal = get_principal(request, db)
+    if principal is None:
         raise HTTPException(status_code=307, headers={"Location": "/admin/login"})
-    
-    user = db.query(User).get(uid)
-    if not user or user.role != "admin":
+    role = db.query(User.role).filter(User.id == principal.id).scalar()
+    if role != UserRole.ADMIN:
+        principal_cache.invalidate(principal.id)
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return principal
+
+
+def _admin_row(db: Session, admin: Principal) -> User:
+    user = db.get(User, admin.id)
+    if not user or user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Forbidden")
-    
     return user
 
 @router.get("/login", response_class=HTMLResponse)
@@ -34,30 +46,8 @@ def admin_login_form(request: Request):
     return templates.TemplateResponse("admin/login.html", {"request": request, "recaptcha_site_key": site_key, "recaptcha_version": version, "recaptcha_action": action})
 
 
-def _verify_recaptcha_admin(token: str | None, remote_ip: str | None) -> tuple[bool, dict]:
-    secret = getattr(settings, "RECAPTCHA_SECRET_KEY", "")
-    if not secret:
-        return True, {"skipped": True}
-    if not token:
-        return False, {"error": "missing-token"}
-    from urllib.parse import urlencode
-    from urllib import request as urlrequest
-    import json
-    data = urlencode({"secret": secret, "response": token, "remoteip": remote_ip or ""}).encode()
-    try:
-        req = urlrequest.Request("https://www.google.com/recaptcha/api/siteverify", data=data)
-        with urlrequest.urlopen(req, timeout=5) as resp:
-            payload = resp.read()
-            res = json.loads(payload.decode("utf-8"))
-            return bool(res.get("success")), res
-    except Exception as e:
-        if getattr(settings, "DEBUG", False):
-            return True, {"debug": True, "exception": str(e)}
-        return False, {"exception": str(e)}
-
-
 @router.post("/login")
-def admin_login(request: Request, email: str = Form(...), password: str = Form(...), g_recaptcha_response: str | None = Form(None, alias="g-recaptcha-response"), db: Session = Depends(get_db)):
+async def admin_login(request: Request, email: str = Form(...), password: str = Form(...), g_recaptcha_response: str | None = Form(None, alias="g-recaptcha-response"), db: Session = Depends(get_db)):
     # reCAPTCHA (optional, enforced if keys configured)
     site_key = getattr(settings, "RECAPTCHA_SITE_KEY", "")
     secret_key = getattr(settings, "RECAPTCHA_SECRET_KEY", "")
@@ -65,7 +55,7 @@ def admin_login(request: Request, email: str = Form(...), password: str = Form(.
     action = "admin_login"
     if site_key and secret_key:
         client_ip = request.client.host if request.client else None
-        ok, res = _verify_recaptcha_admin(g_recaptcha_response, client_ip)
+        ok, res = await verify_recaptcha(g_recaptcha_response, client_ip)
         if ok:
             expected_action = "admin_login"
             min_score = float(getattr(settings, "RECAPTCHA_MIN_SCORE", 0.5))
@@ -86,8 +76,18 @@ def admin_login(request: Request, email: str = Form(...), password: str = Form(.
                 status_code=400,
             )
     user = db.query(User).filter(User.email == email).first()
-    from ..security import verify_password, set_session
-    if not user or not verify_password(password, user.hashed_password):
+    from ..security import set_session
+    valid, new_hash = False, None
+    if user and user.hashed_password:
+        try:
+            valid, new_hash = await verify_password_async(password, user.hashed_password)
+        except PasswordHasherBusy:
+            return templates.TemplateResponse(
+                "admin/login.html",
+                {"request": request, "error": "Too many sign-in attempts right now. Please try again in a moment.", "recaptcha_site_key": site_key, "recaptcha_version": version, "recaptcha_action": action},
+                status_code=503,
+            )
+    if not valid:
         return templates.TemplateResponse(
             "admin/login.html",
             {"request": request, "error": "Invalid email or password", "recaptcha_site_key": site_key, "recaptcha_version": version, "recaptcha_action": action},
@@ -99,13 +99,16 @@ def admin_login(request: Request, email: str = Form(...), password: str = Form(.
             {"request": request, "error": "You are not authorized to access the admin dashboard.", "recaptcha_site_key": site_key, "recaptcha_version": version, "recaptcha_action": action},
             status_code=403,
         )
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
     redirect = RedirectResponse(url="/admin", status_code=303)
     set_session(redirect, user.id)
     return redirect
 
 
 @router.get("/", response_class=HTMLResponse)
-def admin_dashboard(request: Request, db: Session = Depends(get_db), admin_user: User = Depends(require_admin)):
+def admin_dashboard(request: Request, db: Session = Depends(get_read_db), admin_user: Principal = Depends(require_admin)):
     # Base lists used by existing dashboard tables
     users = db.query(User).all()
     homestays = db.query(Homestay).all()
@@ -119,7 +122,8 @@ def admin_dashboard(request: Request, db: Session = Depends(get_db), admin_user:
     users_count = len(users)
     homestays_count = len(homestays)
     rooms_count = db.query(func.count(Room.id)).scalar() or 0
-    bookings_count = db.query(func.count(Booking.id)).scalar() or 0
+    archived_count = db.query(func.count(ArchivedBooking.id)).scalar() or 0
+    bookings_count = (db.query(func.count(Booking.id)).scalar() or 0) + archived_count
 
     # Today check-ins and check-outs
     checkins_today = db.query(func.count(Booking.id)).filter(Booking.start_date == today, Booking.status.in_([BookingStatus.CONFIRMED.value, BookingStatus.CHECKED_IN.value])).scalar() or 0
@@ -138,7 +142,10 @@ def admin_dashboard(request: Request, db: Session = Depends(get_db), admin_user:
     revpar = monthly_revenue / total_room_nights_in_month if total_room_nights_in_month > 0 else 0
 
     # Booking status distribution
-    status_counts = {st.value: db.query(func.count(Booking.id)).filter(Booking.status == st.value).scalar() or 0 for st in BookingStatus}
+    status_counts = {st.value: 0 for st in BookingStatus}
+    for model in (Booking, ArchivedBooking):
+        for st, count in db.query(model.status, func.count(model.id)).group_by(model.status).all():
+            status_counts[st.value] += count
 
     # Plan distribution
     plans = db.query(Plan).all()
@@ -147,13 +154,15 @@ def admin_dashboard(request: Request, db: Session = Depends(get_db), admin_user:
     recent_users = db.query(User).order_by(User.created_at.desc()).limit(5).all()
     recent_bookings = db.query(Booking).order_by(Booking.created_at.desc()).limit(5).all()
 
-    # User-specific analytics
+    # User-specific analytics (grouped per owner instead of per-user queries)
+    revenue_by_owner = dict(db.query(Booking.owner_id, func.coalesce(func.sum(Booking.price), 0)).group_by(Booking.owner_id).all())
+    for owner_id, archived_revenue in db.query(ArchivedBooking.owner_id, func.coalesce(func.sum(ArchivedBooking.price), 0)).group_by(ArchivedBooking.owner_id).all():
+        revenue_by_owner[owner_id] = (revenue_by_owner.get(owner_id) or 0) + archived_revenue
+    homestays_by_owner = dict(db.query(Homestay.owner_id, func.count(Homestay.id)).group_by(Homestay.owner_id).all())
+    rooms_by_owner = dict(db.query(Homestay.owner_id, func.count(Room.id)).join(Room, Room.homestay_id == Homestay.id).group_by(Homestay.owner_id).all())
     user_analytics = []
     for user in users:
-        user_homestay_ids = [h.id for h in user.homestays_owned]
-        user_room_ids = [r[0] for r in db.query(Room.id).filter(Room.homestay_id.in_(user_homestay_ids)).all()]
-        user_total_revenue = db.query(func.coalesce(func.sum(Booking.price), 0)).filter(Booking.room_id.in_(user_room_ids)).scalar() or 0
-        user_analytics.append({"user": user, "total_revenue": float(user_total_revenue), "homestay_count": len(user_homestay_ids), "room_count": len(user_room_ids)})
+        user_analytics.append({"user": user, "total_revenue": float(revenue_by_owner.get(user.id) or 0), "homestay_count": homestays_by_owner.get(user.id, 0), "room_count": rooms_by_owner.get(user.id, 0)})
 
     analytics = {
         "users_count": users_count, "homestays_count": homestays_count, "rooms_count": rooms_count, "bookings_count": bookings_count,
@@ -174,7 +183,7 @@ def admin_dashboard(request: Request, db: Session = Depends(get_db), admin_user:
     )
 
 @router.get("/settings", response_class=HTMLResponse)
-def admin_settings_page(request: Request, admin_user: User = Depends(require_admin)):
+def admin_settings_page(request: Request, admin_user: Principal = Depends(require_admin)):
     error = request.query_params.get("error")
     message = request.query_params.get("message")
     return templates.TemplateResponse(
@@ -189,37 +198,55 @@ def admin_settings_page(request: Request, admin_user: User = Depends(require_adm
     )
 
 @router.post("/settings/currency")
-def admin_save_currency(request: Request, db: Session = Depends(get_db), admin_user: User = Depends(require_admin), currency: str = Form(...)):
+def admin_save_currency(request: Request, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin), currency: str = Form(...)):
     if currency in CURRENCY_SYMBOLS:
-        admin_user.currency = currency
+        _admin_row(db, admin_user).currency = currency
         db.commit()
     return RedirectResponse(url="/admin/settings?message=Currency+updated.", status_code=303)
 
 @router.post("/settings/password")
-def admin_change_password(request: Request, db: Session = Depends(get_db), admin_user: User = Depends(require_admin), current_password: str = Form(...), new_password: str = Form(...), confirm_password: str = Form(...)):
-    if not verify_password(current_password, admin_user.hashed_password):
+def admin_change_password(request: Request, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin), current_password: str = Form(...), new_password: str = Form(...), confirm_password: str = Form(...)):
+    user = _admin_row(db, admin_user)
+    if not verify_password(current_password, user.hashed_password):
         return RedirectResponse(url="/admin/settings?error=Incorrect+current+password.", status_code=303)
     
     if new_password != confirm_password:
         return RedirectResponse(url="/admin/settings?error=New+passwords+do+not+match.", status_code=303)
     
-    admin_user.hashed_password = hash_password(new_password)
+    user.hashed_password = hash_password(new_password)
     db.commit()
     
     return RedirectResponse(url="/admin/settings?message=Password+updated+successfully.", status_code=303)
 
+@router.get("/slow-queries", response_class=HTMLResponse)
+def admin_slow_queries(request: Request, admin_user: Principal = Depends(require_admin)):
+    return templates.TemplateResponse(
+        "admin/slow_queries.html",
+        {
+            "request": request,
+            "user": admin_user,
+            "entries": slow_query_log.snapshot(),
+            "threshold_ms": slow_query_log.threshold_ms,
+        },
+    )
+
+@router.post("/slow-queries/clear")
+def admin_slow_queries_clear(request: Request, admin_user: Principal = Depends(require_admin)):
+    slow_query_log.clear()
+    return RedirectResponse(url="/admin/slow-queries", status_code=303)
+
 @router.get("/users", response_class=HTMLResponse)
-def admin_users(request: Request, db: Session = Depends(get_db), admin_user: User = Depends(require_admin)):
+def admin_users(request: Request, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin)):
     users = db.query(User).order_by(User.id.asc()).all()
     return templates.TemplateResponse("admin/users.html", {"request": request, "users": users})
 
 @router.get("/users/new", response_class=HTMLResponse)
-def admin_user_new_form(request: Request, admin_user: User = Depends(require_admin)):
+def admin_user_new_form(request: Request, admin_user: Principal = Depends(require_admin)):
     roles_list = [UserRole.ADMIN, UserRole.OWNER, UserRole.STAFF]
     return templates.TemplateResponse("admin/user_form.html", {"request": request, "roles": roles_list, "user": None})
 
 @router.post("/users/new", response_class=HTMLResponse)
-def admin_user_new(request: Request, db: Session = Depends(get_db), admin_user: User = Depends(require_admin), email: str = Form(...), password: str = Form(...), role: str = Form(...), is_verified: bool = Form(False)):
+def admin_user_new(request: Request, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin), email: str = Form(...), password: str = Form(...), role: str = Form(...), is_verified: bool = Form(False)):
     existing_user = db.query(User).filter(User.email == email).first()
     if existing_user:
         roles_list = [UserRole.ADMIN, UserRole.OWNER, UserRole.STAFF]
@@ -236,7 +263,7 @@ def admin_user_new(request: Request, db: Session = Depends(get_db), admin_user:
     return RedirectResponse(url="/admin/users", status_code=303)
 
 @router.get("/users/{user_id}/edit", response_class=HTMLResponse)
-def admin_user_edit_form(request: Request, user_id: int, db: Session = Depends(get_db), admin_user: User = Depends(require_admin)):
+def admin_user_edit_form(request: Request, user_id: int, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin)):
     user = db.query(User).get(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -244,7 +271,7 @@ def admin_user_edit_form(request: Request, user_id: int, db: Session = Depends(g
     return templates.TemplateResponse("admin/user_form.html", {"request": request, "roles": roles_list, "user": user})
 
 @router.post("/users/{user_id}/edit", response_class=HTMLResponse)
-def admin_user_edit(request: Request, user_id: int, db: Session = Depends(get_db), admin_user: User = Depends(require_admin), email: str = Form(...), password: str = Form(None), role: str = Form(...), is_verified: bool = Form(False)):
+def admin_user_edit(request: Request, user_id: int, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin), email: str = Form(...), password: str = Form(None), role: str = Form(...), is_verified: bool = Form(False)):
     user = db.query(User).get(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -259,7 +286,7 @@ def admin_user_edit(request: Request, user_id: int, db: Session = Depends(get_db
     return RedirectResponse(url="/admin/users", status_code=303)
 
 @router.post("/users/{user_id}/delete")
-def admin_user_delete(request: Request, user_id: int, db: Session = Depends(get_db), admin_user: User = Depends(require_admin)):
+def admin_user_delete(request: Request, user_id: int, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin)):
     user = db.query(User).get(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -269,7 +296,7 @@ def admin_user_delete(request: Request, user_id: int, db: Session = Depends(get_
     return RedirectResponse(url="/admin/users", status_code=303)
 
 @router.get("/plans", response_class=HTMLResponse)
-def admin_plans(request: Request, db: Session = Depends(get_db), admin_user: User = Depends(require_admin)):
+def admin_plans(request: Request, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin)):
     users = db.query(User).order_by(User.id.asc()).all()
     subs = db.query(Subscription).all()
     subs_map = {s.owner_id: s for s in subs}
@@ -286,12 +313,12 @@ def admin_plans(request: Request, db: Session = Depends(get_db), admin_user: Use
     )
 
 @router.get("/plans/manage", response_class=HTMLResponse)
-def admin_plan_management(request: Request, db: Session = Depends(get_db), admin_user: User = Depends(require_admin)):
+def admin_plan_management(request: Request, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin)):
     plans = db.query(Plan).order_by(Plan.id.asc()).all()
     return templates.TemplateResponse("admin/plan_management.html", {"request": request, "plans": plans, "plan": None})
 
 @router.get("/plans/{plan_id}/edit", response_class=HTMLResponse)
-def admin_plan_edit_form(request: Request, plan_id: int, db: Session = Depends(get_db), admin_user: User = Depends(require_admin)):
+def admin_plan_edit_form(request: Request, plan_id: int, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin)):
     plan = db.query(Plan).get(plan_id)
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
@@ -299,7 +326,7 @@ def admin_plan_edit_form(request: Request, plan_id: int, db: Session = Depends(g
     return templates.TemplateResponse("admin/plan_management.html", {"request": request, "plans": plans, "plan": plan})
 
 @router.post("/plans/save/{plan_id}", response_class=HTMLResponse)
-def admin_plan_save(request: Request, plan_id: int, db: Session = Depends(get_db), admin_user: User = Depends(require_admin), name: str = Form(...), price_monthly: float = Form(...), price_yearly: float = Form(...), room_limit: int = Form(...), user_limit: int = Form(...), is_active: bool = Form(False)):
+def admin_plan_save(request: Request, plan_id: int, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin), name: str = Form(...), price_monthly: float = Form(...), price_yearly: float = Form(...), room_limit: int = Form(...), user_limit: int = Form(...), is_active: bool = Form(False)):
     if plan_id == 0: # Create new plan
         plan = Plan()
         db.add(plan)
@@ -319,7 +346,7 @@ def admin_plan_save(request: Request, plan_id: int, db: Session = Depends(get_db
     return RedirectResponse(url="/admin/plans/manage", status_code=303)
 
 @router.post("/plans/{plan_id}/delete")
-def admin_plan_delete(request: Request, plan_id: int, db: Session = Depends(get_db), admin_user: User = Depends(require_admin)):
+def admin_plan_delete(request: Request, plan_id: int, db: Session = Depends(get_db), admin_user: Principal = Depends(require_admin)):
     plan = db.query(Plan).get(plan_id)
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
@@ -5,14 +5,19 @@ from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
 from ..db import get_db
-from ..models import User, Homestay, Room, Booking, BookingStatus, Plan, Subscription
-from ..security import get_current_user_id, set_session, verify_password, clear_session
+from ..models import User, Homestay, Room, Booking, BookingStatus, Subscription
+from ..principal import Principal
+from ..security import get_principal, set_session, clear_session
+from ..hashing import verify_and_update
 from ..services.auto_checkout import run_auto_checkout
+from ..services.availability import commit_booking, has_booking_conflict
+from ..services.plans import plan_catalog
 from ..services.ical import fetch_ota_events, overlaps_ota
 from ..limiter import limiter
 from ..config import settings
+from ..serialization import FastJSONResponse, booking_dicts
 
-router = APIRouter(prefix="/api/v1", tags=["mobile-api"])
+router = APIRouter(prefix="/api/v1", tags=["mobile-api"], default_response_class=FastJSONResponse)
 
 # ==== Schemas ====
 
@@ -51,6 +56,7 @@ class HomestayOut(BaseModel):
     name: str
     address: Optional[str] = None
     image_url: Optional[str] = None
+    image_variants: Optional[dict[str, str]] = None
 
     class Config:
         from_attributes = True
@@ -61,6 +67,7 @@ class RoomOut(BaseModel):
     capacity: Optional[int] = None
     default_rate: Optional[float] = None
     image_url: Optional[str] = None
+    image_variants: Optional[dict[str, str]] = None
 
     class Config:
         from_attributes = True
@@ -76,6 +83,7 @@ class BookingOut(BaseModel):
     status: BookingStatus
     comment: Optional[str] = None
     image_url: Optional[str] = None
+    image_variants: Optional[dict[str, str]] = None
 
     class Config:
         use_enum_values = True
@@ -110,23 +118,37 @@ class SelectHomestayIn(BaseModel):
 
 # ==== Helpers ====
 
-def require_user(request: Request, db: Session) -> User:
-    uid = get_current_user_id(request)
-    if not uid:
+def require_principal(request: Request, db: Session) -> Principal:
+    """Cached caller identity; enough for endpoints that only scope by user/homestay."""
+    principal = get_principal(request, db)
+    if principal is None:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    user = db.query(User).get(uid)
+    return principal
+
+def require_user(request: Request, db: Session) -> User:
+    principal = require_principal(request, db)
+    user = db.get(User, principal.id)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     return user
 
+def _commit_booking(db: Session) -> None:
+    """Commit a booking write, mapping the Postgres overlap constraint to the usual 409."""
+    if not commit_booking(db):
+        raise HTTPException(status_code=409, detail="Conflict: overlapping booking exists")
+
 # ==== Auth & User Endpoints ====
 
 @router.post("/auth/login", response_model=UserOut)
 @limiter.limit(settings.RATE_LIMIT_AUTH_API)
 def api_login(request: Request, payload: LoginIn, response: Response, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == payload.email).first()
-    if not user or not verify_password(payload.password, user.hashed_password):
+    valid, new_hash = verify_and_update(payload.password, user.hashed_password) if user and user.hashed_password else (False, None)
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid email or password")
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
     set_session(response, user.id)
     return user
 
@@ -143,27 +165,26 @@ def api_me(request: Request, db: Session = Depends(get_db)):
 
 @router.get("/plans", response_model=List[PlanOut])
 def api_get_plans(db: Session = Depends(get_db)):
-    return db.query(Plan).filter(Plan.is_active == True).order_by(Plan.price_monthly.asc()).all()
+    return plan_catalog.active(db)
 
 @router.get("/homestays", response_model=List[HomestayOut])
 def api_get_homestays(request: Request, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+    user = require_principal(request, db)
     return db.query(Homestay).filter(Homestay.owner_id == user.id).all()
 
 @router.get("/homestay", response_model=HomestayOut | None)
 def api_homestay(request: Request, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+    user = require_principal(request, db)
     if not user.homestay_id:
         return None
     return db.query(Homestay).get(user.homestay_id)
 
 @router.post("/homestay/select", response_model=UserOut)
 def api_select_homestay(request: Request, payload: SelectHomestayIn, db: Session = Depends(get_db)):
-    user = require_user(request, db)
-    hs = db.query(Homestay).get(payload.homestay_id)
-    if not hs or hs.owner_id != user.id:
+    if payload.homestay_id not in require_principal(request, db).owned_homestay_ids:
         raise HTTPException(status_code=404, detail="Homestay not found")
-    user.homestay_id = hs.id
+    user = require_user(request, db)
+    user.homestay_id = payload.homestay_id
     db.commit()
     db.refresh(user)
     return user
@@ -171,7 +192,7 @@ def api_select_homestay(request: Request, payload: SelectHomestayIn, db: Session
 # ==== Rooms ====
 @router.get("/rooms", response_model=List[RoomOut])
 def api_rooms(request: Request, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+    user = require_principal(request, db)
     if not user.homestay_id:
         return []
     return db.query(Room).filter(Room.homestay_id == user.homestay_id).order_by(Room.name.asc()).all()
@@ -179,29 +200,26 @@ def api_rooms(request: Request, db: Session = Depends(get_db)):
 # ==== Bookings ====
 @router.get("/bookings", response_model=List[BookingOut])
 def api_bookings(request: Request, db: Session = Depends(get_db), start: Optional[date] = None, end: Optional[date] = None, room_id: Optional[int] = None):
-    user = require_user(request, db)
+    user = require_principal(request, db)
     try:
         run_auto_checkout(db)
     except Exception:
         db.rollback()
     q = db.query(Booking)
     if user.homestay_id:
-        room_ids = [r.id for r in db.query(Room).filter(Room.homestay_id == user.homestay_id).all()]
-        if room_ids:
-            q = q.filter(Booking.room_id.in_(room_ids))
-        else:
-            return []
+        q = q.filter(Booking.homestay_id == user.homestay_id)
     if room_id:
         q = q.filter(Booking.room_id == room_id)
     if start:
         q = q.filter(Booking.end_date > start)
     if end:
         q = q.filter(Booking.start_date < end)
-    return q.order_by(Booking.start_date.desc()).all()
+    # Trusted rows straight from the DB: skip per-object response_model validation
+    return FastJSONResponse(booking_dicts(q.order_by(Booking.start_date.desc())))
 
 @router.post("/bookings", response_model=BookingOut, status_code=201)
 def api_create_booking(request: Request, payload: BookingCreateIn, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+    user = require_principal(request, db)
     room = db.query(Room).get(payload.room_id)
     if not room or room.homestay_id != user.homestay_id:
         raise HTTPException(status_code=404, detail="Room not found")
@@ -209,8 +227,7 @@ def api_create_booking(request: Request, payload: BookingCreateIn, db: Session =
     e = payload.end_date
     if e <= s:
         raise HTTPException(status_code=400, detail="end_date must be after start_date")
-    conflicts = db.query(Booking).filter(Booking.room_id == payload.room_id, Booking.id != None, Booking.start_date < e, Booking.end_date > s).all()
-    if conflicts:
+    if has_booking_conflict(db, payload.room_id, s, e):
         raise HTTPException(status_code=409, detail="Conflict: overlapping booking exists")
     if getattr(room, "ota_ical_url", None):
         try:
@@ -230,13 +247,13 @@ def api_create_booking(request: Request, payload: BookingCreateIn, db: Session =
         comment=(payload.comment or None),
     )
     db.add(b)
-    db.commit()
+    _commit_booking(db)
     db.refresh(b)
     return b
 
 @router.patch("/bookings/{booking_id}", response_model=BookingOut)
 def api_update_booking(request: Request, booking_id: int, payload: BookingUpdateIn, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+    user = require_principal(request, db)
     b = db.query(Booking).get(booking_id)
     if not b:
         raise HTTPException(status_code=404, detail="Not found")
@@ -253,8 +270,7 @@ def api_update_booking(request: Request, booking_id: int, payload: BookingUpdate
     e = payload.end_date if payload.end_date is not None else b.end_date
     if e <= s:
         raise HTTPException(status_code=400, detail="end_date must be after start_date")
-    conflicts = db.query(Booking).filter(Booking.room_id == new_room_id, Booking.id != b.id, Booking.start_date < e, Booking.end_date > s).all()
-    if conflicts:
+    if has_booking_conflict(db, new_room_id, s, e, exclude_booking_id=b.id):
         raise HTTPException(status_code=409, detail="Conflict: overlapping booking exists")
     if getattr(new_room, "ota_ical_url", None):
         try:
@@ -278,13 +294,13 @@ def api_update_booking(request: Request, booking_id: int, payload: BookingUpdate
     if payload.comment is not None:
         b.comment = payload.comment.strip() or None
 
-    db.commit()
+    _commit_booking(db)
     db.refresh(b)
     return b
 
 @router.delete("/bookings/{booking_id}", status_code=204)
 def api_delete_booking(request: Request, booking_id: int, db: Session = Depends(get_db)):
-    user = require_user(request, db)
+    user = require_principal(request, db)
     b = db.query(Booking).get(booking_id)
     if not b:
         raise HTTPException(status_code=404, detail="Not found")
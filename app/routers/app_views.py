@@ -3,17 +3,19 @@ from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func, extract
-from ..db import get_db
+from ..db import get_db, get_read_db
 from ..models import User, Homestay, Room, Booking, BookingStatus
-from ..security import require_user
+from ..principal import Principal
+from ..security import require_principal, require_user
 from ..services.auto_checkout import run_auto_checkout
+from ..services.archive import owner_bookings
 from ..templating import templates
 from ..services import reporting
 
 router = APIRouter(tags=["app"])
 
 @router.get("/app", response_class=HTMLResponse)
-def dashboard(request: Request, user: User = Depends(require_user), db: Session = Depends(get_db)):
+def dashboard(request: Request, user: Principal = Depends(require_principal), db: Session = Depends(get_db)):
     # Auto-checkout any past stays before presenting data
     try:
         run_auto_checkout(db)
@@ -41,19 +43,18 @@ def dashboard(request: Request, user: User = Depends(require_user), db: Session
         rooms = db.query(Room).filter(Room.homestay_id == user.homestay_id).all()
         rooms_count = len(rooms)
         rooms_map = {r.id: r for r in rooms}
-        room_ids = [r.id for r in rooms]
-        if room_ids:
+        if rooms:
             month_start = date(today.year, today.month, 1)
             days_in_month = (date(today.year, today.month + 1, 1) - month_start).days if today.month < 12 else 31
             
             # Monthly revenue and bookings
-            analytics["monthly_bookings"] = db.query(func.count(Booking.id)).filter(Booking.room_id.in_(room_ids), Booking.start_date >= month_start, Booking.start_date < (month_start + timedelta(days=days_in_month))).scalar() or 0
-            monthly_revenue = db.query(func.coalesce(func.sum(Booking.price), 0)).filter(Booking.room_id.in_(room_ids), Booking.start_date >= month_start, Booking.start_date < (month_start + timedelta(days=days_in_month)), Booking.status.in_([BookingStatus.CONFIRMED.value, BookingStatus.CHECKED_IN.value, BookingStatus.CHECKED_OUT.value])).scalar() or 0
+            analytics["monthly_bookings"] = db.query(func.count(Booking.id)).filter(Booking.homestay_id == user.homestay_id, Booking.start_date >= month_start, Booking.start_date < (month_start + timedelta(days=days_in_month))).scalar() or 0
+            monthly_revenue = db.query(func.coalesce(func.sum(Booking.price), 0)).filter(Booking.homestay_id == user.homestay_id, Booking.start_date >= month_start, Booking.start_date < (month_start + timedelta(days=days_in_month)), Booking.status.in_([BookingStatus.CONFIRMED.value, BookingStatus.CHECKED_IN.value, BookingStatus.CHECKED_OUT.value])).scalar() or 0
             analytics["monthly_revenue"] = float(monthly_revenue)
 
             # Occupancy, ADR, RevPAR
             total_room_nights_in_month = rooms_count * days_in_month
-            booked_nights_in_month = db.query(func.sum(Booking.end_date - Booking.start_date)).filter(Booking.room_id.in_(room_ids), Booking.start_date >= month_start, Booking.start_date < (month_start + timedelta(days=days_in_month)), Booking.status.in_([BookingStatus.CONFIRMED.value, BookingStatus.CHECKED_IN.value])).scalar() or 0
+            booked_nights_in_month = db.query(func.sum(Booking.end_date - Booking.start_date)).filter(Booking.homestay_id == user.homestay_id, Booking.start_date >= month_start, Booking.start_date < (month_start + timedelta(days=days_in_month)), Booking.status.in_([BookingStatus.CONFIRMED.value, BookingStatus.CHECKED_IN.value])).scalar() or 0
 
             analytics["occupancy_rate"] = (booked_nights_in_month / total_room_nights_in_month) * 100 if total_room_nights_in_month > 0 else 0
             analytics["adr"] = analytics["monthly_revenue"] / booked_nights_in_month if booked_nights_in_month > 0 else 0
@@ -62,7 +63,7 @@ def dashboard(request: Request, user: User = Depends(require_user), db: Session
             checkins_today = (
                 db.query(Booking)
                 .filter(
-                    Booking.room_id.in_(room_ids),
+                    Booking.homestay_id == user.homestay_id,
                     Booking.start_date == today,
                     Booking.status != BookingStatus.CANCELLED.value,
                 )
@@ -71,7 +72,7 @@ def dashboard(request: Request, user: User = Depends(require_user), db: Session
             checkouts_today = (
                 db.query(Booking)
                 .filter(
-                    Booking.room_id.in_(room_ids),
+                    Booking.homestay_id == user.homestay_id,
                     Booking.end_date == today,
                     Booking.status != BookingStatus.CANCELLED.value,
                 )
@@ -80,7 +81,7 @@ def dashboard(request: Request, user: User = Depends(require_user), db: Session
             upcoming_count = (
                 db.query(Booking)
                 .filter(
-                    Booking.room_id.in_(room_ids),
+                    Booking.homestay_id == user.homestay_id,
                     Booking.start_date >= today,
                     Booking.status != BookingStatus.CANCELLED.value,
                 )
@@ -104,12 +105,12 @@ def dashboard(request: Request, user: User = Depends(require_user), db: Session
     )
 
 @router.get("/app/analytics", response_class=HTMLResponse)
-def analytics_page(request: Request, user: User = Depends(require_user), db: Session = Depends(get_db), start: str | None = None, end: str | None = None):
-    # Auto-checkout in case any past stays need status update
+def analytics_page(request: Request, user: Principal = Depends(require_principal), db: Session = Depends(get_db), read_db: Session = Depends(get_read_db), start: str | None = None, end: str | None = None):
+    # Auto-checkout in case any past stays need status update (always on the primary)
     try:
         run_auto_checkout(db)
     except Exception:
-        pass
+        db.rollback()
 
     # Parse optional period
     period_start, period_end = None, None
@@ -132,29 +133,21 @@ def analytics_page(request: Request, user: User = Depends(require_user), db: Ses
         period_start, period_end = first_of_month, first_of_next
 
     # Collect all rooms for the user
-    all_user_homestays = db.query(Homestay).filter(Homestay.owner_id == user.id).all()
-    all_user_room_ids = [r.id for hs in all_user_homestays for r in hs.rooms]
-    rooms_map = {r.id: r for hs in all_user_homestays for r in hs.rooms}
+    rooms_map = {r.id: r for r in read_db.query(Room).join(Homestay).filter(Homestay.owner_id == user.id).all()}
 
-    # Fetch bookings for the period
-    q = db.query(Booking).filter(Booking.room_id.in_(all_user_room_ids))
-    if period_start and period_end:
-        q = q.filter(Booking.start_date < period_end, Booking.end_date > period_start)
-    elif period_start:
-        q = q.filter(Booking.end_date > period_start)
-    elif period_end:
-        q = q.filter(Booking.start_date < period_end)
-    bookings_in_period = q.order_by(Booking.start_date.asc()).all()
+    # Fetch bookings for the period (reads through to the archive for past years)
+    bookings_in_period = owner_bookings(read_db, user.id, period_start, period_end)
 
     # --- Advanced Analytics ---
     total_nights_sold = sum((b.end_date - b.start_date).days for b in bookings_in_period)
     total_revenue = sum(b.price for b in bookings_in_period if b.price is not None)
-    avg_lead_time_result = db.query(func.avg(Booking.start_date - Booking.created_at)).filter(Booking.id.in_([b.id for b in bookings_in_period])).scalar()
-    avg_lead_time = avg_lead_time_result.days if avg_lead_time_result else 0
+    lead_times = [(b.start_date - b.created_at.date()).days for b in bookings_in_period if b.created_at]
+    avg_lead_time = int(sum(lead_times) / len(lead_times)) if lead_times else 0
 
     # Monthly revenue breakdown for the last 6 months
     monthly_revenue_data = []
     today = date.today()
+    months = []
     for i in range(6):
         month_date = today - timedelta(days=i*30)
         month_start = date(month_date.year, month_date.month, 1)
@@ -162,13 +155,16 @@ def analytics_page(request: Request, user: User = Depends(require_user), db: Ses
             month_end = date(month_date.year + 1, 1, 1)
         else:
             month_end = date(month_date.year, month_date.month + 1, 1)
-        
-        revenue = db.query(func.sum(Booking.price)).filter(
-            Booking.room_id.in_(all_user_room_ids),
-            Booking.start_date >= month_start,
-            Booking.start_date < month_end,
-            Booking.status.in_([BookingStatus.CONFIRMED.value, BookingStatus.CHECKED_IN.value, BookingStatus.CHECKED_OUT.value])
-        ).scalar() or 0
+        months.append((month_start, month_end))
+
+    # One fetch for the whole window, bucketed by check-in month
+    revenue_statuses = {BookingStatus.CONFIRMED, BookingStatus.CHECKED_IN, BookingStatus.CHECKED_OUT}
+    window = owner_bookings(read_db, user.id, min(m[0] for m in months), max(m[1] for m in months))
+    for month_start, month_end in months:
+        revenue = sum(
+            b.price for b in window
+            if b.price is not None and b.status in revenue_statuses and month_start <= b.start_date < month_end
+        )
         monthly_revenue_data.append({"month": month_start.strftime("%b %Y"), "revenue": float(revenue)})
     
     monthly_revenue_data.reverse() # Show oldest month first
@@ -197,7 +193,7 @@ def analytics_page(request: Request, user: User = Depends(require_user), db: Ses
 
 # --- Report Downloads ---
 
-def _get_overview_data(db: Session, user: User, start: str | None, end: str | None) -> tuple[list[Booking], dict, date, date]:
+def _get_overview_data(db: Session, user: User | Principal, start: str | None, end: str | None) -> tuple[list[Booking], dict, date, date]:
     # This helper function re-uses the data fetching logic from the overview page.
     period_start, period_end = None, None
     try:
@@ -217,24 +213,13 @@ def _get_overview_data(db: Session, user: User, start: str | None, end: str | No
             first_of_next = date(today_.year, today_.month + 1, 1)
         period_start, period_end = first_of_month, first_of_next
 
-    # Fetch all bookings for the user within the period
-    all_user_homestays = db.query(Homestay).filter(Homestay.owner_id == user.id).all()
-    all_user_room_ids = [r.id for hs in all_user_homestays for r in hs.rooms]
-    rooms_map = {r.id: r for hs in all_user_homestays for r in hs.rooms}
-
-    q = db.query(Booking).filter(Booking.room_id.in_(all_user_room_ids))
-    if period_start and period_end:
-        q = q.filter(Booking.start_date < period_end, Booking.end_date > period_start)
-    elif period_start:
-        q = q.filter(Booking.end_date > period_start)
-    elif period_end:
-        q = q.filter(Booking.start_date < period_end)
-    
-    bookings = q.order_by(Booking.start_date.asc()).all()
+    # Fetch all bookings for the user within the period (including archived years)
+    rooms_map = {r.id: r for r in db.query(Room).join(Homestay).filter(Homestay.owner_id == user.id).all()}
+    bookings = owner_bookings(db, user.id, period_start, period_end)
     return bookings, rooms_map, period_start, period_end
 
 @router.get("/app/analytics/download/csv")
-def download_csv_report(request: Request, user: User = Depends(require_user), db: Session = Depends(get_db), start: str | None = None, end: str | None = None):
+def download_csv_report(request: Request, user: Principal = Depends(require_principal), db: Session = Depends(get_read_db), start: str | None = None, end: str | None = None):
     bookings, rooms_map, _, _ = _get_overview_data(db, user, start, end)
     csv_data = reporting.generate_csv_report(bookings, rooms_map)
 
@@ -245,7 +230,7 @@ def download_csv_report(request: Request, user: User = Depends(require_user), db
     )
 
 @router.get("/app/analytics/download/pdf")
-def download_pdf_report(request: Request, user: User = Depends(require_user), db: Session = Depends(get_db), start: str | None = None, end: str | None = None):
+def download_pdf_report(request: Request, user: User = Depends(require_user), db: Session = Depends(get_read_db), start: str | None = None, end: str | None = None):
     bookings, rooms_map, period_start, period_end = _get_overview_data(db, user, start, end)
     pdf_bytes = reporting.generate_pdf_report(bookings, rooms_map, user, period_start, period_end)
 
@@ -1,39 +1,20 @@
 import secrets
-import json
-from urllib import request as urlrequest
-from urllib.parse import urlencode
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, Form, Request, Response, BackgroundTasks
+from fastapi import APIRouter, Depends, Form, Request, Response
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
 from ..db import get_db
 from ..models import User, Plan, Subscription, UserRole
-from ..security import hash_password, verify_password, set_session, clear_session
+from ..security import hash_password, set_session, clear_session
+from ..hashing import hash_password_async, verify_password_async, PasswordHasherBusy
 from ..config import settings
 from ..limiter import limiter
+from ..services.recaptcha import recaptcha_passed
 from ..services.mail import send_verification_email, send_password_reset_email, send_invitation_email
 from ..templating import templates
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-def _verify_recaptcha(token: str | None, remote_ip: str | None) -> tuple[bool, dict]:
-    secret = getattr(settings, "RECAPTCHA_SECRET_KEY", "")
-    if not secret or not getattr(settings, "RECAPTCHA_SITE_KEY", ""):
-        return True, {"skipped": True}
-    if not token:
-        return False, {"error": "missing-token"}
-    data = urlencode({"secret": secret, "response": token, "remoteip": remote_ip or ""}).encode()
-    try:
-        req = urlrequest.Request("https://www.google.com/recaptcha/api/siteverify", data=data)
-        with urlrequest.urlopen(req, timeout=5) as resp:
-            payload = resp.read()
-            res = json.loads(payload.decode("utf-8"))
-            return bool(res.get("success")), res
-    except Exception as e:
-        if getattr(settings, "DEBUG", False):
-            return True, {"debug": True, "exception": str(e)}
-        return False, {"exception": str(e)}
-
 @router.get("/login", response_class=HTMLResponse)
 def login_form(request: Request):
     error = request.query_params.get("error")
@@ -54,14 +35,7 @@ def login_form(request: Request):
 @limiter.limit(settings.RATE_LIMIT_AUTH)
 async def login(request: Request, email: str = Form(...), password: str = Form(...), g_recaptcha_response: str | None = Form(None, alias="g-recaptcha-response"), db: Session = Depends(get_db)):
     client_ip = request.client.host if request.client else None
-    ok, res = _verify_recaptcha(g_recaptcha_response, client_ip)
-    if ok and settings.RECAPTCHA_VERSION == "v3":
-        expected_action = "login"
-        min_score = float(getattr(settings, "RECAPTCHA_MIN_SCORE", 0.5))
-        if res.get("action") != expected_action or res.get("score", 0) < min_score:
-            ok = False
-
-    if not ok:
+    if not await recaptcha_passed(g_recaptcha_response, client_ip, "login"):
         return templates.TemplateResponse(
             "auth/login.html",
             {"request": request, "error": "reCAPTCHA verification failed. Please try again.", "recaptcha_site_key": settings.RECAPTCHA_SITE_KEY, "recaptcha_version": settings.RECAPTCHA_VERSION, "recaptcha_action": "login"},
@@ -69,12 +43,26 @@ async def login(request: Request, email: str = Form(...), password: str = Form(.
         )
 
     user = db.query(User).filter(User.email == email).first()
-    if not user or not user.hashed_password or not verify_password(password, user.hashed_password):
+    valid, new_hash = False, None
+    if user and user.hashed_password:
+        try:
+            valid, new_hash = await verify_password_async(password, user.hashed_password)
+        except PasswordHasherBusy:
+            return templates.TemplateResponse(
+                "auth/login.html",
+                {"request": request, "error": "Too many sign-in attempts right now. Please try again in a moment.", "recaptcha_site_key": settings.RECAPTCHA_SITE_KEY, "recaptcha_version": settings.RECAPTCHA_VERSION, "recaptcha_action": "login"},
+                status_code=503,
+            )
+    if not valid:
         return templates.TemplateResponse(
             "auth/login.html",
             {"request": request, "error": "Invalid email or password.", "recaptcha_site_key": settings.RECAPTCHA_SITE_KEY, "recaptcha_version": settings.RECAPTCHA_VERSION, "recaptcha_action": "login"},
             status_code=400,
         )
+    if new_hash:
+        # Stored hash used an older bcrypt cost; upgrade it now that we know the password
+        user.hashed_password = new_hash
+        db.commit()
     
     if not user.is_verified:
         return templates.TemplateResponse(
@@ -93,16 +81,9 @@ def register_form(request: Request):
 
 @router.post("/register")
 @limiter.limit(settings.RATE_LIMIT_AUTH)
-async def register(request: Request, background_tasks: BackgroundTasks, email: str = Form(...), password: str = Form(...), g_recaptcha_response: str | None = Form(None, alias="g-recaptcha-response"), db: Session = Depends(get_db)):
+async def register(request: Request, email: str = Form(...), password: str = Form(...), g_recaptcha_response: str | None = Form(None, alias="g-recaptcha-response"), db: Session = Depends(get_db)):
     client_ip = request.client.host if request.client else None
-    ok, res = _verify_recaptcha(g_recaptcha_response, client_ip)
-    if ok and settings.RECAPTCHA_VERSION == "v3":
-        expected_action = "register"
-        min_score = float(getattr(settings, "RECAPTCHA_MIN_SCORE", 0.5))
-        if res.get("action") != expected_action or res.get("score", 0) < min_score:
-            ok = False
-
-    if not ok:
+    if not await recaptcha_passed(g_recaptcha_response, client_ip, "register"):
         return templates.TemplateResponse(
             "auth/register.html",
             {"request": request, "error": "reCAPTCHA verification failed. Please try again.", "recaptcha_site_key": settings.RECAPTCHA_SITE_KEY, "recaptcha_version": settings.RECAPTCHA_VERSION, "recaptcha_action": "register"},
@@ -113,10 +94,19 @@ async def register(request: Request, background_tasks: BackgroundTasks, email: s
     if exists:
         return RedirectResponse(url="/auth/login?error=Email+already+registered.", status_code=303)
 
+    try:
+        hashed_password = await hash_password_async(password)
+    except PasswordHasherBusy:
+        return templates.TemplateResponse(
+            "auth/register.html",
+            {"request": request, "error": "We're busy right now. Please try again in a moment.", "recaptcha_site_key": settings.RECAPTCHA_SITE_KEY, "recaptcha_version": settings.RECAPTCHA_VERSION, "recaptcha_action": "register"},
+            status_code=503,
+        )
+
     token = secrets.token_urlsafe(32)
     user = User(
         email=email, 
-        hashed_password=hash_password(password),
+        hashed_password=hashed_password,
         is_verified=False,
         verification_token=token
     )
@@ -128,15 +118,14 @@ async def register(request: Request, background_tasks: BackgroundTasks, email: s
     if free_plan:
         sub = Subscription(owner_id=user.id, plan_id=free_plan.id)
         db.add(sub)
-    
-    db.commit()
 
-    background_tasks.add_task(send_verification_email, email, token)
+    send_verification_email(db, email, token)
+    db.commit()
 
     return templates.TemplateResponse("auth/verify_email.html", {"request": request, "email": email})
 
 @router.get("/verify")
-async def verify_email(request: Request, token: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def verify_email(request: Request, token: str, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.verification_token == token).first()
     if not user:
         return RedirectResponse(url="/auth/login?error=Invalid+verification+token.", status_code=303)
@@ -144,12 +133,12 @@ async def verify_email(request: Request, token: str, background_tasks: Backgroun
     if not user.is_verified:
         user.is_verified = True
         user.verification_token = None
-        db.commit()
 
         # Check if admin notifications are enabled globally
         if settings.ADMIN_NOTIFICATION_EMAIL_ENABLE and settings.ADMIN_NOTIFICATION_EMAIL:
             from ..services.mail import send_new_user_admin_notification
-            background_tasks.add_task(send_new_user_admin_notification, user.email)
+            send_new_user_admin_notification(db, user.email)
+        db.commit()
 
     redirect = RedirectResponse(url="/app?msg=Email+verified+successfully!", status_code=303)
     set_session(redirect, user.id)
@@ -186,14 +175,14 @@ def forgot_password_form(request: Request):
     return templates.TemplateResponse("auth/forgot_password.html", {"request": request})
 
 @router.post("/forgot-password")
-async def forgot_password(request: Request, background_tasks: BackgroundTasks, email: str = Form(...), db: Session = Depends(get_db)):
+async def forgot_password(request: Request, email: str = Form(...), db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == email).first()
     if user:
         token = secrets.token_urlsafe(32)
         user.password_reset_token = token
         user.password_reset_expires_at = datetime.utcnow() + timedelta(hours=1)
+        send_password_reset_email(db, user.email, token)
         db.commit()
-        background_tasks.add_task(send_password_reset_email, user.email, token)
     
     return templates.TemplateResponse("auth/forgot_password.html", {"request": request, "message": "If an account with that email exists, we have sent a password reset link."})
 
@@ -5,17 +5,19 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
 
 from ..db import get_db
-from ..models import User, Room, Booking, BookingStatus
-from ..security import require_user
+from ..models import Homestay, Room, Booking, BookingStatus
+from ..principal import Principal
+from ..security import require_principal
 from ..services.auto_checkout import run_auto_checkout
+from ..services.availability import commit_booking, has_booking_conflict
 from ..services.ical import overlaps_ota, fetch_ota_events
-from ..services.media import save_image
+from ..services.media import assign_image, save_upload
 from ..templating import templates
 
 router = APIRouter(prefix="/app/bookings", tags=["bookings"])
 
 @router.get("/", response_class=HTMLResponse)
-def bookings_index(request: Request, user: User = Depends(require_user), db: Session = Depends(get_db)):
+def bookings_index(request: Request, user: Principal = Depends(require_principal), db: Session = Depends(get_db)):
     # Auto-checkout past stays before listing
     try:
         run_auto_checkout(db)
@@ -23,20 +25,16 @@ def bookings_index(request: Request, user: User = Depends(require_user), db: Ses
         db.rollback()
     
     # Fetch bookings for all rooms in all properties owned by the user
+    rooms_map = {r.id: r for r in db.query(Room).join(Homestay).filter(Homestay.owner_id == user.id).all()}
     bookings = []
-    rooms_map = {}
-    owned_homestays = db.query(Room).filter(Room.homestay_id.in_([h.id for h in user.homestays_owned])).all()
-    if owned_homestays:
-        room_ids = [r.id for r in owned_homestays]
-        rooms_map = {r.id: r for r in owned_homestays}
-        if room_ids:
-            bookings = db.query(Booking).filter(Booking.room_id.in_(room_ids)).order_by(Booking.start_date.desc()).all()
+    if rooms_map:
+        bookings = db.query(Booking).filter(Booking.owner_id == user.id).order_by(Booking.start_date.desc()).all()
             
     return templates.TemplateResponse("bookings/index.html", {"request": request, "user": user, "bookings": bookings, "rooms_map": rooms_map, "BookingStatus": BookingStatus})
 
 
 @router.get("/new", response_class=HTMLResponse)
-def bookings_new(request: Request, user: User = Depends(require_user), db: Session = Depends(get_db), room_id: int | None = None, start_date: date | None = None, end_date: date | None = None):
+def bookings_new(request: Request, user: Principal = Depends(require_principal), db: Session = Depends(get_db), room_id: int | None = None, start_date: date | None = None, end_date: date | None = None):
     rooms = []
     if user.homestay_id:
         rooms = db.query(Room).filter(Room.homestay_id == user.homestay_id).order_by(Room.name.asc()).all()
@@ -53,16 +51,17 @@ def bookings_new(request: Request, user: User = Depends(require_user), db: Sessi
 
 
 @router.post("/new")
-async def bookings_create(request: Request, user: User = Depends(require_user), db: Session = Depends(get_db), room_id: int = Form(...), guest_name: str = Form(...), guest_contact: str = Form(""), start_date: str = Form(...), end_date: str = Form(...), price: float | None = Form(None), status: str = Form(BookingStatus.CONFIRMED.value), comment: str = Form(""), image: UploadFile | None = File(None), return_url: str | None = Form(None)):
+async def bookings_create(request: Request, user: Principal = Depends(require_principal), db: Session = Depends(get_db), room_id: int = Form(...), guest_name: str = Form(...), guest_contact: str = Form(""), start_date: str = Form(...), end_date: str = Form(...), price: float | None = Form(None), status: str = Form(BookingStatus.CONFIRMED.value), comment: str = Form(""), image: UploadFile | None = File(None), return_url: str | None = Form(None)):
     room = db.query(Room).get(room_id)
     # Authorization check: Ensure the room belongs to one of the user's properties
-    if not room or room.homestay_id not in [h.id for h in user.homestays_owned]:
+    if not room or room.homestay_id not in user.owned_homestay_ids:
         return HTMLResponse("<h2>Room not found or not authorized</h2>", status_code=404)
         
     s = date.fromisoformat(start_date)
     e = date.fromisoformat(end_date)
-    conflicts = db.query(Booking).filter(Booking.room_id == room_id, Booking.start_date < e, Booking.end_date > s).all()
-    if conflicts:
+    if not (s < e):
+        return HTMLResponse("<div class='p-3 text-red-700'>End date must be after start date.</div>", status_code=400)
+    if has_booking_conflict(db, room_id, s, e):
         return HTMLResponse("<div class='p-3 text-red-700'>Conflict: overlapping booking exists.</div>", status_code=400)
     # prevent overlaps with OTA calendar if configured
     if getattr(room, "ota_ical_url", None):
@@ -72,43 +71,45 @@ async def bookings_create(request: Request, user: User = Depends(require_user),
                 return HTMLResponse("<div class='p-3 text-red-700'>Conflict: overlaps external OTA calendar.</div>", status_code=400)
         except Exception:
             pass
-    img_url = None
+    stored = None
     if image and image.filename:
-        data = await image.read()
-        img_url = save_image(data, image.filename, folder="staycal/bookings")
-    b = Booking(room_id=room_id, guest_name=guest_name.strip(), guest_contact=guest_contact.strip(), start_date=s, end_date=e, price=price, status=BookingStatus(status), comment=comment.strip() or None, image_url=img_url)
+        stored = await save_upload(image, folder="staycal/bookings")
+    b = Booking(room_id=room_id, guest_name=guest_name.strip(), guest_contact=guest_contact.strip(), start_date=s, end_date=e, price=price, status=BookingStatus(status), comment=comment.strip() or None)
+    assign_image(b, stored)
     db.add(b)
-    db.commit()
+    if not commit_booking(db):
+        return HTMLResponse("<div class='p-3 text-red-700'>Conflict: overlapping booking exists.</div>", status_code=400)
     dest = return_url or "/app/bookings/"
     return RedirectResponse(url=dest, status_code=303)
 
 
 @router.get("/{booking_id}/edit", response_class=HTMLResponse)
-def bookings_edit(request: Request, booking_id: int, user: User = Depends(require_user), db: Session = Depends(get_db)):
+def bookings_edit(request: Request, booking_id: int, user: Principal = Depends(require_principal), db: Session = Depends(get_db)):
     booking = db.query(Booking).get(booking_id)
     if not booking:
         return HTMLResponse("<h2>Booking not found</h2>", status_code=404)
     room = db.query(Room).get(booking.room_id)
-    if not room or room.homestay_id not in [h.id for h in user.homestays_owned]:
+    if not room or room.homestay_id not in user.owned_homestay_ids:
         return HTMLResponse("<h2>Booking not found or not authorized</h2>", status_code=404)
         
-    rooms = db.query(Room).filter(Room.homestay_id.in_([h.id for h in user.homestays_owned])).order_by(Room.name.asc()).all()
+    rooms = db.query(Room).filter(Room.homestay_id.in_(user.owned_homestay_ids)).order_by(Room.name.asc()).all()
     return templates.TemplateResponse("bookings/form.html", {"request": request, "user": user, "booking": booking, "rooms": rooms, "mode": "edit", "selected_room_id": booking.room_id, "BookingStatus": BookingStatus})
 
 
 @router.post("/{booking_id}/edit")
-async def bookings_update(request: Request, booking_id: int, user: User = Depends(require_user), db: Session = Depends(get_db), room_id: int = Form(...), guest_name: str = Form(...), guest_contact: str = Form(""), start_date: str = Form(...), end_date: str = Form(...), price: float | None = Form(None), status: str = Form(BookingStatus.CONFIRMED.value), comment: str = Form(""), image: UploadFile | None = File(None), return_url: str | None = Form(None)):
+async def bookings_update(request: Request, booking_id: int, user: Principal = Depends(require_principal), db: Session = Depends(get_db), room_id: int = Form(...), guest_name: str = Form(...), guest_contact: str = Form(""), start_date: str = Form(...), end_date: str = Form(...), price: float | None = Form(None), status: str = Form(BookingStatus.CONFIRMED.value), comment: str = Form(""), image: UploadFile | None = File(None), return_url: str | None = Form(None)):
     b = db.query(Booking).get(booking_id)
     if not b:
         return HTMLResponse("<h2>Booking not found</h2>", status_code=404)
     room = db.query(Room).get(b.room_id)
-    if not room or room.homestay_id not in [h.id for h in user.homestays_owned]:
+    if not room or room.homestay_id not in user.owned_homestay_ids:
         return HTMLResponse("<h2>Booking not found or not authorized</h2>", status_code=404)
         
     s = date.fromisoformat(start_date)
     e = date.fromisoformat(end_date)
-    conflicts = db.query(Booking).filter(Booking.id != booking_id, Booking.room_id == room_id, Booking.start_date < e, Booking.end_date > s).all()
-    if conflicts:
+    if not (s < e):
+        return HTMLResponse("<div class='p-3 text-red-700'>End date must be after start date.</div>", status_code=400)
+    if has_booking_conflict(db, room_id, s, e, exclude_booking_id=booking_id):
         return HTMLResponse("<div class='p-3 text-red-700'>Conflict: overlapping booking exists.</div>", status_code=400)
     if getattr(room, "ota_ical_url", None):
         try:
@@ -126,20 +127,20 @@ async def bookings_update(request: Request, booking_id: int, user: User = Depend
     b.status = BookingStatus(status)
     b.comment = comment.strip() or None
     if image and image.filename:
-        data = await image.read()
-        b.image_url = save_image(data, image.filename, folder="staycal/bookings")
-    db.commit()
+        assign_image(b, await save_upload(image, folder="staycal/bookings"))
+    if not commit_booking(db):
+        return HTMLResponse("<div class='p-3 text-red-700'>Conflict: overlapping booking exists.</div>", status_code=400)
     dest = return_url or f"/app/bookings/{b.id}/edit"
     return RedirectResponse(url=dest, status_code=303)
 
 
 @router.post("/{booking_id}/delete")
-def bookings_delete(request: Request, booking_id: int, user: User = Depends(require_user), db: Session = Depends(get_db)):
+def bookings_delete(request: Request, booking_id: int, user: Principal = Depends(require_principal), db: Session = Depends(get_db)):
     booking = db.query(Booking).get(booking_id)
     if not booking:
         return HTMLResponse("<h2>Booking not found</h2>", status_code=404)
     room = db.query(Room).get(booking.room_id)
-    if not room or room.homestay_id not in [h.id for h in user.homestays_owned]:
+    if not room or room.homestay_id not in user.owned_homestay_ids:
         return HTMLResponse("<h2>Booking not found or not authorized</h2>", status_code=404)
     db.delete(booking)
     db.commit()
@@ -1,49 +1,120 @@
 import calendar as cal
-from datetime import date
+from datetime import date, timedelta
 from fastapi import APIRouter, Depends, Request, Form, UploadFile, File
 from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
+from sqlalchemy import and_
 from sqlalchemy.orm import Session
-from ..db import get_db
-from ..models import Booking, Room, BookingStatus, User
-from ..security import get_current_user_id
+from ..db import get_db, get_read_db
+from ..config import settings
+from ..models import Booking, Room, BookingStatus
+from ..security import get_principal
 from ..services.auto_checkout import run_auto_checkout
-from ..services.media import save_image
-from ..services.ical import fetch_ota_events, overlaps_ota
+from ..services.availability import commit_booking, has_booking_conflict
+from ..services.calendar_grid import month_cells, room_timeline, timeline_days
+from ..services.media import assign_image, save_upload
+from ..serialization import FastJSONResponse
+from ..services.ical import cached_ota_events, fetch_ota_events, overlaps_ota, refresh_ota_feeds
+from ..templating import templates
 
 router = APIRouter(prefix="/htmx", tags=["calendar"]) 
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/calendar/view", response_class=HTMLResponse)
 def calendar_view(request: Request, year: int, month: int, room_id: int, db: Session = Depends(get_db)):
-    uid = get_current_user_id(request)
-    if not uid:
+    principal = get_principal(request, db)
+    if principal is None:
         return HTMLResponse("<div>Please login</div>", status_code=401)
     # Auto-checkout before rendering calendar so statuses are up to date
     try:
         run_auto_checkout(db)
     except Exception:
         db.rollback()
-    first_wd, days = cal.monthrange(year, month)  # Monday=0 .. Sunday=6
+    _, days = cal.monthrange(year, month)
     start = date(year, month, 1)
     end = date(year, month, days)
-    bookings = db.query(Booking).filter(Booking.room_id == room_id, Booking.start_date <= end, Booking.end_date >= start).all()
-    month_label = f"{cal.month_name[month]} {year}"
-    weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    today_str = date.today().isoformat()
+    bookings = (
+        db.query(Booking.id, Booking.guest_name, Booking.start_date, Booking.end_date, Booking.status)
+        .filter(
+            Booking.room_id == room_id,
+            Booking.start_date <= end,
+            Booking.end_date > start,
+            Booking.status != BookingStatus.CANCELLED,
+        )
+        .order_by(Booking.start_date)
+        .all()
+    )
     return templates.TemplateResponse(
         "calendar/grid.html",
         {
             "request": request,
-            "year": year,
-            "month": month,
             "days": days,
-            "bookings": bookings,
+            "cells": month_cells(year, month, bookings),
             "room_id": room_id,
-            "first_wd": first_wd,
-            "weekdays": weekdays,
-            "month_label": month_label,
-            "today_str": today_str,
+            "month_label": f"{cal.month_name[month]} {year}",
+        },
+    )
+
+@router.get("/calendar/timeline", response_class=HTMLResponse)
+def calendar_timeline(request: Request, homestay_id: int | None = None, start: str | None = None, days: int | None = None, chunk: bool = False, db: Session = Depends(get_db)):
+    """
+    Every room of a property over a window of days, from one query. The first request
+    renders the whole strip; scrolling it sideways fetches further `chunk`s of `days` nights.
+    OTA blocks come only from the warm feed cache; cold feeds are refreshed in the background.
+    """
+    principal = get_principal(request, db)
+    if principal is None:
+        return HTMLResponse("<div>Please login</div>", status_code=401)
+    homestay_id = homestay_id or principal.homestay_id
+    if not (principal.is_admin or principal.can_access_homestay(homestay_id)):
+        return HTMLResponse("<div class='text-red-700 p-2'>Not authorized for this property.</div>", status_code=403)
+    try:
+        window_start = date.fromisoformat(start) if start else date.today() - timedelta(days=2)
+    except ValueError:
+        return HTMLResponse("<div class='text-red-700 p-2'>Invalid start date.</div>", status_code=400)
+    days = min(max(days or settings.TIMELINE_CHUNK_DAYS, 1), 92)
+    window_end = window_start + timedelta(days=days)
+    if not chunk:
+        # Once per strip rather than once per room
+        try:
+            run_auto_checkout(db)
+        except Exception:
+            db.rollback()
+
+    # Rooms outer-joined to their bookings in the window: one row per booking, or one per empty room
+    rows = (
+        db.query(
+            Room.id.label("room_id"), Room.name.label("room_name"), Room.ota_ical_url,
+            Booking.id, Booking.guest_name, Booking.start_date, Booking.end_date, Booking.status,
+        )
+        .outerjoin(Booking, and_(
+            Booking.room_id == Room.id,
+            Booking.start_date < window_end,
+            Booking.end_date > window_start,
+            Booking.status != BookingStatus.CANCELLED,
+        ))
+        .filter(Room.homestay_id == homestay_id)
+        .order_by(Room.name.asc(), Room.id.asc(), Booking.start_date.asc())
+        .all()
+    )
+    rooms: dict[int, tuple[str, str | None, list]] = {}
+    for row in rows:
+        name, ota_url, bookings = rooms.setdefault(row.room_id, (row.room_name, row.ota_ical_url, []))
+        if row.id is not None:
+            bookings.append(row)
+    refresh_ota_feeds(ota_url for _, ota_url, _ in rooms.values())
+    timelines = [
+        room_timeline(room_id, name, window_start, days, bookings, cached_ota_events(ota_url))
+        for room_id, (name, ota_url, bookings) in rooms.items()
+    ]
+    return templates.TemplateResponse(
+        "calendar/timeline_chunk.html" if chunk else "calendar/timeline.html",
+        {
+            "request": request,
+            "homestay_id": homestay_id,
+            "rooms": timelines,
+            "cells": timeline_days(window_start, days),
+            "days": days,
+            "next_start": window_end.isoformat(),
+            "month_label": f"{cal.month_name[window_start.month]} {window_start.year}",
         },
     )
 
@@ -60,14 +131,15 @@ def booking_new(request: Request, room_id: int, start_date: str, end_date: str,
 
 @router.post("/booking/save", response_class=HTMLResponse)
 def booking_save(request: Request, db: Session = Depends(get_db), room_id: int = Form(...), guest_name: str = Form(...), guest_contact: str = Form(""), start_date: str = Form(...), end_date: str = Form(...), price: float = Form(0.0), comment: str = Form("") ):
-    uid = get_current_user_id(request)
-    if not uid:
+    principal = get_principal(request, db)
+    if principal is None:
         return HTMLResponse("<div>Please login</div>", status_code=401)
     s = date.fromisoformat(start_date)
     e = date.fromisoformat(end_date)
+    if not (s < e):
+        return HTMLResponse("<div class='text-red-600 p-2'>End date must be after start date.</div>", status_code=400)
     # conflict detection with existing bookings
-    conflicts = db.query(Booking).filter(Booking.room_id == room_id, Booking.start_date < e, Booking.end_date > s).all()
-    if conflicts:
+    if has_booking_conflict(db, room_id, s, e):
         return HTMLResponse("<div class='text-red-600 p-2'>Conflict: dates overlap existing booking.</div>", status_code=400)
     # also prevent overlap with OTA calendar if configured
     room = db.query(Room).get(room_id)
@@ -80,16 +152,17 @@ def booking_save(request: Request, db: Session = Depends(get_db), room_id: int =
             pass
     booking = Booking(room_id=room_id, guest_name=guest_name, guest_contact=guest_contact, start_date=s, end_date=e, price=price, status=BookingStatus.CONFIRMED, comment=comment.strip() or None)
     db.add(booking)
-    db.commit()
+    if not commit_booking(db):
+        return HTMLResponse("<div class='text-red-600 p-2'>Conflict: dates overlap existing booking.</div>", status_code=400)
     # Inform HTMX/JS listeners so calendars can refresh
     headers = {"HX-Trigger": "bookingSaved"}
     return HTMLResponse("<div class='text-green-700 p-2'>Booking saved.</div>", headers=headers)
 
 @router.get("/calendar/events")
-def calendar_events(request: Request, room_id: int, start: str, end: str, db: Session = Depends(get_db)):
+def calendar_events(request: Request, room_id: int, start: str, end: str, db: Session = Depends(get_read_db)):
     """Return bookings for a room within a given range in FullCalendar JSON format."""
-    uid = get_current_user_id(request)
-    if not uid:
+    principal = get_principal(request, db)
+    if principal is None:
         return JSONResponse({"error": "unauthorized"}, status_code=401)
     # Parse dates (FullCalendar passes ISO8601, we only need the date portion)
     try:
@@ -97,9 +170,9 @@ def calendar_events(request: Request, room_id: int, start: str, end: str, db: Se
         end_date = date.fromisoformat(end[:10])
     except Exception:
         return JSONResponse([], status_code=200)
-    # Overlap query
+    # Overlap query (only the columns the feed needs, no ORM objects)
     bookings = (
-        db.query(Booking)
+        db.query(Booking.id, Booking.guest_name, Booking.start_date, Booking.end_date, Booking.status)
         .filter(
             Booking.room_id == room_id,
             Booking.start_date < end_date,
@@ -152,12 +225,12 @@ def calendar_events(request: Request, room_id: int, start: str, end: str, db: Se
                     })
         except Exception:
             pass
-    return JSONResponse(events)
+    return FastJSONResponse(events)
 
 @router.post("/booking/update-status", response_class=HTMLResponse)
 def update_status(request: Request, db: Session = Depends(get_db), booking_id: int = Form(...), status: str = Form(...)):
-    uid = get_current_user_id(request)
-    if not uid:
+    principal = get_principal(request, db)
+    if principal is None:
         return HTMLResponse("<div>Please login</div>", status_code=401)
     b = db.query(Booking).get(booking_id)
     if not b:
@@ -165,13 +238,15 @@ def update_status(request: Request, db: Session = Depends(get_db), booking_id: i
     if status not in [s.value for s in BookingStatus]:
         return HTMLResponse("<div>Bad status</div>", status_code=400)
     b.status = BookingStatus(status)
-    db.commit()
+    # Re-activating a cancelled booking can collide with one made since
+    if not commit_booking(db):
+        return HTMLResponse("<div class='text-red-700 p-2'>Conflict: overlapping booking exists.</div>", status_code=400)
     return HTMLResponse("<div class='text-blue-700 p-2'>Status updated.</div>")
 
 @router.get("/booking/edit-dates", response_class=HTMLResponse)
 def booking_edit_dates(request: Request, booking_id: int, db: Session = Depends(get_db)):
-    uid = get_current_user_id(request)
-    if not uid:
+    principal = get_principal(request, db)
+    if principal is None:
         return HTMLResponse("<div>Please login</div>", status_code=401)
     b = db.query(Booking).get(booking_id)
     if not b:
@@ -192,8 +267,8 @@ def booking_update_dates(
     start_date: str = Form(...),
     end_date: str = Form(...),
 ):
-    uid = get_current_user_id(request)
-    if not uid:
+    principal = get_principal(request, db)
+    if principal is None:
         return HTMLResponse("<div>Please login</div>", status_code=401)
     b = db.query(Booking).get(booking_id)
     if not b:
@@ -207,17 +282,7 @@ def booking_update_dates(
     if not (s < e):
         return HTMLResponse("<div class='text-red-700 p-2'>End date must be after start date.</div>", status_code=400)
     # conflict detection excluding self
-    conflicts = (
-        db.query(Booking)
-        .filter(
-            Booking.room_id == b.room_id,
-            Booking.id != b.id,
-            Booking.start_date < e,
-            Booking.end_date > s,
-        )
-        .all()
-    )
-    if conflicts:
+    if has_booking_conflict(db, b.room_id, s, e, exclude_booking_id=b.id):
         return HTMLResponse("<div class='text-red-700 p-2'>Conflict: overlapping booking exists.</div>", status_code=400)
     # Also check against OTA events for this room
     room = db.query(Room).get(b.room_id)
@@ -230,7 +295,8 @@ def booking_update_dates(
             pass
     b.start_date = s
     b.end_date = e
-    db.commit()
+    if not commit_booking(db):
+        return HTMLResponse("<div class='text-red-700 p-2'>Conflict: overlapping booking exists.</div>", status_code=400)
     headers = {"HX-Trigger": "bookingUpdated"}
     # Return empty modal container to close
     return HTMLResponse("", headers=headers)
@@ -238,16 +304,15 @@ def booking_update_dates(
 
 @router.get("/booking/edit", response_class=HTMLResponse)
 def booking_edit(request: Request, booking_id: int, db: Session = Depends(get_db)):
-    uid = get_current_user_id(request)
-    if not uid:
+    principal = get_principal(request, db)
+    if principal is None:
         return HTMLResponse("<div>Please login</div>", status_code=401)
     b = db.query(Booking).get(booking_id)
     if not b:
         return HTMLResponse("<div>Not found</div>", status_code=404)
-    user = db.query(User).get(uid)
     rooms = []
-    if user and user.homestay_id:
-        rooms = db.query(Room).filter(Room.homestay_id == user.homestay_id).order_by(Room.name.asc()).all()
+    if principal.homestay_id:
+        rooms = db.query(Room).filter(Room.homestay_id == principal.homestay_id).order_by(Room.name.asc()).all()
     return templates.TemplateResponse(
         "calendar/edit_booking_modal.html",
         {
@@ -274,16 +339,15 @@ async def booking_update(
     comment: str = Form(""),
     image: UploadFile | None = File(None),
 ):
-    uid = get_current_user_id(request)
-    if not uid:
+    principal = get_principal(request, db)
+    if principal is None:
         return HTMLResponse("<div>Please login</div>", status_code=401)
     b = db.query(Booking).get(booking_id)
     if not b:
         return HTMLResponse("<div>Not found</div>", status_code=404)
-    user = db.query(User).get(uid)
     # Validate room belongs to user's active homestay
     room = db.query(Room).get(room_id)
-    if not room or (user and user.homestay_id and room.homestay_id != user.homestay_id):
+    if not room or (principal.homestay_id and room.homestay_id != principal.homestay_id):
         return HTMLResponse("<div class='text-red-700 p-2'>Invalid room selection.</div>", status_code=400)
     # Parse and validate dates
     try:
@@ -294,17 +358,7 @@ async def booking_update(
     if not (s < e):
         return HTMLResponse("<div class='text-red-700 p-2'>End date must be after start date.</div>", status_code=400)
     # Conflict detection excluding this booking
-    conflicts = (
-        db.query(Booking)
-        .filter(
-            Booking.room_id == room_id,
-            Booking.id != booking_id,
-            Booking.start_date < e,
-            Booking.end_date > s,
-        )
-        .all()
-    )
-    if conflicts:
+    if has_booking_conflict(db, room_id, s, e, exclude_booking_id=booking_id):
         return HTMLResponse("<div class='text-red-700 p-2'>Conflict: overlapping booking exists.</div>", status_code=400)
     # Check OTA overlaps for the selected room
     room_sel = db.query(Room).get(room_id)
@@ -328,10 +382,8 @@ async def booking_update(
         return HTMLResponse("<div class='text-red-700 p-2'>Invalid status.</div>", status_code=400)
     b.comment = (comment.strip() or None)
     if image and image.filename:
-        data = await image.read()
-        new_url = save_image(data, image.filename, folder="staycal/bookings")
-        if new_url:
-            b.image_url = new_url
-    db.commit()
+        assign_image(b, await save_upload(image, folder="staycal/bookings"))
+    if not commit_booking(db):
+        return HTMLResponse("<div class='text-red-700 p-2'>Conflict: overlapping booking exists.</div>", status_code=400)
     headers = {"HX-Trigger": "bookingUpdated"}
     return HTMLResponse("", headers=headers)
@@ -4,19 +4,20 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
 from ..db import get_db
 from ..models import User, Homestay, Room
-from ..security import require_user, hash_password
-from ..services.media import save_image
+from ..principal import Principal
+from ..security import require_principal, require_user, hash_password
+from ..services.media import assign_image, save_upload
 from ..templating import templates
 
 router = APIRouter(prefix="/app/homestays", tags=["homestays"])
 
 @router.get("/", response_class=HTMLResponse)
-def homestays_index(request: Request, user: User = Depends(require_user), db: Session = Depends(get_db)):
+def homestays_index(request: Request, user: Principal = Depends(require_principal), db: Session = Depends(get_db)):
     owned: list[Homestay] = db.query(Homestay).filter(Homestay.owner_id == user.id).order_by(Homestay.created_at.desc()).all()
     return templates.TemplateResponse("homestays/list.html", {"request": request, "user": user, "homestays": owned})
 
 @router.get("/new", response_class=HTMLResponse)
-def homestays_new_form(request: Request, user: User = Depends(require_user)):
+def homestays_new_form(request: Request, user: Principal = Depends(require_principal)):
     return templates.TemplateResponse("homestays/edit.html", {"request": request, "user": user, "homestay": None})
 
 @router.post("/")
@@ -24,12 +25,12 @@ async def homestays_create(request: Request, user: User = Depends(require_user),
     if user.role not in ("owner", "admin"):
         return HTMLResponse("<h2>Forbidden: Only owners can create properties.</h2>", status_code=403)
     
-    img_url = None
+    stored = None
     if image and image.filename:
-        data = await image.read()
-        img_url = save_image(data, image.filename, folder="staycal/homestays")
+        stored = await save_upload(image, folder="staycal/homestays")
         
-    hs = Homestay(owner_id=user.id, name=name.strip(), address=address.strip(), image_url=img_url)
+    hs = Homestay(owner_id=user.id, name=name.strip(), address=address.strip())
+    assign_image(hs, stored)
     db.add(hs)
     db.commit()
     db.refresh(hs)
@@ -42,14 +43,14 @@ async def homestays_create(request: Request, user: User = Depends(require_user),
     return RedirectResponse(url="/app/homestays/", status_code=303)
 
 @router.get("/{homestay_id}/edit", response_class=HTMLResponse)
-def homestays_edit_form(request: Request, homestay_id: int, user: User = Depends(require_user), db: Session = Depends(get_db)):
+def homestays_edit_form(request: Request, homestay_id: int, user: Principal = Depends(require_principal), db: Session = Depends(get_db)):
     hs = db.query(Homestay).get(homestay_id)
     if not hs or hs.owner_id != user.id:
         return HTMLResponse("<h2>Property not found or not authorized</h2>", status_code=404)
     return templates.TemplateResponse("homestays/edit.html", {"request": request, "user": user, "homestay": hs})
 
 @router.post("/{homestay_id}/edit")
-async def homestays_edit(request: Request, homestay_id: int, user: User = Depends(require_user), name: str = Form(...), address: str = Form(""), image: UploadFile | None = File(None), db: Session = Depends(get_db)):
+async def homestays_edit(request: Request, homestay_id: int, user: Principal = Depends(require_principal), name: str = Form(...), address: str = Form(""), image: UploadFile | None = File(None), db: Session = Depends(get_db)):
     hs = db.query(Homestay).get(homestay_id)
     if not hs or hs.owner_id != user.id:
         return HTMLResponse("<h2>Property not found or not authorized</h2>", status_code=404)
@@ -57,10 +58,7 @@ async def homestays_edit(request: Request, homestay_id: int, user: User = Depend
     hs.name = name.strip()
     hs.address = address.strip()
     if image and image.filename:
-        data = await image.read()
-        new_url = save_image(data, image.filename, folder="staycal/homestays")
-        if new_url:
-            hs.image_url = new_url
+        assign_image(hs, await save_upload(image, folder="staycal/homestays"))
     db.commit()
     return RedirectResponse(url="/app/homestays/", status_code=303)
 
@@ -1,11 +1,14 @@
 import calendar as cal
-from datetime import date
+from datetime import date, datetime, time, timezone
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse, JSONResponse
 from sqlalchemy.orm import Session
-from ..db import get_db
-from ..models import Homestay, Room, Booking, BookingStatus, Plan
+from ..db import get_db, get_read_db
+from ..models import Homestay, Room, Booking, BookingStatus
 from ..config import settings
+from ..public_cache import as_utc, cached_response, pages, versions
+from ..serialization import FastJSONResponse, dumps
+from ..services.plans import plan_catalog
 from ..templating import templates
 
 router = APIRouter(tags=["public"])
@@ -28,29 +31,49 @@ def get_firebase_config():
 
 @router.get("/", response_class=HTMLResponse)
 def landing(request: Request, db: Session = Depends(get_db)):
-    plans = db.query(Plan).filter(Plan.is_active == True).order_by(Plan.price_monthly.asc()).all()
-    return templates.TemplateResponse("landing.html", {"request": request, "plans": plans})
+    plans = plan_catalog.active(db)
+    # Rendered once per host and plan list; the page has no per-user content
+    page_url = str(request.url.replace(query="", fragment=""))
+    key = ("landing", page_url, plans)
+    cached = pages.get(key)
+    if cached is None:
+        body = templates.TemplateResponse("landing.html", {"request": request, "plans": plans, "page_url": page_url}).body
+        cached = pages.set(key, body, "text/html; charset=utf-8")
+    return cached_response(request, cached)
 
 @router.get("/public/{homestay_id}", response_class=HTMLResponse)
-def public_property(request: Request, homestay_id: int, room_id: int | None = None, year: int | None = None, month: int | None = None, db: Session = Depends(get_db)):
+def public_property(request: Request, homestay_id: int, room_id: int | None = None, year: int | None = None, month: int | None = None, db: Session = Depends(get_read_db)):
+    version = versions.homestay(db, homestay_id)
+    if version is None:
+        return HTMLResponse("<h2>Property not found</h2>", status_code=404)
+    today = date.today()
+    # The page highlights today, so the date is part of the key and of Last-Modified
+    key = ("property", homestay_id, version[0], room_id, year, month, today)
+    cached = pages.get(key)
+    if cached is None:
+        body = _render_property(request, db, homestay_id, room_id, year, month, today)
+        if body is None:
+            return HTMLResponse("<h2>Property not found</h2>", status_code=404)
+        midnight = datetime.combine(today, time.min, tzinfo=timezone.utc)
+        cached = pages.set(key, body, "text/html; charset=utf-8", max(filter(None, (as_utc(version[1]), midnight))))
+    return cached_response(request, cached)
+
+
+def _render_property(request: Request, db: Session, homestay_id: int, room_id: int | None, year: int | None, month: int | None, today: date) -> bytes | None:
     hs = db.query(Homestay).get(homestay_id)
     if not hs:
-        return HTMLResponse("<h2>Property not found</h2>", status_code=404)
+        return None
     rooms = db.query(Room).filter(Room.homestay_id == hs.id).order_by(Room.name.asc()).all()
     if not rooms:
-        return templates.TemplateResponse("public/property.html", {"request": request, "homestay": hs, "rooms": [], "year": date.today().year, "month": date.today().month, "days": 0, "bookings": [], "room_id": None, "first_wd": 0, "weekdays": ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"], "month_label": "", "today_str": date.today().isoformat()})
+        return templates.TemplateResponse("public/property.html", {"request": request, "homestay": hs, "rooms": [], "year": today.year, "month": today.month, "days": 0, "room_id": None, "first_wd": 0, "weekdays": ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"], "month_label": "", "today_str": today.isoformat()}).body
     # Select room
     if not room_id:
         room_id = rooms[0].id
     # Resolve month/year
-    today = date.today()
     year = year or today.year
     month = month or today.month
-    # Compute calendar meta
+    # Compute calendar meta; bookings are loaded by the calendar from /public/calendar/events
     first_wd, days = cal.monthrange(year, month)
-    start = date(year, month, 1)
-    end = date(year, month, days)
-    bookings = db.query(Booking).filter(Booking.room_id == room_id, Booking.start_date <= end, Booking.end_date >= start).all()
     ctx = {
         "request": request,
         "homestay": hs,
@@ -59,16 +82,15 @@ def public_property(request: Request, homestay_id: int, room_id: int | None = No
         "year": year,
         "month": month,
         "days": days,
-        "bookings": bookings,
         "first_wd": first_wd,
         "weekdays": ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"],
         "month_label": f"{cal.month_name[month]} {year}",
         "today_str": today.isoformat(),
     }
-    return templates.TemplateResponse("public/property.html", ctx)
+    return templates.TemplateResponse("public/property.html", ctx).body
 
 @router.get("/public/calendar/events")
-def public_calendar_events(room_id: int, start: str, end: str, db: Session = Depends(get_db)):
+def public_calendar_events(request: Request, room_id: int, start: str, end: str, db: Session = Depends(get_read_db)):
     """Return bookings for a room within a given range (public, read-only)."""
     # Parse dates
     try:
@@ -78,8 +100,23 @@ def public_calendar_events(room_id: int, start: str, end: str, db: Session = Dep
         # Return empty list on bad params (keep public endpoint permissive)
         return JSONResponse([], status_code=200)
 
+    room_version = versions.room(db, room_id)
+    if room_version is None:
+        return FastJSONResponse([])
+    _, version, updated_at = room_version
+    key = ("events", room_id, version, start_date, end_date)
+    cached = pages.get(key)
+    if cached is None:
+        events, has_ota = _public_events(db, room_id, start_date, end_date)
+        # OTA events come from a feed we don't version; date them by when they were merged in
+        last_modified = datetime.now(timezone.utc).replace(microsecond=0) if has_ota else as_utc(updated_at)
+        cached = pages.set(key, dumps(events), "application/json", last_modified)
+    return cached_response(request, cached)
+
+
+def _public_events(db: Session, room_id: int, start_date: date, end_date: date) -> tuple[list[dict], bool]:
     bookings = (
-        db.query(Booking)
+        db.query(Booking.id, Booking.guest_name, Booking.start_date, Booking.end_date, Booking.status)
         .filter(
             Booking.room_id == room_id,
             Booking.start_date < end_date,
@@ -109,11 +146,11 @@ def public_calendar_events(room_id: int, start: str, end: str, db: Session = Dep
     ]
 
     # Append OTA (external) events if room has an iCal URL
-    room = db.query(Room).get(room_id)
-    if room and getattr(room, "ota_ical_url", None):
+    ota_url = db.query(Room.ota_ical_url).filter(Room.id == room_id).scalar()
+    if ota_url:
         try:
             from ..services.ical import fetch_ota_events
-            ota_list = fetch_ota_events(room.ota_ical_url)
+            ota_list = fetch_ota_events(ota_url)
             for ev in ota_list:
                 s = ev.get("start_date")
                 e = ev.get("end_date")
@@ -132,4 +169,4 @@ def public_calendar_events(room_id: int, start: str, end: str, db: Session = Dep
         except Exception:
             pass
 
-    return JSONResponse(events)
+    return events, bool(ota_url)
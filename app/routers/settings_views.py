@@ -1,5 +1,5 @@
 import secrets
-from fastapi import APIRouter, Depends, Form, Request, BackgroundTasks
+from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
 from ..db import get_db
@@ -44,7 +44,7 @@ def change_password(request: Request, user: User = Depends(require_user), db: Se
     return templates.TemplateResponse("settings.html", {"request": request, "user": user, "available_currencies": CURRENCY_SYMBOLS.keys(), "message": "Password updated successfully."})
 
 @router.post("/invite")
-def invite_staff(request: Request, background_tasks: BackgroundTasks, user: User = Depends(require_user), db: Session = Depends(get_db), email: str = Form(...)):
+def invite_staff(request: Request, user: User = Depends(require_user), db: Session = Depends(get_db), email: str = Form(...)):
     if user.role != UserRole.OWNER:
         return templates.TemplateResponse("settings.html", {"request": request, "user": user, "available_currencies": CURRENCY_SYMBOLS.keys(), "error": "Only property owners can invite staff."})
 
@@ -64,8 +64,7 @@ def invite_staff(request: Request, background_tasks: BackgroundTasks, user: User
         is_verified=False # User will be verified when they accept the invitation
     )
     db.add(new_staff_user)
+    send_invitation_email(db, email, token)
     db.commit()
 
-    background_tasks.add_task(send_invitation_email, email, token)
-
     return templates.TemplateResponse("settings.html", {"request": request, "user": user, "available_currencies": CURRENCY_SYMBOLS.keys(), "message": f"Invitation sent to {email}."})
@@ -0,0 +1,49 @@
+"""
+Fast, read-only check of the database schema revision against the Alembic head.
+
+Used at startup (log only) and by entrypoint.sh, which only runs `alembic upgrade head`
+when this reports the schema is behind:
+
+    python -m app.schema   # exit 0 if current, 1 if migrations are pending
+"""
+import os
+import sys
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ALEMBIC_INI = os.path.join(PROJECT_ROOT, "alembic.ini")
+
+
+def head_revisions() -> set[str]:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(PROJECT_ROOT, "alembic"))
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def current_revisions(engine: Engine) -> set[str]:
+    """Revisions stamped in alembic_version; empty if the table does not exist yet."""
+    try:
+        with engine.connect() as conn:
+            return {row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))}
+    except Exception:
+        return set()
+
+
+def schema_is_current(engine: Engine) -> bool:
+    return current_revisions(engine) == head_revisions()
+
+
+if __name__ == "__main__":
+    _engine = create_engine(settings.DATABASE_URL)
+    current, heads = current_revisions(_engine), head_revisions()
+    if current == heads:
+        print(f"Database schema is current ({', '.join(sorted(heads))}).")
+        sys.exit(0)
+    print(f"Database schema at {', '.join(sorted(current)) or 'none'}; head is {', '.join(sorted(heads))}.")
+    sys.exit(1)
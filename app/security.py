@@ -1,5 +1,4 @@
 from typing import Optional
-from passlib.context import CryptContext
 from itsdangerous import URLSafeSerializer, BadSignature
 from fastapi import Request, Response, Depends, HTTPException
 from sqlalchemy.orm import Session
@@ -7,19 +6,12 @@ from sqlalchemy.orm import Session
 from .config import settings
 from .db import get_db
 from .models import User
+from .hashing import hash_password, verify_password  # re-exported for existing callers
+from .principal import Principal, principal_cache, load_principal
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 serializer = URLSafeSerializer(settings.SECRET_KEY, salt="staycal-session")
 
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
-
-
 def set_session(response: Response, user_id: int):
     token = serializer.dumps({"uid": user_id})
     is_production = getattr(settings, "ENVIRONMENT", "development") == "production"
@@ -49,19 +41,52 @@ def get_current_user_id(request: Request) -> Optional[int]:
         return None
 
 
+def get_principal(request: Request, db: Session) -> Optional[Principal]:
+    """
+    The cached identity (id, role, active homestay, owned homestays) of the caller, or None.
+    Hits the database only when the principal is not cached; memoised on request.state.
+    """
+    principal = getattr(request.state, "principal", None)
+    if principal is not None:
+        return principal
+    user_id = get_current_user_id(request)
+    if not user_id:
+        return None
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        principal = load_principal(db, user_id)
+        if principal is None:
+            return None
+        principal_cache.set(principal)
+    request.state.principal = principal
+    return principal
+
+
+def require_principal(request: Request, db: Session = Depends(get_db)) -> Principal:
+    """
+    Like require_user, for routes that only need the caller's identity and homestay scope.
+    Served from the principal cache, so it usually costs no query.
+    """
+    principal = get_principal(request, db)
+    if principal is None:
+        raise HTTPException(status_code=307, headers={"Location": "/auth/login"})
+    return principal
+
+
 def require_user(request: Request, db: Session = Depends(get_db)) -> User:
     """
     Dependency to protect routes that require a logged-in user.
     Redirects to the login page if the user is not authenticated.
     """
-    user_id = get_current_user_id(request)
-    if not user_id:
+    principal = get_principal(request, db)
+    if principal is None:
         raise HTTPException(status_code=307, headers={"Location": "/auth/login"})
-    
-    user = db.query(User).get(user_id)
+
+    user = db.get(User, principal.id)
     if not user:
         # This case can happen if the user was deleted but the cookie remains.
         # We raise an exception that will also lead to a redirect.
+        principal_cache.invalidate(principal.id)
         raise HTTPException(status_code=307, headers={"Location": "/auth/login"})
         
     return user
@@ -0,0 +1,103 @@
+import logging
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import insert, literal, select, delete
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Booking, BookingStatus, ArchivedBooking, bump_content_version
+
+logger = logging.getLogger(__name__)
+
+# Only bookings that can no longer change are archived.
+ARCHIVABLE_STATUSES = [BookingStatus.CHECKED_OUT, BookingStatus.CANCELLED]
+
+# Columns shared by bookings and bookings_archive, in insert order.
+_COLUMNS = [
+    "id", "room_id", "homestay_id", "owner_id", "guest_name", "guest_contact", "start_date",
+    "end_date", "price", "status", "comment", "image_url", "image_variants", "created_at",
+]
+
+
+def archive_cutoff(today: Optional[date] = None) -> date:
+    """First day of the oldest calendar year that stays in the live bookings table."""
+    today = today or date.today()
+    keep_years = max(1, settings.BOOKING_ARCHIVE_KEEP_YEARS)
+    return date(today.year - keep_years + 1, 1, 1)
+
+
+def archive_bookings(db: Session, before: Optional[date] = None, chunk_size: Optional[int] = None) -> int:
+    """
+    Move finished bookings that ended before `before` (default and latest allowed: archive_cutoff(),
+    which owner_bookings relies on to decide when to read the archive) into bookings_archive.
+    Works in chunks, committing after each, so locks stay short and a failure only loses the current chunk.
+    Returns the number of bookings moved.
+    """
+    before = min(before or archive_cutoff(), archive_cutoff())
+    chunk_size = chunk_size or settings.BOOKING_ARCHIVE_CHUNK_SIZE
+    bookings = Booking.__table__
+    archive = ArchivedBooking.__table__
+    moved = 0
+    while True:
+        ids = [
+            row[0]
+            for row in db.execute(
+                select(bookings.c.id)
+                .where(bookings.c.end_date < before, bookings.c.status.in_(ARCHIVABLE_STATUSES))
+                .order_by(bookings.c.id)
+                .limit(chunk_size)
+            )
+        ]
+        if not ids:
+            break
+        source = select(*[bookings.c[name] for name in _COLUMNS], literal(datetime.utcnow()).label("archived_at")).where(bookings.c.id.in_(ids))
+        db.execute(insert(archive).from_select(_COLUMNS + ["archived_at"], source))
+        db.execute(delete(bookings).where(bookings.c.id.in_(ids)))
+        # Core statements skip the mapper events that version public property pages
+        bump_content_version(db, (row[0] for row in db.execute(select(archive.c.homestay_id).where(archive.c.id.in_(ids)).distinct())))
+        db.commit()
+        moved += len(ids)
+        logger.info("Archived %d bookings (total %d)", len(ids), moved)
+    return moved
+
+
+def _period_filter(q, model, period_start: Optional[date], period_end: Optional[date]):
+    if period_start and period_end:
+        return q.filter(model.start_date < period_end, model.end_date > period_start)
+    if period_start:
+        return q.filter(model.end_date > period_start)
+    if period_end:
+        return q.filter(model.start_date < period_end)
+    return q
+
+
+def owner_bookings(db: Session, owner_id: int, period_start: Optional[date], period_end: Optional[date]) -> list:
+    """
+    Bookings for all of an owner's properties overlapping the period, ordered by start date.
+    Reads through to bookings_archive only when the period starts before archive_cutoff(),
+    the only dates the archiver moves, so current-period pages cost a single query against
+    the live table.
+    """
+    models: Iterable = [Booking]
+    if period_start is None or period_start < archive_cutoff():
+        models = [Booking, ArchivedBooking]
+    results = []
+    for model in models:
+        q = db.query(model).filter(model.owner_id == owner_id)
+        results.extend(_period_filter(q, model, period_start, period_end).all())
+    results.sort(key=lambda b: b.start_date)
+    return results
+
+
+if __name__ == "__main__":
+    # Batch entry point, e.g. from a nightly cron: python -m app.services.archive
+    from ..db import SessionLocal
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    session = SessionLocal()
+    try:
+        total = archive_bookings(session)
+        logger.info("Archive run complete: %d bookings moved", total)
+    finally:
+        session.close()
@@ -1,6 +1,6 @@
 from datetime import date
 from sqlalchemy.orm import Session
-from ..models import Booking, BookingStatus
+from ..models import Booking, BookingStatus, bump_content_version
 
 
 def run_auto_checkout(db: Session) -> int:
@@ -24,8 +24,13 @@ def run_auto_checkout(db: Session) -> int:
             ),
         )
     )
+    # Bulk updates fire no mapper events: bump the affected properties' public cache version by hand
+    homestay_ids = {row[0] for row in q.with_entities(Booking.homestay_id).distinct()}
+    if not homestay_ids:
+        return 0
     # Use bulk update for efficiency; synchronize_session=False for speed.
     result = q.update({Booking.status: BookingStatus.CHECKED_OUT}, synchronize_session=False)
+    bump_content_version(db, homestay_ids)
     db.commit()
     try:
         return int(result)
@@ -0,0 +1,58 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models import Booking, BookingStatus
+
+# Name of the Postgres exclusion constraint added by migration 20251025_0001.
+OVERLAP_CONSTRAINT = "ex_bookings_room_stay"
+
+
+def _uses_daterange(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def has_booking_conflict(db: Session, room_id: int, start: date, end: date, exclude_booking_id: Optional[int] = None) -> bool:
+    """
+    Return True if a non-cancelled booking in the room overlaps [start, end).
+    On Postgres this uses the generated `stay` daterange column and its GiST index (`stay && daterange(...)`);
+    elsewhere it falls back to the equivalent date-column comparison.
+    """
+    q = db.query(Booking.id).filter(
+        Booking.room_id == room_id,
+        Booking.status != BookingStatus.CANCELLED,
+    )
+    if exclude_booking_id is not None:
+        q = q.filter(Booking.id != exclude_booking_id)
+    if _uses_daterange(db):
+        q = q.filter(literal_column("bookings.stay").op("&&")(func.daterange(start, end, "[)")))
+    else:
+        q = q.filter(Booking.start_date < end, Booking.end_date > start)
+    return db.query(q.exists()).scalar()
+
+
+def is_overlap_violation(exc: IntegrityError) -> bool:
+    """True if the IntegrityError came from the bookings overlap exclusion constraint."""
+    orig = getattr(exc, "orig", None)
+    if getattr(orig, "sqlstate", None) == "23P01":  # exclusion_violation
+        return True
+    return OVERLAP_CONSTRAINT in str(orig or exc)
+
+
+def commit_booking(db: Session) -> bool:
+    """
+    Commit a booking write. Returns False (after rolling back) if the Postgres overlap
+    constraint rejected it, so callers can answer with their usual conflict response;
+    any other IntegrityError propagates.
+    """
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        if not is_overlap_violation(exc):
+            raise
+        return False
+    return True
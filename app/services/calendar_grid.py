@@ -0,0 +1,210 @@
+"""
+Per-day cell map for the month grid (calendar/grid.html), and per-room spans for the
+property timeline (calendar/timeline.html).
+
+`month_cells` walks the month's bookings once and fills one cell per day, so building the
+grid is O(days + booked nights) and the template only renders the list. `room_timeline`
+turns a room's bookings and OTA blocks into a short run-length list of spans (a stay is one
+span however long it is; free nights are one span per gap). Compare with the old per-cell
+booking scan on dense months:
+
+    python -m app.services.calendar_grid
+"""
+import calendar as cal
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from ..models import BookingStatus
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+# Tailwind background per status; anything else (tentative) is yellow
+STATUS_COLORS = {
+    BookingStatus.CONFIRMED: "bg-green-300",
+    BookingStatus.CHECKED_IN: "bg-blue-300",
+    BookingStatus.CHECKED_OUT: "bg-gray-300",
+}
+DEFAULT_COLOR = "bg-yellow-300"
+
+
+@dataclass(frozen=True)
+class DayCell:
+    day: int
+    date: str  # ISO; the new-booking range is date -> next_date
+    next_date: str
+    weekday: str
+    weekend: bool
+    today: bool
+    booking_id: Optional[int] = None
+    title: str = ""  # guest name shown on the first segment of a stay
+    tooltip: str = ""
+    color: str = ""
+    segment_start: bool = False
+    segment_end: bool = False
+
+
+def month_cells(year: int, month: int, bookings: Iterable, today: Optional[date] = None) -> list[DayCell]:
+    """
+    One DayCell per day of the month. `bookings` need id, guest_name, start_date, end_date
+    and status (ORM objects or rows); cancelled bookings are skipped and the first booking
+    wins a night if two overlap.
+    """
+    today = today or date.today()
+    first_wd, days = cal.monthrange(year, month)
+    first = date(year, month, 1)
+    occupied: list = [None] * days
+    for b in bookings:
+        if b.status == BookingStatus.CANCELLED:
+            continue
+        lo = max((b.start_date - first).days, 0)
+        hi = min((b.end_date - first).days, days)
+        for i in range(lo, hi):
+            if occupied[i] is None:
+                occupied[i] = b
+
+    cells = []
+    for i in range(days):
+        day = first + timedelta(days=i)
+        wd = (first_wd + i) % 7
+        base = dict(day=i + 1, date=day.isoformat(), next_date=(day + timedelta(days=1)).isoformat(),
+                    weekday=WEEKDAYS[wd], weekend=wd >= 5, today=day == today)
+        b = occupied[i]
+        if b is None:
+            cells.append(DayCell(**base))
+            continue
+        segment_start = i == 0 or occupied[i - 1] is not b
+        cells.append(DayCell(
+            **base,
+            booking_id=b.id,
+            title=b.guest_name if segment_start else "",
+            tooltip=f"{b.guest_name} — {b.start_date.isoformat()} → {b.end_date.isoformat()}",
+            color=STATUS_COLORS.get(b.status, DEFAULT_COLOR),
+            segment_start=segment_start,
+            segment_end=i == days - 1 or occupied[i + 1] is not b,
+        ))
+    return cells
+
+
+@dataclass(frozen=True)
+class Span:
+    start: int  # column offset from the window start
+    length: int  # nights
+    booking_id: Optional[int] = None  # None for free nights and OTA blocks
+    label: str = ""
+    tooltip: str = ""
+    color: str = ""
+    ota: bool = False
+
+    @property
+    def free(self) -> bool:
+        return not self.color
+
+
+@dataclass(frozen=True)
+class RoomTimeline:
+    room_id: int
+    name: str
+    spans: tuple[Span, ...]
+    ota_pending: bool = False  # the room's OTA feed was cold; blocks appear once it is fetched
+
+
+def timeline_days(start: date, days: int, today: Optional[date] = None) -> list[DayCell]:
+    """Header cells for a window of `days` nights from `start`."""
+    today = today or date.today()
+    out = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        out.append(DayCell(day=day.day, date=day.isoformat(), next_date=(day + timedelta(days=1)).isoformat(),
+                           weekday=WEEKDAYS[day.weekday()], weekend=day.weekday() >= 5, today=day == today))
+    return out
+
+
+def room_timeline(room_id: int, name: str, start: date, days: int, bookings: Iterable,
+                  ota_events: Optional[Iterable[dict]] = None) -> RoomTimeline:
+    """
+    Spans covering [start, start + days) for one room. `bookings` need id, guest_name,
+    start_date, end_date and status; `ota_events` are services.ical events (None when the
+    feed isn't cached yet). Where stays overlap, the one starting first keeps the nights.
+    """
+    intervals = []
+    for b in bookings:
+        if b.status == BookingStatus.CANCELLED:
+            continue
+        intervals.append(((b.start_date - start).days, (b.end_date - start).days, 0, b))
+    for ev in ota_events or ():
+        s, e = ev.get("start_date"), ev.get("end_date")
+        if s and e:
+            intervals.append(((s - start).days, (e - start).days, 1, ev))
+    intervals.sort(key=lambda item: (item[0], item[2]))
+
+    spans = []
+    cursor = 0
+    for lo, hi, is_ota, item in intervals:
+        lo, hi = max(lo, cursor), min(hi, days)
+        if lo >= hi:
+            continue
+        if lo > cursor:
+            spans.append(Span(start=cursor, length=lo - cursor))
+        if is_ota:
+            title = item.get("title") or "OTA"
+            spans.append(Span(start=lo, length=hi - lo, label=f"OTA: {title}", ota=True, color="bg-orange-300",
+                              tooltip=f"OTA: {title} — {item['start_date'].isoformat()} → {item['end_date'].isoformat()}"))
+        else:
+            spans.append(Span(start=lo, length=hi - lo, booking_id=item.id, label=item.guest_name,
+                              color=STATUS_COLORS.get(item.status, DEFAULT_COLOR),
+                              tooltip=f"{item.guest_name} — {item.start_date.isoformat()} → {item.end_date.isoformat()}"))
+        cursor = hi
+    if cursor < days:
+        spans.append(Span(start=cursor, length=days - cursor))
+    return RoomTimeline(room_id=room_id, name=name, spans=tuple(spans), ota_pending=ota_events is None)
+
+
+if __name__ == "__main__":
+    # Old template (scan every booking in every cell) vs cell map, for increasingly dense months
+    import time
+    from types import SimpleNamespace
+
+    from jinja2 import Environment
+
+    old_cells = Environment().from_string("""
+  {% set month_str = "%02d"|format(month) %}
+  {% set first_day_str = (year|string) + '-' + month_str + '-' + '01' %}
+    {% for d in range(1, days+1) %}
+      {% set d_str = "%02d"|format(d) %}
+      {% set next_d_str = "%02d"|format(d+1 if d < days else d) %}
+      {% set day_str = (year|string) + '-' + month_str + '-' + d_str %}
+      {% set next_day_str = (year|string) + '-' + month_str + '-' + next_d_str %}
+      {% set cell = namespace(has_booking=False) %}
+      {% for b in bookings %}
+        {% if day_str >= b.start_date.isoformat() and day_str < b.end_date.isoformat() %}
+          {% set cell.has_booking = True %}
+          {% set is_start_segment = (day_str == b.start_date.isoformat()) or (day_str == first_day_str and b.start_date.isoformat() < first_day_str) %}
+          {% set is_end_segment = (next_day_str >= b.end_date.isoformat()) or (d == days) %}
+          <div>{{ b.id }} {{ b.guest_name if is_start_segment }} {{ is_end_segment }}</div>
+        {% endif %}
+      {% endfor %}
+      {% if not cell.has_booking %}<div>{{ day_str }}</div>{% endif %}
+    {% endfor %}""")
+    new_cells = Environment().from_string("""
+    {% for c in cells %}
+      {% if c.booking_id %}<div>{{ c.booking_id }} {{ c.title }} {{ c.segment_end }}</div>{% else %}<div>{{ c.date }}</div>{% endif %}
+    {% endfor %}""")
+
+    year, month = 2025, 1
+    first = date(year, month, 1)
+    # One-night stays every night, plus cancelled/rebooked history overlapping the month
+    for history in (0, 100, 500):
+        bookings = [SimpleNamespace(id=d + 1, guest_name=f"Guest {d}", start_date=first + timedelta(days=d),
+                                    end_date=first + timedelta(days=d + 1), status=BookingStatus.CONFIRMED) for d in range(31)]
+        bookings += [SimpleNamespace(id=1000 + k, guest_name=f"Old {k}", start_date=first + timedelta(days=k % 31),
+                                     end_date=first + timedelta(days=k % 31 + 2), status=BookingStatus.CANCELLED) for k in range(history)]
+        results = []
+        for label, fn in (("per-cell scan", lambda: old_cells.render(year=year, month=month, days=31, bookings=bookings)),
+                          ("cell map", lambda: new_cells.render(cells=month_cells(year, month, bookings)))):
+            runs = []
+            for _ in range(20):
+                started = time.perf_counter()
+                fn()
+                runs.append((time.perf_counter() - started) * 1000)
+            results.append(f"{label} {min(runs):7.2f} ms")
+        print(f"{len(bookings):4d} bookings in month: " + "   ".join(results))
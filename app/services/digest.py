@@ -0,0 +1,106 @@
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Booking, BookingStatus, Homestay, OutboundEmail, Room, User
+from ..templating import templates
+
+logger = logging.getLogger(__name__)
+
+
+def digest_key(day: date, user_id: int) -> str:
+    return f"daily-digest:{day.isoformat()}:{user_id}"
+
+
+def queue_daily_digests(db: Session, day: Optional[date] = None) -> int:
+    """
+    Queue one check-in/check-out digest per owner/staff member for `day` (default tomorrow),
+    so a morning run warns about the next day's guests.
+
+    Works set-wise regardless of the number of properties: one query for the day's arrivals
+    and departures, one for everyone who should hear about them, one for digests already
+    queued. Safe to re-run: each recipient gets at most one digest per day (outbox dedupe key).
+    Returns the number of digests queued.
+    """
+    day = day or date.today() + timedelta(days=1)
+    rows = (
+        db.query(
+            Booking.homestay_id, Homestay.name, Room.name, Booking.guest_name,
+            Booking.guest_contact, Booking.start_date, Booking.end_date,
+        )
+        .join(Room, Room.id == Booking.room_id)
+        .join(Homestay, Homestay.id == Booking.homestay_id)
+        .filter(
+            or_(Booking.start_date == day, Booking.end_date == day),
+            Booking.status != BookingStatus.CANCELLED,
+        )
+        .order_by(Homestay.name, Room.name)
+        .all()
+    )
+    if not rows:
+        return 0
+
+    properties: dict[int, dict] = {}
+    for homestay_id, homestay_name, room_name, guest_name, guest_contact, start_date, end_date in rows:
+        prop = properties.setdefault(homestay_id, {"name": homestay_name, "arrivals": [], "departures": []})
+        entry = {"room_name": room_name, "guest_name": guest_name, "guest_contact": guest_contact, "end_date": end_date}
+        if start_date == day:
+            prop["arrivals"].append(entry)
+        if end_date == day:
+            prop["departures"].append(entry)
+
+    # Owners and staff of every affected property, in one query
+    recipients = (
+        db.query(User.id, User.email, Homestay.id)
+        .join(Homestay, or_(Homestay.owner_id == User.id, Homestay.id == User.homestay_id))
+        .filter(Homestay.id.in_(list(properties)), User.is_verified == True)
+        .all()
+    )
+    homestays_by_user: dict[int, set[int]] = defaultdict(set)
+    emails: dict[int, str] = {}
+    for user_id, email, homestay_id in recipients:
+        homestays_by_user[user_id].add(homestay_id)
+        emails[user_id] = email
+
+    keys = {user_id: digest_key(day, user_id) for user_id in homestays_by_user}
+    already = {
+        row[0]
+        for row in db.query(OutboundEmail.dedupe_key).filter(OutboundEmail.dedupe_key.in_(list(keys.values())))
+    }
+
+    template = templates.get_template("emails/daily_digest.html")
+    subject = f"Tomorrow's check-ins and check-outs ({day.strftime('%d %b')})"
+    messages = []
+    for user_id, homestay_ids in homestays_by_user.items():
+        if keys[user_id] in already:
+            continue
+        html = template.render({
+            "day": day,
+            "properties": sorted((properties[h] for h in homestay_ids), key=lambda p: p["name"]),
+            "app_url": f"{settings.BASE_URL}/app",
+            "current_year": day.year,
+        })
+        messages.append(OutboundEmail(kind="daily_digest", to_address=emails[user_id], subject=subject, html=html, dedupe_key=keys[user_id]))
+    db.add_all(messages)
+    db.commit()
+    logger.info("Queued %d daily digests for %s (%d properties)", len(messages), day, len(properties))
+    return len(messages)
+
+
+if __name__ == "__main__":
+    # Run once a day from cron, e.g. 07:00, for tomorrow's stays: python -m app.services.digest [YYYY-MM-DD]
+    import sys
+    from ..db import SessionLocal
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    target = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    session = SessionLocal()
+    try:
+        queue_daily_digests(session, target)
+    finally:
+        session.close()
@@ -1,11 +1,19 @@
+import threading
 import time
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, date
-from typing import List, Dict, Optional, Tuple
+from typing import Iterable, List, Dict, Optional, Tuple
+
+from ..config import settings
 
 # Very small in-memory cache: url -> (fetched_at_epoch, events)
 _cache: dict[str, Tuple[float, list[dict]]] = {}
 _CACHE_TTL_SECONDS = 15 * 60  # 15 minutes
+# Background refreshes for views that only read the warm cache (see refresh_ota_feeds)
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refreshing: set[str] = set()
+_refresh_lock = threading.Lock()
 
 
 def _parse_ics_datetime(val: str) -> datetime:
@@ -137,3 +145,46 @@ def overlaps_ota(events: List[Dict], start: date, end: date) -> bool:
         if s < end and e > start:
             return True
     return False
+
+
+def cached_ota_events(url: Optional[str]) -> Optional[List[Dict]]:
+    """Events for url if the cache is still fresh, else None; never touches the network."""
+    if not url:
+        return []
+    cached = _cache.get(url)
+    if cached and (time.time() - cached[0] < _CACHE_TTL_SECONDS):
+        return cached[1]
+    return None
+
+
+def _refresh(url: str) -> None:
+    try:
+        fetch_ota_events(url)
+    finally:
+        with _refresh_lock:
+            _refreshing.discard(url)
+
+
+def refresh_ota_feeds(urls: Iterable[Optional[str]]) -> int:
+    """Fetch cold or expired feeds in the background so the next read is warm. Returns feeds queued."""
+    global _refresh_executor
+    queued = 0
+    with _refresh_lock:
+        for url in urls:
+            if not url or url in _refreshing or cached_ota_events(url) is not None:
+                continue
+            if _refresh_executor is None:
+                _refresh_executor = ThreadPoolExecutor(max_workers=settings.OTA_REFRESH_WORKERS, thread_name_prefix="ota-refresh")
+            _refreshing.add(url)
+            _refresh_executor.submit(_refresh, url)
+            queued += 1
+    return queued
+
+
+def shutdown_ota_refresh() -> None:
+    global _refresh_executor
+    with _refresh_lock:
+        if _refresh_executor is not None:
+            _refresh_executor.shutdown(wait=False, cancel_futures=True)
+            _refresh_executor = None
+        _refreshing.clear()
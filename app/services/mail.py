@@ -1,127 +1,67 @@
 import logging
 import datetime
-import requests
-from fastapi.templating import Jinja2Templates
+from typing import Optional
+from sqlalchemy.orm import Session
 from ..config import settings
+from ..models import OutboundEmail
+from ..templating import templates
 
 logger = logging.getLogger(__name__)
 
-# Initialize Jinja2 templates
-templates = Jinja2Templates(directory="app/templates")
+# Emails are rendered here and written to the email_outbox table in the caller's transaction;
+# app.services.mail_worker delivers them (with retries) once that transaction commits.
+
+
+def queue_email(db: Session, kind: str, to: str, subject: str, html: str, from_name: str = "GoStayPro", dedupe_key: Optional[str] = None) -> Optional[OutboundEmail]:
+    """
+    Add a message to the outbox; it is sent only if the caller's transaction commits.
+    With a dedupe_key, a message already queued under the same key is not queued again (returns None).
+    """
+    if dedupe_key and db.query(OutboundEmail.id).filter(OutboundEmail.dedupe_key == dedupe_key).first():
+        return None
+    message = OutboundEmail(kind=kind, to_address=to, from_name=from_name, subject=subject, html=html, dedupe_key=dedupe_key)
+    db.add(message)
+    return message
 
-def send_verification_email(email: str, token: str):
-    """Sends a verification email to a new user using the Mailgun API."""
-    if not settings.MAILGUN_API_KEY or not settings.MAILGUN_DOMAIN:
-        logger.warning("Mailgun API key or domain not configured. Skipping email.")
-        return
 
+def send_verification_email(db: Session, email: str, token: str):
+    """Queues a verification email to a new user."""
     verification_url = f"{settings.BASE_URL}/auth/verify?token={token}"
-    
+
     template_body = templates.get_template("emails/verification.html").render({
         "verification_url": verification_url,
         "current_year": datetime.datetime.now().year
     })
+    queue_email(db, "verification", email, "Verify Your Email Address for GoStayPro", template_body)
 
-    mailgun_url = f"https://api.mailgun.net/v3/{settings.MAILGUN_DOMAIN}/messages"
-    auth = ("api", settings.MAILGUN_API_KEY)
-    data = {
-        "from": f"GoStayPro <{settings.MAIL_FROM}>",
-        "to": [email],
-        "subject": "Verify Your Email Address for GoStayPro",
-        "html": template_body,
-    }
-
-    try:
-        response = requests.post(mailgun_url, auth=auth, data=data, timeout=10)
-        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-        logger.info(f"Verification email sent to {email} via Mailgun.")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to send verification email to {email} via Mailgun: {e}")
-
-def send_invitation_email(email: str, token: str):
-    """Sends an invitation email to a new staff member using the Mailgun API."""
-    if not settings.MAILGUN_API_KEY or not settings.MAILGUN_DOMAIN:
-        logger.warning("Mailgun API key or domain not configured. Skipping email.")
-        return
-
+def send_invitation_email(db: Session, email: str, token: str):
+    """Queues an invitation email to a new staff member."""
     invitation_url = f"{settings.BASE_URL}/auth/accept-invitation?token={token}"
-    
+
     template_body = templates.get_template("emails/invitation.html").render({
         "invitation_url": invitation_url,
         "current_year": datetime.datetime.now().year
     })
+    queue_email(db, "invitation", email, "You're invited to join a property on GoStayPro", template_body)
 
-    mailgun_url = f"https://api.mailgun.net/v3/{settings.MAILGUN_DOMAIN}/messages"
-    auth = ("api", settings.MAILGUN_API_KEY)
-    data = {
-        "from": f"GoStayPro <{settings.MAIL_FROM}>",
-        "to": [email],
-        "subject": "You're invited to join a property on GoStayPro",
-        "html": template_body,
-    }
-
-    try:
-        response = requests.post(mailgun_url, auth=auth, data=data, timeout=10)
-        response.raise_for_status()
-        logger.info(f"Invitation email sent to {email} via Mailgun.")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to send invitation email to {email} via Mailgun: {e}")
-
-def send_password_reset_email(email: str, token: str):
-    """Sends a password reset email to a user using the Mailgun API."""
-    if not settings.MAILGUN_API_KEY or not settings.MAILGUN_DOMAIN:
-        logger.warning("Mailgun API key or domain not configured. Skipping email.")
-        return
-
+def send_password_reset_email(db: Session, email: str, token: str):
+    """Queues a password reset email to a user."""
     reset_url = f"{settings.BASE_URL}/auth/reset-password?token={token}"
-    
+
     template_body = templates.get_template("emails/password_reset.html").render({
         "reset_url": reset_url,
         "current_year": datetime.datetime.now().year
     })
+    queue_email(db, "password_reset", email, "Reset Your GoStayPro Password", template_body)
 
-    mailgun_url = f"https://api.mailgun.net/v3/{settings.MAILGUN_DOMAIN}/messages"
-    auth = ("api", settings.MAILGUN_API_KEY)
-    data = {
-        "from": f"GoStayPro <{settings.MAIL_FROM}>",
-        "to": [email],
-        "subject": "Reset Your GoStayPro Password",
-        "html": template_body,
-    }
-
-    try:
-        response = requests.post(mailgun_url, auth=auth, data=data, timeout=10)
-        response.raise_for_status()
-        logger.info(f"Password reset email sent to {email} via Mailgun.")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to send password reset email to {email} via Mailgun: {e}")
-
-def send_new_user_admin_notification(new_user_email: str):
-    """Sends a notification to the admin email address about a new user sign-up."""
+def send_new_user_admin_notification(db: Session, new_user_email: str):
+    """Queues a notification to the admin email address about a new user sign-up."""
     if not settings.ADMIN_NOTIFICATION_EMAIL:
         return
-    if not settings.MAILGUN_API_KEY or not settings.MAILGUN_DOMAIN:
-        logger.warning("Mailgun API key or domain not configured. Skipping admin notification.")
-        return
 
     template_body = templates.get_template("emails/admin_new_user_notification.html").render({
         "email": new_user_email,
         "registration_time": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
         "current_year": datetime.datetime.now().year
     })
-
-    mailgun_url = f"https://api.mailgun.net/v3/{settings.MAILGUN_DOMAIN}/messages"
-    auth = ("api", settings.MAILGUN_API_KEY)
-    data = {
-        "from": f"GoStayPro Admin <{settings.MAIL_FROM}>",
-        "to": [settings.ADMIN_NOTIFICATION_EMAIL],
-        "subject": "[GoStayPro] New User Sign-up",
-        "html": template_body,
-    }
-
-    try:
-        response = requests.post(mailgun_url, auth=auth, data=data, timeout=10)
-        response.raise_for_status()
-        logger.info(f"Admin notification sent for new user: {new_user_email}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to send admin notification for new user {new_user_email}: {e}")
+    queue_email(db, "admin_new_user", settings.ADMIN_NOTIFICATION_EMAIL, "[GoStayPro] New User Sign-up", template_body, from_name="GoStayPro Admin")
@@ -0,0 +1,220 @@
+"""
+Delivers queued messages from the email_outbox table.
+
+Run it as its own process (docker-compose `mailer` service):
+
+    python -m app.services.mail_worker
+
+or let the web app run it on a background thread (MAIL_WORKER_IN_PROCESS=true, the default,
+for single-container deployments). Several workers can run at once, on any database: each
+message is claimed with a conditional UPDATE (pending -> sending) whose rowcount tells the
+winner, so two processes never send the same row. A claim is a lease; a message left in
+"sending" by a worker that died is picked up again once the lease expires. The lease covers
+the whole batch at the configured send rate and HTTP timeout, so a slow provider can't let a
+row expire while it is still queued behind the others. On Postgres the candidate rows are
+also selected with FOR UPDATE SKIP LOCKED to keep workers apart.
+
+With MAIL_BACKEND=mailgun but no API key or domain the worker doesn't start, and queued
+messages stay pending until it is configured.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import requests
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import OutboundEmail, OutboxStatus
+
+logger = logging.getLogger(__name__)
+
+_MAX_BACKOFF = timedelta(hours=1)
+# Per-request HTTP timeout for the provider
+_SEND_TIMEOUT_SECONDS = 10
+# Slack on top of the batch's worst-case send time before a claim can be taken over
+_CLAIM_LEASE_MARGIN = timedelta(minutes=5)
+_CLAIMABLE = (OutboxStatus.PENDING, OutboxStatus.SENDING)
+
+
+class MailgunTransport:
+    """Sends through the Mailgun HTTP API over one pooled keep-alive session."""
+
+    def __init__(self, api_key: str, domain: str) -> None:
+        self.url = f"https://api.mailgun.net/v3/{domain}/messages"
+        self.session = requests.Session()
+        self.session.auth = ("api", api_key)
+
+    def send(self, message: OutboundEmail) -> None:
+        response = self.session.post(
+            self.url,
+            data={
+                "from": f"{message.from_name} <{settings.MAIL_FROM}>",
+                "to": [message.to_address],
+                "subject": message.subject,
+                "html": message.html,
+            },
+            timeout=_SEND_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+
+
+class ConsoleTransport:
+    """
+    Local stand-in: logs messages instead of sending them (MAIL_BACKEND=console, tests, dev).
+    Pass keep_sent=True in tests to collect the messages in `sent`.
+    """
+
+    def __init__(self, keep_sent: bool = False) -> None:
+        self.sent: Optional[list[OutboundEmail]] = [] if keep_sent else None
+
+    def send(self, message: OutboundEmail) -> None:
+        if self.sent is not None:
+            self.sent.append(message)
+        logger.info("[console mail] to=%s subject=%r (%d bytes)", message.to_address, message.subject, len(message.html))
+
+
+def get_transport():
+    """The configured transport, or None when Mailgun is selected but not configured."""
+    if settings.MAIL_BACKEND != "mailgun":
+        return ConsoleTransport()
+    if settings.MAILGUN_API_KEY and settings.MAILGUN_DOMAIN:
+        return MailgunTransport(settings.MAILGUN_API_KEY, settings.MAILGUN_DOMAIN)
+    logger.warning("Mailgun API key or domain not configured. Queued emails stay pending until it is.")
+    return None
+
+
+def _send_interval() -> float:
+    return 1.0 / settings.MAIL_SEND_RATE_PER_SECOND if settings.MAIL_SEND_RATE_PER_SECOND > 0 else 0.0
+
+
+def _claim_lease(batch_size: int) -> timedelta:
+    """Worst case for sending a whole batch: every message waits its rate slot and times out."""
+    return timedelta(seconds=batch_size * (_send_interval() + _SEND_TIMEOUT_SECONDS)) + _CLAIM_LEASE_MARGIN
+
+
+def _backoff(attempts: int) -> timedelta:
+    return min(timedelta(seconds=30 * 2 ** (attempts - 1)), _MAX_BACKOFF)
+
+
+def claim_batch(db: Session, batch_size: int) -> list[OutboundEmail]:
+    """
+    Claim up to batch_size due messages for this worker and commit the claims. Each row is
+    taken with UPDATE ... WHERE id = ? AND status IN (pending, sending) AND next_attempt_at <= now;
+    a rowcount of 0 means another worker got it first.
+    """
+    now = datetime.utcnow()
+    lease_until = now + _claim_lease(batch_size)
+    q = (
+        db.query(OutboundEmail.id)
+        .filter(OutboundEmail.status.in_(_CLAIMABLE), OutboundEmail.next_attempt_at <= now)
+        .order_by(OutboundEmail.next_attempt_at, OutboundEmail.id)
+        .limit(batch_size)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        q = q.with_for_update(skip_locked=True)
+    table = OutboundEmail.__table__
+    claimed = []
+    for (message_id,) in q.all():
+        result = db.execute(
+            update(table)
+            .where(table.c.id == message_id, table.c.status.in_(_CLAIMABLE), table.c.next_attempt_at <= now)
+            .values(status=OutboxStatus.SENDING, next_attempt_at=lease_until)
+        )
+        if result.rowcount == 1:
+            claimed.append(message_id)
+    db.commit()
+    if not claimed:
+        return []
+    return db.query(OutboundEmail).filter(OutboundEmail.id.in_(claimed)).order_by(OutboundEmail.id).all()
+
+
+def deliver_pending(db: Session, transport, batch_size: Optional[int] = None) -> int:
+    """
+    Claim and send one batch of due messages. Failures are retried with exponential backoff
+    until MAIL_OUTBOX_MAX_ATTEMPTS, then marked failed. Returns the number of messages sent.
+    """
+    batch_size = batch_size or settings.MAIL_OUTBOX_BATCH_SIZE
+    batch = claim_batch(db, batch_size)
+    interval = _send_interval()
+    sent = 0
+    for message in batch:
+        started = time.monotonic()
+        message.attempts += 1
+        try:
+            transport.send(message)
+        except Exception as exc:
+            message.last_error = str(exc)[:2000]
+            if message.attempts >= settings.MAIL_OUTBOX_MAX_ATTEMPTS:
+                message.status = OutboxStatus.FAILED
+                logger.error("Giving up on %s email to %s after %d attempts: %s", message.kind, message.to_address, message.attempts, exc)
+            else:
+                message.status = OutboxStatus.PENDING
+                message.next_attempt_at = datetime.utcnow() + _backoff(message.attempts)
+                logger.warning("Failed to send %s email to %s (attempt %d): %s", message.kind, message.to_address, message.attempts, exc)
+        else:
+            message.status = OutboxStatus.SENT
+            message.sent_at = datetime.utcnow()
+            message.last_error = None
+            sent += 1
+        # Record each outcome at once, so a crash mid-batch can only resend the message in flight
+        db.commit()
+        # Stay under the provider's send rate
+        remaining = interval - (time.monotonic() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+    return sent
+
+
+def run_worker(stop: Optional[threading.Event] = None) -> None:
+    """Poll the outbox until `stop` is set, draining full batches back to back."""
+    from ..db import SessionLocal
+
+    stop = stop or threading.Event()
+    transport = get_transport()
+    if transport is None:
+        return
+    logger.info("Mail worker started (%s)", type(transport).__name__)
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            sent = deliver_pending(db, transport)
+        except Exception:
+            db.rollback()
+            logger.exception("Mail worker batch failed")
+            sent = 0
+        finally:
+            db.close()
+        if sent < settings.MAIL_OUTBOX_BATCH_SIZE:
+            stop.wait(settings.MAIL_OUTBOX_POLL_SECONDS)
+
+
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def start_background_worker() -> None:
+    """Run the worker on a daemon thread inside the web process."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=run_worker, args=(_stop,), name="mail-worker", daemon=True)
+    _thread.start()
+
+
+def stop_background_worker() -> None:
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    try:
+        run_worker()
+    except KeyboardInterrupt:
+        pass
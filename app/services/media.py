@@ -1,8 +1,28 @@
+import hashlib
+import io
+import logging
+import multiprocessing
 import os
-import uuid
-from typing import Optional
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import BinaryIO, Optional
+from urllib.parse import unquote, urlparse
+
+from fastapi import UploadFile
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from ..config import settings
+from ..models import ArchivedBooking, Booking, Homestay, MediaAsset, Room, bump_content_version
+
+logger = logging.getLogger(__name__)
 
 
 def _sniff_image_type(data: bytes) -> str | None:
@@ -24,75 +44,533 @@ def _sniff_image_type(data: bytes) -> str | None:
 # Cloudinary is optional; import lazily
 try:
     import cloudinary
+    import cloudinary.api
     import cloudinary.uploader
 except Exception:  # pragma: no cover - optional dependency
     cloudinary = None  # type: ignore
 
+# Pillow is optional too; without it local uploads are served at original size only
+try:
+    from PIL import Image, ImageOps
+except Exception:  # pragma: no cover - optional dependency
+    Image = None  # type: ignore
+
+
+_cloudinary_ready: Optional[bool] = None
+
 
-def _ensure_cloudinary_configured() -> bool:
+def configure_cloudinary() -> bool:
     """
-    Configure cloudinary from CLOUDINARY_URL if available.
+    Configure cloudinary from CLOUDINARY_URL once (called at startup).
     Returns True if Cloudinary is configured and usable.
     """
+    global _cloudinary_ready
     url = getattr(settings, "CLOUDINARY_URL", "") or os.getenv("CLOUDINARY_URL", "")
     if not url or cloudinary is None:
+        _cloudinary_ready = False
         return False
     try:
-        cloudinary.config(cloudinary_url=url)
-        return True
+        # cloudinary.config(cloudinary_url=...) stores the string without parsing it
+        parsed = urlparse(url)
+        if parsed.scheme != "cloudinary" or not parsed.hostname:
+            raise ValueError("expected cloudinary://<api_key>:<api_secret>@<cloud_name>")
+        cloudinary.config(
+            cloud_name=parsed.hostname,
+            api_key=unquote(parsed.username or ""),
+            api_secret=unquote(parsed.password or ""),
+            secure=True,
+        )
+        _cloudinary_ready = True
     except Exception:
-        return False
+        logger.exception("Invalid CLOUDINARY_URL; storing images locally")
+        _cloudinary_ready = False
+    return _cloudinary_ready
 
 
+def cloudinary_enabled() -> bool:
+    if _cloudinary_ready is None:
+        configure_cloudinary()
+    return bool(_cloudinary_ready)
 
-def save_image(file_bytes: bytes, original_filename: str | None = None, folder: str = "staycal") -> Optional[str]:
-    """Save image to Cloudinary if configured; otherwise fallback to local uploads.
 
-    Returns the public URL (secure) of the stored image, or None if input is not an image or exceeds size limit.
-    Enforces a maximum per-image upload size of 5 MB.
-    """
-    if not file_bytes:
-        return None
 
-    # Enforce size limit (from env via settings, default 5 MiB)
+class UploadTooLarge(Exception):
+    """The upload exceeded UPLOAD_IMAGE_MAX_BYTES; nothing was stored."""
+
+
+UPLOAD_DIR = "app/static/uploads"
+_CHUNK_SIZE = 64 * 1024
+
+
+def _upload_limit() -> int:
     try:
-        limit_bytes = int(getattr(settings, "UPLOAD_IMAGE_MAX_BYTES", 5 * 1024 * 1024))
+        return int(getattr(settings, "UPLOAD_IMAGE_MAX_BYTES", 5 * 1024 * 1024))
     except Exception:
-        limit_bytes = 5 * 1024 * 1024
-    if len(file_bytes) > limit_bytes:
+        return 5 * 1024 * 1024
+
+
+@dataclass
+class _Spooled:
+    path: str
+    kind: str
+    sha256: str
+    size: int
+
+
+def _spool_image(stream: BinaryIO, limit_bytes: int) -> Optional[_Spooled]:
+    """
+    Copy `stream` in chunks into a temp file next to the uploads directory, hashing as it goes.
+    The type is sniffed from the first bytes, so non-images stop after one chunk, and the copy
+    aborts as soon as it passes `limit_bytes`. Returns None for rejected uploads.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-", suffix=".part")
+    kind = None
+    total = 0
+    head = b""
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > limit_bytes:
+                    raise UploadTooLarge()
+                if kind is None:
+                    head += chunk
+                    if len(head) >= 12:
+                        kind = _sniff_image_type(head[:12])
+                        if not kind:
+                            raise ValueError("not an image")
+                digest.update(chunk)
+                out.write(chunk)
+        if kind is None:
+            kind = _sniff_image_type(head)
+        if not kind:
+            raise ValueError("not an image")
+        return _Spooled(tmp_path, kind, digest.hexdigest(), total)
+    except (UploadTooLarge, ValueError):
+        os.unlink(tmp_path)
         return None
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+# Responsive derivatives: name -> max width in px. Each gets a WebP twin ("<name>_webp").
+VARIANT_WIDTHS = {"thumb": 320, "medium": 1024}
+
+
+@dataclass
+class StoredImage:
+    """A stored upload: the original's URL plus derivative URLs keyed like VARIANT_WIDTHS."""
+    url: str
+    variants: dict[str, str] = field(default_factory=dict)
+    public_id: Optional[str] = None  # Cloudinary asset id, when stored there
 
-    # Basic validation using lightweight header sniffing (Python 3.13-safe)
-    kind = _sniff_image_type(file_bytes)
-    if not kind:
+
+def _cloudinary_variants(public_id: str) -> dict[str, str]:
+    """Derivatives as Cloudinary transformation URLs (rendered and cached by Cloudinary on first hit)."""
+    variants = {}
+    for name, width in VARIANT_WIDTHS.items():
+        image = cloudinary.CloudinaryImage(public_id)
+        variants[name] = image.build_url(secure=True, width=width, crop="limit", quality="auto")
+        variants[f"{name}_webp"] = image.build_url(secure=True, width=width, crop="limit", quality="auto", format="webp")
+    return variants
+
+
+def _render_variants(src_path: str) -> dict[str, str]:
+    """
+    Runs in a worker process: write downscaled copies of `src_path` next to it.
+    Returns {variant name: file name}. Images already narrower than a width are re-encoded, not upscaled.
+    """
+    directory, base = os.path.split(src_path)
+    stem = os.path.splitext(base)[0]
+    out: dict[str, str] = {}
+    with Image.open(src_path) as im:
+        im = ImageOps.exif_transpose(im)
+        has_alpha = im.mode in ("RGBA", "LA", "P") and (im.mode != "P" or "transparency" in im.info)
+        im = im.convert("RGBA" if has_alpha else "RGB")
+        for name, width in VARIANT_WIDTHS.items():
+            copy = im.copy()
+            copy.thumbnail((width, width * 4), Image.LANCZOS)
+            ext = "png" if has_alpha else "jpg"
+            fname = f"{stem}_{name}.{ext}"
+            if has_alpha:
+                copy.save(os.path.join(directory, fname), "PNG", optimize=True)
+            else:
+                copy.save(os.path.join(directory, fname), "JPEG", quality=82, optimize=True, progressive=True)
+            out[name] = fname
+            webp_name = f"{stem}_{name}.webp"
+            copy.save(os.path.join(directory, webp_name), "WEBP", quality=80, method=4)
+            out[f"{name}_webp"] = webp_name
+    return out
+
+
+_variant_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_variant_pool() -> ProcessPoolExecutor:
+    global _variant_pool
+    if _variant_pool is None:
+        # spawn, not fork: the web process has threads (mail worker, thread pools) that must not be forked
+        _variant_pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _variant_pool
+
+
+def shutdown_variant_pool() -> None:
+    global _variant_pool
+    if _variant_pool is not None:
+        _variant_pool.shutdown(wait=False, cancel_futures=True)
+        _variant_pool = None
+
+
+def local_variants(path: str) -> dict[str, str]:
+    """
+    Build derivatives for a file under UPLOAD_DIR in the process pool (CPU-heavy decoding and
+    resampling stays off the web workers). Returns {} if Pillow is missing or the image can't be read.
+    """
+    if Image is None or settings.IMAGE_VARIANT_WORKERS <= 0:
+        return {}
+    try:
+        names = _get_variant_pool().submit(_render_variants, path).result(timeout=settings.IMAGE_VARIANT_TIMEOUT_SECONDS)
+    except Exception as exc:
+        logger.warning("Could not build image variants for %s: %s", path, exc)
+        return {}
+    return {name: f"/static/uploads/{fname}" for name, fname in names.items()}
+
+
+def _upload_to_cloudinary(path: str, folder: str, public_id: str) -> Optional[StoredImage]:
+    try:
+        upload_res = cloudinary.uploader.upload(
+            path,
+            folder=folder,
+            public_id=public_id,
+            resource_type="image",
+            overwrite=True,
+        )
+    except Exception as exc:
+        logger.warning("Cloudinary upload failed: %s", exc)
+        return None
+    # Prefer secure_url
+    url = upload_res.get("secure_url") or upload_res.get("url")
+    if not url:
         return None
+    public_id = upload_res.get("public_id")
+    return StoredImage(url, _cloudinary_variants(public_id) if public_id else {}, public_id)
+
+
+def _find_asset(sha256: str) -> Optional[StoredImage]:
+    from ..db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        asset = db.query(MediaAsset).filter(MediaAsset.sha256 == sha256).first()
+        return StoredImage(asset.url, asset.variants or {}, asset.public_id) if asset else None
+    finally:
+        db.close()
+
+
+def _register_asset(spooled: _Spooled, stored: StoredImage) -> StoredImage:
+    """
+    Record a newly stored image under its content hash. If a concurrent upload of the same bytes
+    got there first, its asset wins (both wrote the same content-addressed file or public_id).
+    """
+    from ..db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        db.add(MediaAsset(sha256=spooled.sha256, url=stored.url, public_id=stored.public_id,
+                          variants=stored.variants or None, size_bytes=spooled.size))
+        db.commit()
+        return stored
+    except IntegrityError:
+        db.rollback()
+        asset = db.query(MediaAsset).filter(MediaAsset.sha256 == spooled.sha256).one()
+        return StoredImage(asset.url, asset.variants or {}, asset.public_id)
+    finally:
+        db.close()
+
+
+# Background Cloudinary uploads: a small dedicated pool, so slow uploads can't starve the
+# threadpool that sync endpoints run on, and a cap on queued uploads.
+_upload_executor: Optional[ThreadPoolExecutor] = None
+_upload_slots = threading.BoundedSemaphore(max(settings.MEDIA_UPLOAD_MAX_PENDING, 1))
+_upload_lock = threading.Lock()
+_SWAP_ATTEMPTS = 5
+
 
-    # Try Cloudinary first
-    if _ensure_cloudinary_configured():
+def _get_upload_executor() -> ThreadPoolExecutor:
+    global _upload_executor
+    with _upload_lock:
+        if _upload_executor is None:
+            _upload_executor = ThreadPoolExecutor(max_workers=settings.MEDIA_UPLOAD_WORKERS, thread_name_prefix="media-upload")
+        return _upload_executor
+
+
+def shutdown_upload_executor() -> None:
+    """Stop accepting uploads; queued ones are dropped and keep their (working) local placeholder."""
+    global _upload_executor
+    with _upload_lock:
+        if _upload_executor is not None:
+            _upload_executor.shutdown(wait=False, cancel_futures=True)
+            _upload_executor = None
+
+
+def _replace_url(db: Session, old_url: str, stored: StoredImage) -> int:
+    """Bulk-repoint rows from old_url to stored (reference counts move with the asset's url)."""
+    # Bulk updates fire no mapper events, so bump the public pages' content version here
+    bump_content_version(db, [
+        *(row[0] for row in db.query(Homestay.id).filter(Homestay.image_url == old_url)),
+        *(row[0] for row in db.query(Room.homestay_id).filter(Room.image_url == old_url).distinct()),
+    ])
+    updated = 0
+    for model in (Homestay, Room, Booking):
+        updated += (
+            db.query(model)
+            .filter(model.image_url == old_url)
+            .update({"image_url": stored.url, "image_variants": stored.variants or None}, synchronize_session=False)
+        )
+    return updated
+
+
+def _swap_placeholder(placeholder_url: str, stored: StoredImage) -> int:
+    """
+    Point the asset and every row still showing `placeholder_url` at the final image. Rows are
+    committed by the request that uploaded them, which may not have happened yet, so a miss is
+    retried briefly; the asset is only moved once some row has been. Returns rows updated.
+    """
+    from ..db import SessionLocal
+
+    for attempt in range(_SWAP_ATTEMPTS):
+        db = SessionLocal()
         try:
-            public_id = uuid.uuid4().hex
-            upload_res = cloudinary.uploader.upload(
-                file_bytes,
-                folder=folder,
-                public_id=public_id,
-                resource_type="image",
-                overwrite=True,
-            )
-            # Prefer secure_url
-            url = upload_res.get("secure_url") or upload_res.get("url")
-            if url:
-                return url
-        except Exception:
-            # fall back to local if cloudinary fails
-            pass
+            updated = _replace_url(db, placeholder_url, stored)
+            if updated:
+                db.query(MediaAsset).filter(MediaAsset.url == placeholder_url).update(
+                    {"url": stored.url, "public_id": stored.public_id, "variants": stored.variants or None,
+                     "updated_at": datetime.utcnow()},
+                    synchronize_session=False,
+                )
+            db.commit()
+        finally:
+            db.close()
+        if updated:
+            return updated
+        time.sleep(attempt + 1)
+    return 0
 
-    # Fallback: local file save in app/static/uploads
+
+def _finish_remote_upload(path: str, folder: str, public_id: str, placeholder_url: str) -> None:
+    """Runs on the upload pool: push the local placeholder to Cloudinary and swap the URL over."""
     try:
-        os.makedirs("app/static/uploads", exist_ok=True)
-        fname = f"{uuid.uuid4().hex}.{kind}"
-        fpath = os.path.join("app/static/uploads", fname)
-        with open(fpath, "wb") as f:
-            f.write(file_bytes)
-        return f"/static/uploads/{fname}"
+        stored = _upload_to_cloudinary(path, folder, public_id)
+        if stored is None:
+            # Keep serving the local copy for good, with local variants
+            local = StoredImage(placeholder_url, local_variants(path))
+            _swap_placeholder(placeholder_url, local)
+            return
+        if _swap_placeholder(placeholder_url, stored):
+            # Rows that picked up the placeholder while the swap ran (e.g. a duplicate upload)
+            time.sleep(1)
+            from ..db import SessionLocal
+            db = SessionLocal()
+            try:
+                _replace_url(db, placeholder_url, stored)
+                db.commit()
+            finally:
+                db.close()
+            os.unlink(path)
+        else:
+            # Nothing ever referenced the placeholder: keep the asset local and unreferenced for collect_orphans
+            logger.info("Placeholder %s not referenced; discarding %s", placeholder_url, stored.public_id)
+            cloudinary.uploader.destroy(stored.public_id)
     except Exception:
+        logger.exception("Background upload of %s failed", placeholder_url)
+    finally:
+        _upload_slots.release()
+
+
+def save_image_stream(stream: BinaryIO, original_filename: str | None = None, folder: str = "staycal", defer_remote: bool = False) -> Optional[StoredImage]:
+    """Save an image read from a file-like object to Cloudinary if configured; otherwise to local uploads.
+
+    The stream is copied in chunks (never held in memory whole) and rejected as soon as it
+    exceeds UPLOAD_IMAGE_MAX_BYTES or its first bytes are not a known image type.
+    Storage is content-addressed: bytes already in media_assets resolve to the existing image
+    without storing or uploading anything.
+    With `defer_remote`, the Cloudinary upload happens in the background: the local copy's URL
+    is returned as a placeholder and swapped on the row once the upload completes.
+    Returns the stored image (secure URL plus thumbnail/medium/WebP variants), or None if rejected.
+    """
+    try:
+        spooled = _spool_image(stream, _upload_limit())
+    except OSError:
         return None
+    if spooled is None:
+        return None
+
+    try:
+        existing = _find_asset(spooled.sha256)
+        if existing:
+            return existing
+
+        remote = cloudinary_enabled()
+        if remote and not defer_remote:
+            stored = _upload_to_cloudinary(spooled.path, folder, spooled.sha256)
+            if stored:
+                return _register_asset(spooled, stored)
+            # fall back to local if cloudinary fails
+            remote = False
+
+        # Local file in app/static/uploads, named by content hash (rename of the fully written temp file)
+        try:
+            fname = f"{spooled.sha256}.{spooled.kind}"
+            path = os.path.join(UPLOAD_DIR, fname)
+            os.replace(spooled.path, path)
+            os.chmod(path, 0o644)  # mkstemp creates 0600; static files must be world-readable
+        except Exception:
+            return None
+        url = f"/static/uploads/{fname}"
+        if remote and _upload_slots.acquire(blocking=False):
+            stored = _register_asset(spooled, StoredImage(url))
+            if stored.url != url:
+                _upload_slots.release()
+                return stored
+            try:
+                _get_upload_executor().submit(_finish_remote_upload, path, folder, spooled.sha256, url)
+                return stored
+            except RuntimeError:  # shutting down: the image simply stays local
+                _upload_slots.release()
+                return stored
+        return _register_asset(spooled, StoredImage(url, local_variants(path)))
+    finally:
+        if os.path.exists(spooled.path):
+            os.unlink(spooled.path)
+
+
+def save_image(file_bytes: bytes, original_filename: str | None = None, folder: str = "staycal") -> Optional[StoredImage]:
+    """Save in-memory image bytes; see save_image_stream."""
+    if not file_bytes:
+        return None
+    return save_image_stream(io.BytesIO(file_bytes), original_filename, folder)
+
+
+async def save_upload(upload: UploadFile, folder: str = "staycal") -> Optional[StoredImage]:
+    """
+    Store an uploaded image without reading it into memory, off the event loop.
+    Starlette has already spooled the part to a temp file; it is copied from there in chunks.
+    With MEDIA_UPLOAD_ASYNC, Cloudinary uploads finish in the background (see save_image_stream).
+    """
+    if not upload or not upload.filename:
+        return None
+    await upload.seek(0)
+    return await run_in_threadpool(save_image_stream, upload.file, upload.filename, folder, settings.MEDIA_UPLOAD_ASYNC)
+
+
+def assign_image(obj, stored: Optional[StoredImage]) -> None:
+    """Point a Room/Homestay/Booking at a stored image; a rejected upload (None) leaves it unchanged."""
+    if stored is None:
+        return
+    obj.image_url = stored.url
+    obj.image_variants = stored.variants or None
+
+
+def _delete_stored(assets: list[MediaAsset]) -> list[MediaAsset]:
+    """Remove the files/Cloudinary assets behind `assets`; returns those actually removed."""
+    removed = []
+    public_ids = [a.public_id for a in assets if a.public_id]
+    if public_ids:
+        if not cloudinary_enabled():
+            logger.warning("Cloudinary not configured; keeping %d remote orphans", len(public_ids))
+            public_ids = []
+        for start in range(0, len(public_ids), 100):  # Admin API limit per call
+            cloudinary.api.delete_resources(public_ids[start:start + 100])
+    for asset in assets:
+        if asset.public_id:
+            if public_ids:
+                removed.append(asset)
+            continue
+        for url in [asset.url, *(asset.variants or {}).values()]:
+            if url.startswith("/static/uploads/"):
+                try:
+                    os.unlink(os.path.join(UPLOAD_DIR, os.path.basename(url)))
+                except FileNotFoundError:
+                    pass
+        removed.append(asset)
+    return removed
+
+
+def collect_orphans(db: Session, batch_size: Optional[int] = None) -> int:
+    """
+    Delete media assets nothing has referenced for MEDIA_GC_GRACE_HOURS, a batch at a time.
+    Each batch is re-checked against homestays, rooms, bookings and the bookings archive first
+    (one query per table); assets still in use get their ref_count repaired instead.
+    Returns the number of assets removed.
+    """
+    batch_size = batch_size or settings.MEDIA_GC_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(hours=settings.MEDIA_GC_GRACE_HOURS)
+    total = 0
+    last_id = 0
+    while True:
+        batch = (
+            db.query(MediaAsset)
+            .filter(MediaAsset.ref_count <= 0, MediaAsset.updated_at < cutoff, MediaAsset.id > last_id)
+            .order_by(MediaAsset.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        urls = [a.url for a in batch]
+        in_use: Counter[str] = Counter()
+        for model in (Homestay, Room, Booking, ArchivedBooking):
+            for url, count in db.query(model.image_url, func.count()).filter(model.image_url.in_(urls)).group_by(model.image_url):
+                in_use[url] += count
+        orphans = []
+        for asset in batch:
+            if in_use[asset.url]:
+                asset.ref_count = in_use[asset.url]
+            else:
+                orphans.append(asset)
+        for asset in _delete_stored(orphans):
+            db.delete(asset)
+            total += 1
+        db.commit()
+        if len(batch) < batch_size:
+            break
+    logger.info("Removed %d orphaned media assets", total)
+    return total
+
+
+if __name__ == "__main__":
+    # python -m app.services.media gc        remove unreferenced images (run daily from cron)
+    # python -m app.services.media backfill  build variants for images uploaded before derivatives existed
+    import sys
+    from ..db import SessionLocal
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    command = sys.argv[1] if len(sys.argv) > 1 else "gc"
+    session = SessionLocal()
+    try:
+        if command == "gc":
+            collect_orphans(session)
+        elif command == "backfill":
+            for model in (Homestay, Room, Booking):
+                rows = session.query(model).filter(model.image_url.like("/static/uploads/%"), model.image_variants.is_(None)).all()
+                for row in rows:
+                    variants = local_variants(os.path.join(UPLOAD_DIR, os.path.basename(row.image_url)))
+                    if variants:
+                        row.image_variants = variants
+                session.commit()
+                logger.info("%s: built variants for %d images", model.__tablename__, len(rows))
+        else:
+            sys.exit(f"unknown command {command!r}; expected gc or backfill")
+    finally:
+        session.close()
+        shutdown_variant_pool()
@@ -0,0 +1,83 @@
+"""
+Cached catalog of active plans.
+
+Plans change a few times a year, yet the landing page and GET /api/v1/plans read them on
+every hit. `plan_catalog.active(db)` returns immutable snapshots cached per worker for
+PLAN_CACHE_SECONDS; any flush that writes a Plan (admin save/delete) drops the cache
+in this process, and other workers pick the change up within the TTL.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import Plan
+
+
+@dataclass(frozen=True)
+class PlanInfo:
+    id: int
+    name: str
+    price_monthly: float
+    price_yearly: float
+    room_limit: int
+    user_limit: int
+
+
+class PlanCatalog:
+    """Thread-safe TTL cache of the active plans, cheapest first."""
+
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._entry: Optional[tuple[float, tuple[PlanInfo, ...]]] = None
+        self._lock = threading.Lock()
+
+    def active(self, db: Session) -> tuple[PlanInfo, ...]:
+        entry = self._entry
+        if entry is not None and entry[0] >= time.monotonic():
+            return entry[1]
+        rows = (
+            db.query(Plan.id, Plan.name, Plan.price_monthly, Plan.price_yearly, Plan.room_limit, Plan.user_limit)
+            .filter(Plan.is_active == True)
+            .order_by(Plan.price_monthly.asc())
+            .all()
+        )
+        plans = tuple(
+            PlanInfo(id=r[0], name=r[1], price_monthly=float(r[2]), price_yearly=float(r[3]), room_limit=r[4], user_limit=r[5])
+            for r in rows
+        )
+        if self.ttl_seconds > 0:
+            with self._lock:
+                self._entry = (time.monotonic() + self.ttl_seconds, plans)
+        return plans
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entry = None
+
+
+plan_catalog = PlanCatalog(settings.PLAN_CACHE_SECONDS)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _invalidate_on_flush(session, flush_context):
+    if any(isinstance(obj, Plan) for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+        plan_catalog.invalidate()
+        session.info["plans_changed"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_on_commit(session):
+    # A concurrent request may have re-cached the pre-commit rows between flush and commit
+    if session.info.pop("plans_changed", None):
+        plan_catalog.invalidate()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("plans_changed", None)
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# One pooled client for the whole process so verifications reuse TLS connections to Google.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.RECAPTCHA_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _on_failure(reason: str) -> tuple[bool, dict]:
+    """Outcome when Google can't be reached in time: RECAPTCHA_FAIL_OPEN (or DEBUG) lets the request through."""
+    fail_open = settings.RECAPTCHA_FAIL_OPEN or settings.DEBUG
+    logger.warning("reCAPTCHA verification unavailable (%s); failing %s", reason, "open" if fail_open else "closed")
+    return fail_open, {"exception": reason, "fail_open": fail_open}
+
+
+async def verify_recaptcha(token: str | None, remote_ip: str | None) -> tuple[bool, dict]:
+    """
+    Verify a reCAPTCHA token without blocking the event loop.
+    Returns (ok, response); callers apply their own action/score checks for v3.
+    The whole round trip is capped at RECAPTCHA_TIMEOUT_SECONDS.
+    """
+    if not settings.RECAPTCHA_SECRET_KEY or not settings.RECAPTCHA_SITE_KEY:
+        return True, {"skipped": True}
+    if not token:
+        return False, {"error": "missing-token"}
+    data = {"secret": settings.RECAPTCHA_SECRET_KEY, "response": token, "remoteip": remote_ip or ""}
+    try:
+        resp = await asyncio.wait_for(
+            _get_client().post(settings.RECAPTCHA_VERIFY_URL, data=data),
+            timeout=settings.RECAPTCHA_TIMEOUT_SECONDS,
+        )
+        resp.raise_for_status()
+        res = resp.json()
+    except asyncio.TimeoutError:
+        return _on_failure("timeout")
+    except (httpx.HTTPError, ValueError) as e:
+        return _on_failure(str(e) or type(e).__name__)
+    return bool(res.get("success")), res
+
+
+async def recaptcha_passed(token: str | None, remote_ip: str | None, action: str) -> bool:
+    """
+    Verify a token and, for v3, its action and score.
+    Skipped (no keys) and fail-open results carry no action/score, so they pass as-is.
+    """
+    ok, res = await verify_recaptcha(token, remote_ip)
+    if not ok:
+        return False
+    if settings.RECAPTCHA_VERSION != "v3" or res.get("skipped") or res.get("fail_open"):
+        return True
+    return res.get("action") == action and float(res.get("score", 0)) >= settings.RECAPTCHA_MIN_SCORE
@@ -0,0 +1,145 @@
+"""
+Slow-query recorder.
+
+Statements slower than SLOW_QUERY_MS (timed by query_stats' engine hooks) are kept in an
+in-memory ring buffer together with their normalised SQL, parameter shape and calling route.
+The first time a statement shape is seen its plan is captured (SQLite `EXPLAIN QUERY PLAN`,
+Postgres `EXPLAIN (FORMAT JSON)`) by a single background thread on its own raw connection, so
+the slow request neither waits for EXPLAIN nor holds a second pooled connection. Admins can
+browse the buffer at /admin/slow-queries.
+"""
+import json
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.engine import Engine
+
+from .config import settings
+from .query_stats import add_statement_observer, current_route, statement_shape
+
+logger = logging.getLogger(__name__)
+
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+_MAX_PLANS = 500
+_CAPTURING = "(capturing)"
+
+
+def parameter_shape(parameters, executemany: bool) -> str:
+    """Describe bound parameters by type only, e.g. "{room_id: int, start_date: date}" (never values)."""
+    if executemany:
+        count = len(parameters) if parameters is not None else 0
+        first = parameters[0] if count else None
+        return f"{count} x {parameter_shape(first, False)}" if first is not None else f"{count} x ()"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return type(parameters).__name__
+
+
+class SlowQueryLog:
+    """Ring buffer of slow statements plus one captured plan per statement shape."""
+
+    def __init__(self, threshold_ms: float, size: int, explain: bool = True) -> None:
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.entries: deque[dict] = deque(maxlen=size)
+        self.plans: dict[str, str] = {}
+        self._engines: set[Engine] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def attach(self, engine: Engine) -> None:
+        """Record slow statements run on the given engine."""
+        self._engines.add(engine)
+        add_statement_observer(self._observe)
+
+    def _observe(self, conn, statement, parameters, executemany, elapsed_ms):
+        if elapsed_ms < self.threshold_ms or conn.engine not in self._engines:
+            return
+        shape = statement_shape(statement)
+        if self.explain:
+            self._queue_plan(conn.engine, shape, statement, parameters[0] if executemany and parameters else parameters)
+        entry = {
+            "at": datetime.utcnow(),
+            "duration_ms": round(elapsed_ms, 2),
+            "sql": shape,
+            "params": parameter_shape(parameters, executemany),
+            "route": current_route(),
+        }
+        self.entries.appendleft(entry)
+        logger.warning("Slow query %.1f ms on %s: %s", elapsed_ms, entry["route"], shape[:300])
+
+    def _queue_plan(self, engine: Engine, shape: str, statement: str, parameters) -> None:
+        if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+            return
+        with self._lock:
+            if shape in self.plans:
+                return
+            if len(self.plans) >= _MAX_PLANS:
+                self.plans.clear()
+            # Reserve the shape so concurrent slow calls queue EXPLAIN once
+            self.plans[shape] = _CAPTURING
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+            executor = self._executor
+        try:
+            executor.submit(self._capture_plan, engine, shape, statement, parameters)
+        except RuntimeError:  # shutting down
+            self.plans.pop(shape, None)
+
+    def _capture_plan(self, engine: Engine, shape: str, statement: str, parameters) -> None:
+        if engine.dialect.name == "postgresql":
+            prefix = "EXPLAIN (FORMAT JSON) "
+        elif engine.dialect.name == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            prefix = "EXPLAIN "
+        plan = None
+        raw = None
+        try:
+            # Raw DBAPI connection: bypasses engine events and never joins a request's transaction
+            raw = engine.raw_connection()
+            cur = raw.cursor()
+            cur.execute(prefix + statement, parameters or ())
+            rows = cur.fetchall()
+            cur.close()
+            if engine.dialect.name == "postgresql" and rows:
+                plan = json.dumps(rows[0][0], indent=2, default=str)
+            else:
+                plan = "\n".join(" | ".join(str(col) for col in row) for row in rows)
+        except Exception as exc:
+            plan = f"(EXPLAIN failed: {exc})"
+        finally:
+            if raw is not None:
+                try:
+                    raw.rollback()
+                    raw.close()
+                except Exception:
+                    pass
+        self.plans[shape] = plan
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def snapshot(self) -> list[dict]:
+        """Entries newest first, each with the plan captured for its shape so far."""
+        return [{**entry, "plan": self.plans.get(entry["sql"])} for entry in list(self.entries)]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.plans.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_MS,
+    size=settings.SLOW_QUERY_BUFFER_SIZE,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+)
@@ -0,0 +1,160 @@
+"""
+Static file serving with long-lived browser caching.
+
+Every file under app/static (uploads aside) is fingerprinted by content hash when the app
+starts, and templates link to `static_url("css/styles.css")`, which gives
+/static/css/styles.<hash>.css. Fingerprinted URLs and uploads (stored under their content
+hash, see services.media) never change, so they are sent with
+`Cache-Control: public, max-age=31536000, immutable` and repeat page views make no
+static requests at all. Anything requested by its plain name revalidates with its ETag.
+
+Compressible files are served from precompressed `.br`/`.gz` siblings when the client
+accepts them. Generate those at build time (the Dockerfile does):
+
+    python -m app.static_files
+
+Range requests (image and PDF uploads) are answered by Starlette's FileResponse.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+# Brotli is optional; without it only .gz variants are produced and served
+try:
+    import brotli
+except Exception:  # pragma: no cover - optional dependency
+    brotli = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+COMPRESSIBLE = {".css", ".js", ".mjs", ".map", ".svg", ".json", ".txt", ".html", ".xml", ".ico", ".webmanifest"}
+_PRECOMPRESS_MIN_BYTES = 1024
+_HASH_LEN = 10
+# Encodings in order of preference: (Accept-Encoding token, file suffix)
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _iter_static_files(directory: str):
+    """Relative POSIX paths of servable files, skipping uploads, dotfiles and .br/.gz siblings."""
+    for root, dirs, files in os.walk(directory):
+        if root == directory:
+            dirs[:] = [d for d in dirs if d != "uploads"]
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if name.startswith(".") or name.endswith((".br", ".gz")):
+                continue
+            full = os.path.join(root, name)
+            yield os.path.relpath(full, directory).replace(os.sep, "/"), full
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    def __init__(self, *, directory: str, **kwargs) -> None:
+        super().__init__(directory=directory, **kwargs)
+        self.manifest: dict[str, str] = {}  # logical path -> fingerprinted path
+        self._originals: dict[str, str] = {}  # fingerprinted path -> logical path
+        self.build_manifest()
+
+    def build_manifest(self) -> int:
+        """Hash every static file; returns the number fingerprinted."""
+        manifest, originals = {}, {}
+        if os.path.isdir(self.directory):
+            for rel, full in _iter_static_files(self.directory):
+                with open(full, "rb") as fh:
+                    digest = hashlib.sha256(fh.read()).hexdigest()[:_HASH_LEN]
+                stem, ext = os.path.splitext(rel)
+                fingerprinted = f"{stem}.{digest}{ext}"
+                manifest[rel] = fingerprinted
+                originals[fingerprinted] = rel
+        self.manifest, self._originals = manifest, originals
+        return len(manifest)
+
+    def url(self, path: str) -> str:
+        """Public URL for a static file, fingerprinted when it exists."""
+        path = path.lstrip("/")
+        return "/static/" + self.manifest.get(path, path)
+
+    async def get_response(self, path: str, scope) -> Response:
+        rel = path.replace(os.sep, "/")
+        original = self._originals.get(rel)
+        immutable = original is not None or rel.startswith("uploads/")
+        if original is not None:
+            path = os.path.normpath(original)
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 206, 304):
+            response.headers["Cache-Control"] = IMMUTABLE if immutable else REVALIDATE
+        return response
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        if os.path.splitext(str(full_path))[1].lower() not in COMPRESSIBLE:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        accepted = {token.split(";")[0].strip() for token in request_headers.get("accept-encoding", "").split(",")}
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+        response = None
+        # Ranges are served from the identity file
+        if "range" not in request_headers:
+            for token, suffix in _ENCODINGS:
+                if token not in accepted:
+                    continue
+                try:
+                    encoded_stat = os.stat(f"{full_path}{suffix}")
+                except OSError:
+                    continue
+                if encoded_stat.st_mtime < stat_result.st_mtime:  # stale; rerun precompress
+                    continue
+                response = FileResponse(f"{full_path}{suffix}", status_code=status_code, stat_result=encoded_stat,
+                                        media_type=media_type, headers={"Content-Encoding": token})
+                break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+        response.headers["Vary"] = "Accept-Encoding"
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def precompress(directory: str = STATIC_DIR) -> int:
+    """Write .gz (and .br, with Brotli installed) next to compressible static files. Returns files written."""
+    written = 0
+    for rel, full in _iter_static_files(directory):
+        if os.path.splitext(rel)[1].lower() not in COMPRESSIBLE:
+            continue
+        stat_result = os.stat(full)
+        if stat_result.st_size < _PRECOMPRESS_MIN_BYTES:
+            continue
+        data = None
+        for suffix, compress in ((".gz", lambda d: gzip.compress(d, 9, mtime=0)),
+                                 (".br", (lambda d: brotli.compress(d, quality=11)) if brotli else None)):
+            target = full + suffix
+            if compress is None or (os.path.exists(target) and os.stat(target).st_mtime >= stat_result.st_mtime):
+                continue
+            if data is None:
+                with open(full, "rb") as fh:
+                    data = fh.read()
+            packed = compress(data)
+            if len(packed) >= len(data):
+                continue
+            with open(target, "wb") as fh:
+                fh.write(packed)
+            written += 1
+            logger.info("%s%s: %d -> %d bytes", rel, suffix, len(data), len(packed))
+    return written
+
+
+static_files = FingerprintedStaticFiles(directory=STATIC_DIR)
+static_url = static_files.url
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    print(f"precompressed {precompress()} files; {static_files.build_manifest()} fingerprinted")
@@ -1,11 +1,168 @@
+"""
+The one Jinja environment used for pages, HTMX partials and emails.
+
+Outside development, templates are not re-checked on disk for every render
+(TEMPLATE_AUTO_RELOAD), every template is compiled once at startup by
+`precompile_templates()`, and compiled bytecode is kept in TEMPLATE_CACHE_DIR so restarts
+skip parsing. Compare render times cold vs warm with:
+
+    python -m app.templating
+"""
+import logging
+import os
+import time
+
+import jinja2
 from fastapi.templating import Jinja2Templates
+
+from .config import settings
 from .services.currency import get_currency_symbol
+from .services.media import VARIANT_WIDTHS
+from .static_files import static_url
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
 
 def currency_symbol_filter(currency_code: str) -> str:
     """A Jinja2 filter to get the currency symbol for a given currency code."""
     return get_currency_symbol(currency_code)
 
+
+def image_src_filter(obj, variant: str = "thumb") -> str:
+    """URL of one image variant of a Room/Homestay/Booking, falling back to the original."""
+    variants = getattr(obj, "image_variants", None) or {}
+    return variants.get(variant) or obj.image_url
+
+
+def srcset_filter(obj, webp: bool = False) -> str:
+    """`srcset` value listing the resized variants by width (the WebP set with webp=True)."""
+    variants = getattr(obj, "image_variants", None) or {}
+    suffix = "_webp" if webp else ""
+    return ", ".join(
+        f"{variants[name + suffix]} {width}w" for name, width in VARIANT_WIDTHS.items() if variants.get(name + suffix)
+    )
+
+
+def _bytecode_cache() -> jinja2.BytecodeCache | None:
+    if not settings.TEMPLATE_CACHE_DIR:
+        return None
+    try:
+        os.makedirs(settings.TEMPLATE_CACHE_DIR, exist_ok=True)
+    except OSError:
+        logger.warning("Template cache dir %s is not writable; bytecode cache disabled", settings.TEMPLATE_CACHE_DIR)
+        return None
+    return jinja2.FileSystemBytecodeCache(settings.TEMPLATE_CACHE_DIR)
+
+
+env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(TEMPLATES_DIR),
+    autoescape=True,
+    auto_reload=settings.TEMPLATE_AUTO_RELOAD,
+    bytecode_cache=_bytecode_cache(),
+    # Keep every compiled template; the set is small and fixed
+    cache_size=-1,
+)
+env.filters["currency_symbol"] = currency_symbol_filter
+env.filters["image_src"] = image_src_filter
+env.filters["srcset"] = srcset_filter
+env.globals["static_url"] = static_url
+
 # Create a single, shared Jinja2Templates instance
-templates = Jinja2Templates(directory="app/templates")
-# Add the custom filter to the environment
-templates.env.filters["currency_symbol"] = currency_symbol_filter
+templates = Jinja2Templates(env=env)
+
+
+def precompile_templates() -> int:
+    """Load (compile) every template up front so no request pays for it. Returns the count."""
+    count = 0
+    for name in env.list_templates(extensions=["html", "txt"]):
+        try:
+            env.get_template(name)
+            count += 1
+        except jinja2.TemplateError as exc:
+            logger.error("Template %s failed to compile: %s", name, exc)
+    return count
+
+
+if __name__ == "__main__":
+    # Render benchmark for every template, each in a fresh environment: the first request in a
+    # cold process (compile from source, no bytecode cache), the first request after a restart
+    # (compiled code loaded from TEMPLATE_CACHE_DIR), and the steady-state render. Variables a
+    # sample context lacks render as empty (ChainableUndefined).
+    from datetime import date, datetime
+    from types import SimpleNamespace
+
+    from starlette.datastructures import URL
+
+    from .models import BookingStatus
+    from .services.calendar_grid import month_cells
+
+    class _BenchRequest:
+        """Just enough of a Starlette Request for templates rendered outside the app."""
+
+        url = URL("http://localhost:8000/")
+        query_params: dict = {}
+
+        def url_for(self, name: str, **path_params) -> str:
+            return "/" + name
+
+    today = date.today()
+    booking = SimpleNamespace(id=1, room_id=1, guest_name="Guest", guest_contact="", start_date=today, end_date=today,
+                              price=100.0, status=BookingStatus.CONFIRMED, comment=None, image_url=None, image_variants=None)
+    analytics = {"total_bookings": 10, "total_nights_sold": 25, "average_length_of_stay": 2.5, "average_lead_time": 7,
+                 "monthly_revenue_data": [], "month_start": today.replace(day=1), "monthly_bookings": 4,
+                 "monthly_revenue": 400.0, "occupancy_rate": 50.0, "adr": 100.0, "revpar": 50.0}
+    stays = [SimpleNamespace(id=i, guest_name=f"Guest {i}", start_date=date(2025, 1, 3 * i - 2),
+                             end_date=date(2025, 1, 3 * i), status=BookingStatus.CONFIRMED) for i in range(1, 11)]
+    grid = {"days": 31, "cells": month_cells(2025, 1, stays, today), "room_id": 1, "month_label": "January 2025"}
+    old_grid = {"year": 2025, "month": 1, "days": 31, "bookings": [], "room_id": 1, "first_wd": 2,
+                "weekdays": ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], "month_label": "January 2025",
+                "today_str": today.isoformat()}  # grid_public.html still scans bookings per cell
+    user = SimpleNamespace(id=1, email="owner@example.com", role="owner", currency="USD", homestay_id=1,
+                           is_verified=True, created_at=datetime.now())
+    base_context = {"request": _BenchRequest(), "user": user, "current_year": today.year}
+    samples = {
+        "admin/pricing.html": {"pricing": {"basic_monthly": 9, "basic_yearly": 90, "pro_monthly": 19, "pro_yearly": 190}},
+        "admin/slow_queries.html": {"threshold_ms": 200},
+        "analytics.html": {"analytics": analytics},
+        "dashboard.html": {"analytics": analytics, "checkins_today": [], "checkouts_today": [], "today": today},
+        "calendar/edit_booking_modal.html": {"booking": booking, "rooms": []},
+        "calendar/edit_dates_modal.html": {"booking": booking},
+        "calendar/grid.html": grid,
+        "calendar/grid_public.html": old_grid,
+        "emails/daily_digest.html": {"day": today, "properties": []},
+        "emails/verification.html": {"verification_url": "https://example.com/verify"},
+        "landing.html": {"plans": [], "page_url": "http://localhost:8000/"},
+    }
+    runs = 200
+
+    def first_request(name: str, context: dict, bytecode_cache) -> tuple[jinja2.Template, float]:
+        fresh = env.overlay(bytecode_cache=bytecode_cache, cache_size=-1, undefined=jinja2.ChainableUndefined)
+        started = time.perf_counter()
+        template = fresh.get_template(name)
+        template.render(context)  # also loads any parent/included templates
+        return template, (time.perf_counter() - started) * 1000
+
+    print(f"{'template':<40} {'cold':>8} {'bytecode':>9} {'steady':>8}  (ms)")
+    for name in env.list_templates(extensions=["html", "txt"]):
+        context = {**base_context, **samples.get(name, {})}
+        try:
+            _, cold_ms = first_request(name, context, None)
+            cached_ms = float("nan")
+            if env.bytecode_cache is not None:
+                first_request(name, context, env.bytecode_cache)  # make sure the bytecode is on disk
+                _, cached_ms = first_request(name, context, env.bytecode_cache)
+            template, _ = first_request(name, context, None)
+            started = time.perf_counter()
+            for _ in range(runs):
+                template.render(context)
+            steady_ms = (time.perf_counter() - started) * 1000 / runs
+        except Exception as exc:
+            print(f"{name:<40} could not render standalone: {exc}")
+            continue
+        print(f"{name:<40} {cold_ms:8.2f} {cached_ms:9.2f} {steady_ms:8.3f}")
+    started = time.perf_counter()
+    env.cache.clear()
+    n = precompile_templates()
+    print(f"precompiled {n} templates in {(time.perf_counter() - started) * 1000:.0f} ms")
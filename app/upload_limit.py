@@ -0,0 +1,50 @@
+"""
+Request-body cap for multipart uploads.
+
+Starlette spools multipart bodies to temp files before a handler runs, so without a cap a
+client could push an arbitrarily large upload before save_image ever checks its size. This
+ASGI middleware rejects multipart requests whose Content-Length is over the cap up front,
+and counts bytes as they stream in (chunked bodies have no Content-Length), answering
+413 the moment the cap is passed.
+"""
+from starlette.exceptions import HTTPException
+from starlette.responses import PlainTextResponse
+
+from .config import settings
+
+
+class UploadSizeLimitMiddleware:
+    def __init__(self, app, max_bytes: int | None = None):
+        self.app = app
+        self.max_bytes = max_bytes if max_bytes is not None else settings.UPLOAD_REQUEST_MAX_BYTES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_bytes:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+        try:
+            declared = int(headers.get(b"content-length", b"0") or 0)
+        except ValueError:
+            declared = 0
+        if declared > self.max_bytes:
+            response = PlainTextResponse("Upload too large", status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # HTTPException passes through FastAPI's form parsing and renders as 413
+                    raise HTTPException(status_code=413, detail="Upload too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
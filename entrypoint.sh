@@ -4,14 +4,16 @@
 set -e
 
 # This script is the entrypoint for the Docker container.
-# It ensures dependencies are installed and the database is migrated
-# before starting the main application.
+# Dependencies are baked into the image at build time; migrations only run
+# when the database revision is behind the Alembic head, so a warm restart
+# goes straight to the application.
 
-echo "Installing/updating dependencies..."
-pip install -r requirements.txt
-
-echo "Running database migrations..."
-alembic upgrade head
+if python -m app.schema; then
+    echo "Skipping migrations."
+else
+    echo "Running database migrations..."
+    alembic upgrade head
+fi
 
 echo "Setup complete. Starting application..."
 
@@ -0,0 +1,89 @@
+"""
+reCAPTCHA verification against a local siteverify stub.
+
+The stub answers by token: "good" passes, "low" scores too low, "wrong" names
+another action and "slow" outlasts RECAPTCHA_TIMEOUT_SECONDS.
+
+Run with: python -m pytest -q tests/test_recaptcha.py
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from app.config import settings
+from app.services import recaptcha
+
+_RESPONSES = {
+    "good": {"success": True, "action": "login", "score": 0.9},
+    "low": {"success": True, "action": "login", "score": 0.1},
+    "wrong": {"success": True, "action": "register", "score": 0.9},
+}
+
+
+class _SiteverifyStub(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        token = parse_qs(self.rfile.read(length).decode()).get("response", [""])[0]
+        if token == "slow":
+            time.sleep(1.0)
+        body = json.dumps(_RESPONSES.get(token, {"success": False})).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SiteverifyStub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(settings, "RECAPTCHA_SITE_KEY", "site")
+    monkeypatch.setattr(settings, "RECAPTCHA_SECRET_KEY", "secret")
+    monkeypatch.setattr(settings, "RECAPTCHA_VERSION", "v3")
+    monkeypatch.setattr(settings, "RECAPTCHA_MIN_SCORE", 0.5)
+    monkeypatch.setattr(settings, "RECAPTCHA_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(settings, "RECAPTCHA_FAIL_OPEN", False)
+    monkeypatch.setattr(settings, "DEBUG", False)
+    monkeypatch.setattr(settings, "RECAPTCHA_VERIFY_URL", f"http://127.0.0.1:{server.server_port}/siteverify")
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+def _passed(token: str, action: str = "login") -> bool:
+    async def run():
+        try:
+            return await recaptcha.recaptcha_passed(token, "127.0.0.1", action)
+        finally:
+            await recaptcha.close_client()
+
+    return asyncio.run(run())
+
+
+def test_success(stub):
+    assert _passed("good")
+
+
+def test_low_score_or_wrong_action(stub):
+    assert not _passed("low")
+    assert not _passed("wrong")
+    assert not _passed("bogus")
+
+
+def test_timeout_fails_closed(stub):
+    assert not _passed("slow")
+
+
+def test_timeout_fails_open(stub, monkeypatch):
+    monkeypatch.setattr(settings, "RECAPTCHA_FAIL_OPEN", True)
+    assert _passed("slow")